@@ -1,6 +1,12 @@
+from django.conf import settings
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
 
-from .models import Comment, Follow, Group, Post
+from yatube import sqlstats
+
+from . import search
+from .models import Comment, Follow, Group, Post, QueryFingerprint
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -9,6 +15,11 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.matching(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin)
 
@@ -33,6 +44,36 @@ class CommentAdmin(admin.ModelAdmin):
 admin.site.register(Comment, CommentAdmin)
 
 
+class QueryFingerprintAdmin(admin.ModelAdmin):
+    """Отчёт о запросах SQL всех процессов вместо списка объектов."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        enabled = bool(settings.SQL_STATS_PATH)
+        return TemplateResponse(request, 'admin/sql_report.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': self.model._meta.verbose_name_plural,
+            'enabled': enabled,
+            'fingerprints': sqlstats.report() if enabled else [],
+            'slow_queries': sqlstats.slow_queries() if enabled else [],
+            'slow_ms': settings.SQL_SLOW_MS,
+        })
+
+
+admin.site.register(QueryFingerprint, QueryFingerprintAdmin)
+
+
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
     search_fields = ('user', 'user')
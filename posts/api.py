@@ -0,0 +1,169 @@
+"""JSON API для лент, постов и комментариев только для чтения.
+
+Выборки те же, что у HTML-страниц в views, но строки читаются через
+values(): объекты моделей не создаются, а автор и группа приходят
+именами из того же запроса. Страницы курсорные, ?fields= оставляет
+в ответе только перечисленные поля. Ответы не зависят от пользователя,
+поэтому кешируются и сверяются по ETag для всех клиентов.
+"""
+from functools import wraps
+
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+
+from yatube.settings import POSTS_COUNT
+
+from . import archive, page_cache
+from .models import ArchivedComment, ArchivedPost, Comment, Group, Post, User
+from .paginator import COMMENT_ORDERING, POST_ORDERING, CursorPaginator
+
+# Поле ответа → поле для values().
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'created': 'created',
+    'author': 'author__username',
+}
+
+STORAGE = Post._meta.get_field('image').storage
+
+JSON_PARAMS = {'separators': (',', ':'), 'ensure_ascii': False}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params=JSON_PARAMS)
+
+
+def api_view(view):
+    """Ошибки запроса и 404 отдаются в JSON, а не HTML-страницей."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as error:
+            return _json({'detail': str(error)}, status=400)
+        except Http404:
+            return _json({'detail': 'Не найдено'}, status=404)
+    return wrapper
+
+
+def _fields(request, allowed):
+    """Запрошенные поля ответа; без ?fields= — все."""
+    value = request.GET.get('fields')
+    if not value:
+        return list(allowed)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown or not fields:
+        raise BadRequest(
+            f'Неизвестные поля: {", ".join(unknown)}; '
+            f'доступны: {", ".join(allowed)}'
+        )
+    return fields
+
+
+def _lookups(fields, allowed, ordering):
+    # Поля сортировки нужны курсору, даже если клиент их не просил.
+    keys = [field.lstrip('-') for field in ordering]
+    return list(dict.fromkeys(
+        [allowed[field] for field in fields] + keys
+    ))
+
+
+def _serialize(row, fields, allowed):
+    item = {field: row[allowed[field]] for field in fields}
+    if 'image' in item:
+        name = item['image']
+        item['image'] = STORAGE.url(name) if name else None
+    return item
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def _page(request, object_list, allowed, ordering=POST_ORDERING):
+    fields = _fields(request, allowed)
+    rows = object_list.values(*_lookups(fields, allowed, ordering))
+    paginator = CursorPaginator(rows, POSTS_COUNT, ordering)
+    cursor = request.GET.get('cursor')
+    # HTML-страницы открывают по битому курсору первую страницу, а клиент
+    # API должен узнать, что его курсор не годится.
+    if cursor and paginator.decode_cursor(cursor) is None:
+        raise BadRequest('Неверный курсор')
+    page = paginator.get_page(cursor)
+    return _json({
+        'results': [_serialize(row, fields, allowed) for row in page],
+        'next': _page_url(request, page.next_cursor),
+        'previous': _page_url(request, page.previous_cursor),
+    })
+
+
+def _post_model(username, post_id):
+    """Таблица, в которой лежит пост: горячая или архив."""
+    for model in (Post, ArchivedPost):
+        if model.objects.filter(pk=post_id,
+                                author__username=username).exists():
+            return model
+    raise Http404
+
+
+@api_view
+@page_cache.anonymous(page_cache.index, shared=True)
+def index(request):
+    return _page(request, Post.objects.all(), POST_FIELDS)
+
+
+@api_view
+@page_cache.anonymous(page_cache.group_posts, shared=True)
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _page(request, group.posts.all(), POST_FIELDS)
+
+
+@api_view
+@page_cache.anonymous(page_cache.profile, shared=True)
+def profile(request, username):
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    return _page(request, archive.author_posts(author), POST_FIELDS)
+
+
+@api_view
+@page_cache.anonymous(page_cache.post_view, shared=True)
+def post_view(request, username, post_id):
+    fields = _fields(request, POST_FIELDS)
+    lookups = _lookups(fields, POST_FIELDS, ())
+    for model in (Post, ArchivedPost):
+        row = next(iter(model.objects.filter(
+            pk=post_id, author__username=username
+        ).order_by().values(*lookups)[:1]), None)
+        if row is not None:
+            return _json(_serialize(row, fields, POST_FIELDS))
+    raise Http404
+
+
+@api_view
+@page_cache.anonymous(page_cache.post_view, shared=True)
+def comments(request, username, post_id):
+    model = _post_model(username, post_id)
+    comment_model = Comment if model is Post else ArchivedComment
+    return _page(request, comment_model.objects.filter(post_id=post_id),
+                 COMMENT_FIELDS, COMMENT_ORDERING)
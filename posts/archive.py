@@ -0,0 +1,139 @@
+"""Архив старых постов.
+
+Почти все запросы читают свежие страницы, поэтому посты старше
+ARCHIVE_AFTER_DAYS вместе с комментариями переносятся пачками в таблицы
+ArchivedPost и ArchivedComment. Ленты читают только горячие таблицы, и
+их индексы остаются небольшими. Страница поста и профиль автора
+продолжают видеть архив: пост ищется сначала в горячей таблице, а
+глубокие страницы профиля дочитываются из архива.
+"""
+from django.db import connection, transaction
+from django.shortcuts import get_object_or_404
+
+from . import generations
+from .models import ArchivedComment, ArchivedPost, Comment, Post
+
+POST_FIELDS = ('id', 'text', 'pub_date', 'author_id', 'group_id', 'image',
+               'image_variants', 'comments_count')
+COMMENT_FIELDS = ('id', 'post_id', 'author_id', 'text', 'created')
+
+
+class Chain:
+    """Горячие посты, за которыми идут архивные, как одна выборка для
+    Paginator и CursorPaginator.
+
+    Архив старше любого горячего поста, поэтому при сортировке по
+    убыванию даты архив идёт после горячей таблицы, а по возрастанию —
+    до неё. Архив запрашивается, только если горячих строк не хватило.
+
+    total — известное общее число строк, например счётчик записей
+    автора. Если горячих строк не меньше, архив не считается.
+    """
+    ordered = True
+
+    def __init__(self, hot, archived, total=None):
+        self.hot = hot
+        self.archived = archived
+        self.total = total
+        self.model = hot.model
+        self._counts = {}
+
+    def filter(self, *args, **kwargs):
+        return Chain(self.hot.filter(*args, **kwargs),
+                     self.archived.filter(*args, **kwargs))
+
+    def order_by(self, *fields):
+        return Chain(self.hot.order_by(*fields),
+                     self.archived.order_by(*fields), self.total)
+
+    def values(self, *fields, **expressions):
+        return Chain(self.hot.values(*fields, **expressions),
+                     self.archived.values(*fields, **expressions),
+                     self.total)
+
+    def _count(self, queryset):
+        if queryset.model not in self._counts:
+            self._counts[queryset.model] = queryset.count()
+        return self._counts[queryset.model]
+
+    def count(self):
+        hot = self._count(self.hot)
+        if self.total is not None and self.total <= hot:
+            self._counts[self.archived.model] = 0
+        return hot + self._count(self.archived)
+
+    def _parts(self):
+        ordering = self.hot.query.order_by or self.model._meta.ordering
+        if ordering and not ordering[0].startswith('-'):
+            return self.archived, self.hot
+        return self.hot, self.archived
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        first, second = self._parts()
+        items = list(first[start:stop])
+        full = stop is not None and len(items) == stop - start
+        if full or self._counts.get(second.model) == 0:
+            return items
+        skipped = 0
+        if not items and start:
+            skipped = start - self._count(first)
+        rest = None if stop is None else skipped + stop - start - len(items)
+        return items + list(second[skipped:rest])
+
+
+def author_posts(author):
+    """Все посты автора: горячие, затем архивные."""
+    stats = getattr(author, 'stats', None)
+    return Chain(author.posts.all(), author.archived_posts.all(),
+                 stats.posts_count if stats else None)
+
+
+def get_post(related=(), **lookup):
+    """Пост из горячей таблицы, а если его там нет — из архива."""
+    try:
+        return Post.objects.select_related(*related).get(**lookup)
+    except Post.DoesNotExist:
+        return get_object_or_404(
+            ArchivedPost.objects.select_related(*related), **lookup
+        )
+
+
+def _delete(model, column, ids):
+    # Удаление в обход сигналов: пост не исчезает, а переезжает, и
+    # счётчики автора и комментариев должны остаться прежними.
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {model._meta.db_table} '
+            f'WHERE {column} IN ({placeholders})', ids
+        )
+
+
+def move(before, size):
+    """Переносит в архив до size самых старых постов, опубликованных
+    раньше before, и возвращает число перенесённых."""
+    with transaction.atomic():
+        rows = list(Post.objects.filter(pub_date__lt=before).order_by(
+            'pub_date', 'id'
+        ).values(*POST_FIELDS)[:size])
+        if not rows:
+            return 0
+        ids = [row['id'] for row in rows]
+        posts = ArchivedPost.objects.bulk_create(
+            ArchivedPost(**row) for row in rows
+        )
+        ArchivedComment.objects.bulk_create(
+            ArchivedComment(**row) for row in Comment.objects.filter(
+                post_id__in=ids
+            ).values(*COMMENT_FIELDS)
+        )
+        # Комментарии, строки лент, термы поиска — всё, что ссылается
+        # на горячий пост. FTS-индекс чистит триггер на posts_post.
+        for relation in Post._meta.related_objects:
+            _delete(relation.related_model, relation.field.column, ids)
+        _delete(Post, 'id', ids)
+    generations.bump_posts(posts)
+    return len(posts)
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import generations
+
+CARD_KEY = 'post_card:{post}:{created}:{post_version}:{group_version}'
+# Единственная часть карточки, зависящая от зрителя, — кнопка
+# редактирования. В кеш карточка попадает с меткой на её месте.
+EDIT_MARKER = '<!-- post-edit -->'
+POST_CARD = 'post_card'
+GROUP_CARD = 'group_card'
+
+
+def bump_post(post_id):
+    generations.bump(generations.key(POST_CARD, post_id))
+
+
+def bump_group(group_id):
+    generations.bump(generations.key(GROUP_CARD, group_id))
+
+
+def prefetch(posts):
+    """Одним обращением к кешу узнаёт версии и готовые карточки страницы."""
+    keys = {}
+    for post in posts:
+        keys[post.pk] = (
+            generations.key(POST_CARD, post.pk),
+            generations.key(GROUP_CARD, post.group_id)
+            if post.group_id else None,
+        )
+    versions = generations.current(
+        [key for pair in keys.values() for key in pair if key]
+    )
+    for post in posts:
+        post_key, group_key = keys[post.pk]
+        post.card_key = CARD_KEY.format(
+            post=post.pk,
+            # Дата публикации отличает пост от удалённого в обход сигналов
+            # предшественника с тем же id.
+            created=int(post.pub_date.timestamp()),
+            post_version=versions[post_key],
+            group_version=versions[group_key] if group_key else '-',
+        )
+    cards = cache.get_many([post.card_key for post in posts])
+    for post in posts:
+        post.card_html = cards.get(post.card_key)
+
+
+def render_card(post, user=None):
+    if not hasattr(post, 'card_key'):
+        prefetch([post])
+    if post.card_html is None:
+        post.card_html = render_to_string('includes/post_card.html',
+                                          {'post': post})
+        cache.set(post.card_key, post.card_html, settings.POST_CARD_TIMEOUT)
+    edit_button = ''
+    if user is not None and user.is_authenticated and (
+            user.pk == post.author_id) and not post.archived:
+        edit_button = render_to_string('includes/post_edit_button.html',
+                                       {'post': post})
+    return mark_safe(post.card_html.replace(EDIT_MARKER, edit_button))
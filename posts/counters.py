@@ -0,0 +1,104 @@
+from collections import Counter
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import ArchivedPost, AuthorStats, Comment, Follow, Post, User
+
+
+def _count(queryset, field, outer='pk'):
+    """Подзапрос «сколько строк queryset ссылается на внешний объект»."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(outer)}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), Value(0))
+
+
+def _actual_stats(outer='pk'):
+    return {
+        # Перенос в архив не меняет число записей автора.
+        'posts_count': (_count(Post.objects.all(), 'author', outer)
+                        + _count(ArchivedPost.objects.all(), 'author',
+                                 outer)),
+        'followers_count': _count(Follow.objects.all(), 'author', outer),
+        'following_count': _count(Follow.objects.all(), 'user', outer),
+    }
+
+
+def recount_author(user_id):
+    user = User.objects.filter(pk=user_id).annotate(**_actual_stats()).values(
+        'posts_count', 'followers_count', 'following_count'
+    ).first()
+    if user is not None:
+        AuthorStats.objects.update_or_create(user_id=user_id, defaults=user)
+
+
+def bump_author(user_id, field, delta):
+    updated = AuthorStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta}
+    )
+    # Строки может не быть у пользователей, созданных в обход сигналов.
+    # При удалениях её не создаём: пользователь может удаляться вместе
+    # со своими записями.
+    if not updated and delta > 0:
+        recount_author(user_id)
+
+
+def bump_post(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def posts_bulk_created(posts):
+    for author_id, total in Counter(post.author_id for post in posts).items():
+        bump_author(author_id, 'posts_count', total)
+
+
+def comments_bulk_created(comments):
+    for post_id, total in Counter(
+            comment.post_id for comment in comments).items():
+        bump_post(post_id, total)
+
+
+def recount(post_ids=(), user_ids=()):
+    """Пересчитывает счётчики перечисленных постов и пользователей:
+    по одному запросу на таблицу, сколько бы строк ни добавилось."""
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=user_id) for user_id in user_ids),
+        ignore_conflicts=True,
+    )
+    AuthorStats.objects.filter(user_id__in=user_ids).update(
+        **_actual_stats('user_id')
+    )
+    Post.objects.filter(pk__in=post_ids).update(
+        comments_count=_count(Comment.objects.all(), 'post')
+    )
+
+
+def repair():
+    """Пересчитывает все счётчики, возвращает число исправленных строк."""
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=user_id) for user_id in User.objects.filter(
+            stats__isnull=True
+        ).values_list('pk', flat=True).iterator()),
+    )
+    drifted_stats = AuthorStats.objects.annotate(**{
+        f'actual_{field}': expression
+        for field, expression in _actual_stats('user_id').items()
+    }).exclude(
+        posts_count=F('actual_posts_count'),
+        followers_count=F('actual_followers_count'),
+        following_count=F('actual_following_count'),
+    ).values('pk')
+    fixed_stats = AuthorStats.objects.filter(
+        pk__in=drifted_stats
+    ).update(**_actual_stats('user_id'))
+    drifted_posts = Post.objects.annotate(
+        actual=_count(Comment.objects.all(), 'post')
+    ).exclude(comments_count=F('actual')).values_list('pk', flat=True)
+    fixed_posts = Post.objects.filter(pk__in=drifted_posts).update(
+        comments_count=_count(Comment.objects.all(), 'post')
+    )
+    return fixed_stats + fixed_posts
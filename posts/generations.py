@@ -0,0 +1,82 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Поколение — случайная метка в кеше, которая входит в ключи закешированных
+# фрагментов. Изменение данных заменяет метку, и старые фрагменты больше
+# никогда не читаются, сколько бы они ни хранились.
+INDEX = 'index'
+GROUP = 'group'
+GROUPS = 'groups'
+AUTHOR = 'author'
+# Метка синхронизации реплик. Фрагмент, собранный по отстающей реплике,
+# попадает в кеш уже с новой меткой поколения, поэтому sync_replicas
+# меняет эту метку, и она входит во все поколения.
+REPLICAS = 'replicas'
+
+
+def key(scope, pk=None):
+    if pk is None:
+        return f'generation:{scope}'
+    return f'generation:{scope}:{pk}'
+
+
+def bump(*keys):
+    cache.set_many({key: uuid4().hex for key in keys}, None)
+
+
+def current(keys):
+    keys = list(keys)
+    if settings.DATABASE_REPLICAS:
+        keys.append(key(REPLICAS))
+    generations = cache.get_many(keys)
+    for missing in set(keys) - set(generations):
+        # Метка могла вытесниться из кеша. Новая случайная метка не даст
+        # вернуться к фрагменту, сохранённому до последнего изменения.
+        cache.add(missing, uuid4().hex, None)
+        generations[missing] = cache.get(missing)
+    replicas = generations.pop(key(REPLICAS), None)
+    if replicas is not None:
+        generations = {name: f'{value}.{replicas}'
+                       for name, value in generations.items()}
+    return generations
+
+
+def token(*keys):
+    generations = current(keys)
+    return '.'.join(generations[key] for key in keys)
+
+
+def bump_posts(posts):
+    """Сбрасывает страницы, на которых показываются посты."""
+    keys = {key(INDEX)}
+    for post in posts:
+        keys.add(key(AUTHOR, post.author_id))
+        for group_id in (post.group_id, getattr(post, 'loaded_group_id',
+                                                None)):
+            if group_id is not None:
+                keys.add(key(GROUP, group_id))
+    bump(*keys)
+
+
+def bump_follow(follow):
+    """Сбрасывает страницы обоих участников подписки: на них видны
+    счётчики подписчиков и подписок."""
+    bump(key(AUTHOR, follow.author_id), key(AUTHOR, follow.user_id))
+
+
+def bump_group(group_id):
+    bump(key(GROUP, group_id), key(GROUPS))
+
+
+def index():
+    return token(key(INDEX), key(GROUPS))
+
+
+def group(group_id):
+    return token(key(GROUP, group_id))
+
+
+def author(author_id):
+    return token(key(AUTHOR, author_id), key(GROUPS))
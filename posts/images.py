@@ -0,0 +1,157 @@
+"""Варианты изображений постов, которые готовятся один раз при загрузке.
+
+Сам исходник сохраняется без метаданных: EXIF (с координатами GPS), XMP
+и комментарии снимаются, поворот по EXIF применяется к пикселям. Затем
+он кадрируется под пропорции карточки и
+сохраняется в WebP и JPEG нескольких ширин. Описание вариантов хранится
+в самом посте, поэтому шаблону для srcset не нужно хранилище.
+"""
+import hashlib
+import json
+import time
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from yatube import metrics
+
+# Пропорции картинки в карточке поста: 960x339.
+ASPECT = 339 / 960
+WIDTHS = (480, 960, 1440)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+CONTENT_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+DIRECTORY = 'posts/variants'
+# Форматы, которые могут нести метаданные, и как переписывать исходник.
+# GIF и анимации остаются как есть: в них нет EXIF, а перезапись
+# оставила бы один кадр.
+ORIGINAL_FORMATS = {
+    'JPEG': ('JPEG', {'quality': 95}),
+    'MPO': ('JPEG', {'quality': 95}),
+    'PNG': ('PNG', {}),
+    'WEBP': ('WEBP', {'quality': 95}),
+    'TIFF': ('TIFF', {}),
+}
+
+
+def _flatten(image):
+    """Переводит в RGB, подкладывая белый фон под прозрачные области."""
+    if image.mode in ('RGBA', 'LA') or (
+            image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _widths(source_width):
+    """Ширины не больше исходной; самая узкая есть всегда, даже если для
+    неё картинку придётся растянуть."""
+    return [width for width in WIDTHS
+            if width <= source_width] or [WIDTHS[0]]
+
+
+def open_image(content):
+    """Открывает исходник: первый кадр, поворот по EXIF, RGB."""
+    with Image.open(BytesIO(content)) as source:
+        source.seek(0)
+        return _flatten(ImageOps.exif_transpose(source))
+
+
+def strip_metadata(content):
+    """Исходник без метаданных в том же формате; цветовой профиль и
+    прозрачность сохраняются."""
+    with Image.open(BytesIO(content)) as source:
+        if (source.format not in ORIGINAL_FORMATS
+                or getattr(source, 'n_frames', 1) > 1):
+            return content
+        image_format, options = ORIGINAL_FORMATS[source.format]
+        options = dict(options)
+        for name in ('icc_profile', 'transparency'):
+            if name in source.info:
+                options[name] = source.info[name]
+        image = ImageOps.exif_transpose(source)
+        # Некоторые кодировщики Pillow берут EXIF из info самого
+        # изображения, если его не передали явно.
+        image.info = {}
+        buffer = BytesIO()
+        image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def clean_upload(field_file):
+    """Новая загрузка без метаданных — файл с тем же именем."""
+    field_file.open('rb')
+    field_file.seek(0)
+    content = field_file.read()
+    metrics.UPLOAD_BYTES.observe(len(content))
+    return ContentFile(strip_metadata(content), name=field_file.name)
+
+
+def encode(image, size, extension):
+    """Кадрирует изображение под size и сжимает в указанный формат."""
+    started = time.perf_counter()
+    resized = ImageOps.fit(image, size, Image.LANCZOS)
+    buffer = BytesIO()
+    image_format, options = FORMATS[extension]
+    resized.save(buffer, image_format, **options)
+    metrics.THUMBNAIL_SECONDS.observe(time.perf_counter() - started,
+                                      format=extension)
+    return buffer.getvalue()
+
+
+def card_size(width):
+    return width, max(1, round(width * ASPECT))
+
+
+def make_variants(field_file):
+    """Сохраняет варианты изображения и возвращает их описание в JSON."""
+    field_file.open('rb')
+    field_file.seek(0)
+    content = field_file.read()
+    prefix = hashlib.md5(content).hexdigest()
+    image = open_image(content)
+    variants = []
+    for width in _widths(image.width):
+        size = card_size(width)
+        variant = {'width': size[0], 'height': size[1]}
+        for extension in FORMATS:
+            name = f'{DIRECTORY}/{prefix}_{width}.{extension}'
+            if not default_storage.exists(name):
+                name = default_storage.save(
+                    name, ContentFile(encode(image, size, extension))
+                )
+            variant[extension] = name
+        variants.append(variant)
+    return json.dumps(variants)
+
+
+def picture(variants, url):
+    """Готовит для шаблона srcset обоих форматов и запасной src.
+
+    variants — список словарей с width, height и именами файлов по
+    форматам, url превращает имя файла в адрес.
+    """
+    def srcset(extension):
+        return ', '.join(f'{url(variant[extension])} {variant["width"]}w'
+                         for variant in variants)
+
+    fallback = variants[min(1, len(variants) - 1)]
+    return {
+        'webp_srcset': srcset('webp'),
+        'jpeg_srcset': srcset('jpeg'),
+        'src': url(fallback['jpeg']),
+        'width': fallback['width'],
+        'height': fallback['height'],
+    }
+
+
+def sources(variants):
+    if not variants:
+        return None
+    return picture(json.loads(variants), default_storage.url)
@@ -0,0 +1,69 @@
+from collections import defaultdict
+
+from . import cards
+from .models import Group, User
+
+
+class DataLoader:
+    """Собирает ключи объектов, нужных странице, и загружает их пачками:
+    по одному запросу на модель, сколько бы карточек ни было на странице.
+
+    Объекты, уже известные view (например, автор профиля), передаются
+    через prime() и повторно не запрашиваются.
+    """
+
+    def __init__(self):
+        self.querysets = {
+            User: User.objects.all(),
+            Group: Group.objects.all(),
+        }
+        self.pending = defaultdict(set)
+        self.loaded = defaultdict(dict)
+
+    def prime(self, obj):
+        self.loaded[type(obj)][obj.pk] = obj
+
+    def want(self, model, key):
+        if key is not None and key not in self.loaded[model]:
+            self.pending[model].add(key)
+
+    def resolve(self):
+        for model, keys in self.pending.items():
+            self.loaded[model].update(
+                self.querysets[model].in_bulk(list(keys))
+            )
+        self.pending.clear()
+
+    def get(self, model, key):
+        return self.loaded[model].get(key)
+
+
+def _materialize(page):
+    page.object_list = list(page.object_list)
+    return page.object_list
+
+
+def load_posts(page, loader=None):
+    loader = loader or DataLoader()
+    posts = _materialize(page)
+    for post in posts:
+        loader.want(User, post.author_id)
+        loader.want(Group, post.group_id)
+    loader.resolve()
+    for post in posts:
+        post.author = loader.get(User, post.author_id)
+        if post.group_id is not None:
+            post.group = loader.get(Group, post.group_id)
+    cards.prefetch(posts)
+    return page
+
+
+def load_comments(page, loader=None):
+    loader = loader or DataLoader()
+    comments = _materialize(page)
+    for comment in comments:
+        loader.want(User, comment.author_id)
+    loader.resolve()
+    for comment in comments:
+        comment.author = loader.get(User, comment.author_id)
+    return page
@@ -0,0 +1,38 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import archive
+
+
+class Command(BaseCommand):
+    help = ('Переносит посты старше ARCHIVE_AFTER_DAYS вместе с '
+            'комментариями в архивные таблицы')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch', type=int,
+                            default=settings.ARCHIVE_BATCH,
+                            help='Постов в одной транзакции')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        started = time.perf_counter()
+        total = 0
+        # Каждая пачка — отдельная короткая транзакция, чтобы не держать
+        # блокировку записи и не мешать сайту.
+        while True:
+            moved = archive.move(before, options['batch'])
+            if not moved:
+                break
+            total += moved
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Перенесено {total}')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'В архив перенесено постов: {total} за {elapsed:.1f} с'
+        ))
@@ -0,0 +1,165 @@
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+
+from posts.management.commands.bench_views import git_revision, percentile
+from posts.models import Comment, Post, User
+from yatube.settings import POSTS_COUNT
+
+# Прежняя настройка: обычный журнал, соединение на каждый запрос.
+PLAIN = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'CONN_MAX_AGE': 0,
+    'OPTIONS': {},
+}
+DEEPEST_PAGE = 100
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность чтения и записи для '
+            'обычного SQLite и настроек из DATABASES на копиях базы')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4,
+                            help='Параллельных «запросов»')
+        parser.add_argument('--seconds', type=float, default=5,
+                            help='Длительность прогона каждого профиля')
+        parser.add_argument('--write-share', type=float, default=0.2,
+                            help='Доля операций записи')
+        parser.add_argument('--output', default='bench_database.json')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Бенчмарк сравнивает только профили SQLite')
+        posts = list(Post.objects.values_list('pk', flat=True)[:1000])
+        users = list(User.objects.values_list('pk', flat=True)[:1000])
+        if not (posts and users):
+            raise CommandError('Нет данных: сначала запустите generate_data')
+        tuned = {
+            key: value for key, value in settings.DATABASES['default'].items()
+            if key in ('ENGINE', 'CONN_MAX_AGE', 'OPTIONS')
+        }
+        directory = tempfile.mkdtemp()
+        results = {}
+        try:
+            for name, profile in (('plain', PLAIN), ('tuned', tuned)):
+                alias = f'bench_{name}'
+                path = os.path.join(directory, f'{name}.sqlite3')
+                self.copy_database(path, wal=name == 'tuned')
+                connections.databases[alias] = {**profile, 'NAME': path}
+                try:
+                    results[name] = self.run(alias, posts, users, options)
+                finally:
+                    connections[alias].close()
+                    del connections.databases[alias]
+                result = results[name]
+                self.stdout.write(
+                    f"{name:6} reads/s={result['reads_per_second']:9.1f} "
+                    f"writes/s={result['writes_per_second']:8.1f} "
+                    f"read p99={result['read_p99_ms']:7.2f} ms "
+                    f"write p99={result['write_p99_ms']:7.2f} ms "
+                    f"locked={result['locked']}"
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        report = {
+            'revision': git_revision(),
+            'threads': options['threads'],
+            'seconds': options['seconds'],
+            'write_share': options['write_share'],
+            'profiles': results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(
+            f"Результаты записаны в {options['output']}"
+        ))
+
+    def copy_database(self, path, wal):
+        """Копирует основную базу через backup API: копия согласована,
+        даже если в базу сейчас пишут."""
+        connection.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            connection.connection.backup(target)
+            mode = 'WAL' if wal else 'DELETE'
+            target.execute(f'PRAGMA journal_mode = {mode}')
+        finally:
+            target.close()
+
+    def run(self, alias, posts, users, options):
+        reads = []
+        writes = []
+        locked = []
+        deadline = time.perf_counter() + options['seconds']
+
+        def read():
+            offset = random.randrange(DEEPEST_PAGE) * POSTS_COUNT
+            list(Post.objects.using(alias).select_related(
+                'author', 'group'
+            )[offset:offset + POSTS_COUNT])
+
+        def write():
+            # Как при добавлении комментария: строка и счётчик поста.
+            post = random.choice(posts)
+            with transaction.atomic(using=alias):
+                Comment.objects.all().using(alias).bulk_create([Comment(
+                    post_id=post, author_id=random.choice(users),
+                    text='Комментарий из бенчмарка',
+                )])
+                Post.objects.using(alias).filter(pk=post).update(
+                    comments_count=F('comments_count') + 1
+                )
+
+        def worker():
+            timings = {read: [], write: []}
+            errors = 0
+            while time.perf_counter() < deadline:
+                operation = (write if random.random() < options['write_share']
+                             else read)
+                started = time.perf_counter()
+                try:
+                    operation()
+                except OperationalError:
+                    errors += 1
+                else:
+                    timings[operation].append(time.perf_counter() - started)
+                # Конец «запроса»: то же делает обработчик request_finished.
+                connections[alias].close_if_unusable_or_obsolete()
+            connections[alias].close()
+            reads.extend(timings[read])
+            writes.extend(timings[write])
+            locked.append(errors)
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        reads.sort()
+        writes.sort()
+        return {
+            'engine': connections.databases[alias]['ENGINE'],
+            'reads': len(reads),
+            'writes': len(writes),
+            'locked': sum(locked),
+            'reads_per_second': len(reads) / elapsed,
+            'writes_per_second': len(writes) / elapsed,
+            'read_p50_ms': (percentile(reads, 0.50) or 0) * 1000,
+            'read_p99_ms': (percentile(reads, 0.99) or 0) * 1000,
+            'write_p50_ms': (percentile(writes, 0.50) or 0) * 1000,
+            'write_p99_ms': (percentile(writes, 0.99) or 0) * 1000,
+        }
@@ -0,0 +1,262 @@
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+from importlib import import_module
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY)
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test import override_settings
+from django.urls import reverse
+
+from posts.models import AuthorStats, Group, Post, User
+from posts.paginator import CursorPaginator
+from yatube.settings import POSTS_COUNT
+from yatube.wsgi import application
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет основные страницы через WSGI-приложение и пишет '
+            'задержки, пропускную способность и число запросов в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Запросов на каждый сценарий')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--output', default='bench_views.json')
+        parser.add_argument('--deep-page', type=int, default=100,
+                            help='Номер глубокой страницы ленты')
+        parser.add_argument('--cold-cache', action='store_true',
+                            help='Очищать кеш перед каждым запросом (в '
+                                 'отдельном файле, не кеш сервера)')
+        parser.add_argument('--allocation-samples', type=int, default=5,
+                            help='Запросов под tracemalloc на сценарий')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должно быть не меньше 1')
+        self.cold_cache = options['cold_cache']
+        self.allocation_samples = options['allocation_samples']
+        with ExitStack() as stack:
+            if self.cold_cache:
+                self.private_cache(stack)
+            scenarios = self.scenarios(options['deep_page'], stack)
+            results = self.run_scenarios(scenarios, options)
+        report = {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'debug': settings.DEBUG,
+            'database': connection.vendor,
+            'cold_cache': self.cold_cache,
+            'rows': {
+                'users': User.objects.count(),
+                'groups': Group.objects.count(),
+                'posts': Post.objects.count(),
+            },
+            'scenarios': results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(
+            f"Результаты записаны в {options['output']}"
+        ))
+
+    def private_cache(self, stack):
+        """Тот же бэкенд кеша во временном каталоге: очистка перед каждым
+        запросом не трогает кеш работающего сервера."""
+        directory = tempfile.mkdtemp()
+        stack.callback(shutil.rmtree, directory, ignore_errors=True)
+        default = dict(settings.CACHES['default'],
+                       LOCATION=os.path.join(directory, 'bench.sqlite3'))
+        stack.enter_context(override_settings(
+            CACHES={**settings.CACHES, 'default': default}
+        ))
+
+    def run_scenarios(self, scenarios, options):
+        results = {}
+        for name, (path, query, cookie) in scenarios.items():
+            for _ in range(options['warmup']):
+                self.request(path, query, cookie)
+            results[name] = self.run(path, query, cookie,
+                                     options['requests'])
+            self.stdout.write(
+                f"{name:24} p50={results[name]['p50_ms']:8.2f} ms "
+                f"p95={results[name]['p95_ms']:8.2f} ms "
+                f"p99={results[name]['p99_ms']:8.2f} ms "
+                f"rps={results[name]['rps']:8.1f} "
+                f"queries={results[name]['queries_per_request']:.1f} "
+                f"alloc={results[name]['peak_allocated_kb']:8.1f} KB"
+            )
+        return results
+
+    def login_cookie(self, user, stack):
+        """Cookie сессии user; сессия удаляется при закрытии stack."""
+        engine = import_module(settings.SESSION_ENGINE)
+        session = engine.SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        stack.callback(session.delete)
+        return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+    def scenarios(self, deep_page, stack):
+        author = AuthorStats.objects.select_related('user').order_by(
+            '-posts_count'
+        ).first()
+        reader = AuthorStats.objects.select_related('user').order_by(
+            '-following_count'
+        ).first()
+        group = Group.objects.annotate(total=Count('posts')).order_by(
+            '-total'
+        ).first()
+        post = Post.objects.select_related('author').order_by(
+            '-comments_count'
+        ).first()
+        if not (author and reader and group and post):
+            raise CommandError('Нет данных: сначала запустите generate_data')
+        deep = Post.objects.all()[deep_page * POSTS_COUNT:][:1]
+        deep_cursor = CursorPaginator(
+            Post.objects.all(), POSTS_COUNT
+        ).encode_cursor(deep[0], 'n') if deep else ''
+        reader_cookie = self.login_cookie(reader.user, stack)
+        profile = reverse('posts:profile', args=[author.user.username])
+        post_args = [post.author.username, post.id]
+        return {
+            'index': (reverse('posts:index'), '', ''),
+            'index_deep_page': (reverse('posts:index'),
+                                f'page={deep_page}', ''),
+            'index_deep_cursor': (reverse('posts:index'),
+                                  f'cursor={deep_cursor}', ''),
+            'group_posts': (reverse('posts:group_posts', args=[group.slug]),
+                            '', ''),
+            'profile': (profile, '', ''),
+            'profile_deep_page': (profile, f'page={deep_page}', ''),
+            'post_view': (reverse('posts:post_view', args=post_args),
+                          '', ''),
+            'follow_index': (reverse('posts:follow_index'), '',
+                             reader_cookie),
+            'follow_index_deep_page': (reverse('posts:follow_index'),
+                                       f'page={deep_page}', reader_cookie),
+            # Те же данные в JSON: сравниваются с HTML-страницами выше.
+            'api_index': (reverse('posts:api_index'), '', ''),
+            'api_index_deep_cursor': (reverse('posts:api_index'),
+                                      f'cursor={deep_cursor}', ''),
+            'api_index_fields': (reverse('posts:api_index'),
+                                 'fields=id,author', ''),
+            'api_group': (reverse('posts:api_group', args=[group.slug]),
+                          '', ''),
+            'api_profile': (reverse('posts:api_profile',
+                                    args=[author.user.username]), '', ''),
+            'api_post': (reverse('posts:api_post', args=post_args), '', ''),
+            'api_comments': (reverse('posts:api_comments', args=post_args),
+                             '', ''),
+        }
+
+    def request(self, path, query, cookie):
+        environ = {
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'REQUEST_METHOD': 'GET',
+            'wsgi.input': BytesIO(),
+        }
+        if cookie:
+            environ['HTTP_COOKIE'] = cookie
+        setup_testing_defaults(environ)
+        status = []
+        response = application(
+            environ, lambda code, headers, exc_info=None: status.append(code)
+        )
+        try:
+            body = b''.join(response)
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
+        return status[0], len(body)
+
+    def run(self, path, query, cookie, requests):
+        timings = []
+        queries = []
+        statuses = {}
+
+        def count_queries(execute, sql, params, many, context):
+            queries[-1] += 1
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            # Запросы к репликам тоже считаются.
+            for database in connections.all():
+                stack.enter_context(
+                    database.execute_wrapper(count_queries)
+                )
+            started = time.perf_counter()
+            for _ in range(requests):
+                if self.cold_cache:
+                    cache.clear()
+                queries.append(0)
+                request_started = time.perf_counter()
+                status, _ = self.request(path, query, cookie)
+                timings.append(time.perf_counter() - request_started)
+                statuses[status] = statuses.get(status, 0) + 1
+            elapsed = time.perf_counter() - started
+        timings.sort()
+        return {
+            **self.allocations(path, query, cookie),
+            'path': path,
+            'query': query,
+            'requests': requests,
+            'statuses': statuses,
+            'p50_ms': percentile(timings, 0.50) * 1000,
+            'p95_ms': percentile(timings, 0.95) * 1000,
+            'p99_ms': percentile(timings, 0.99) * 1000,
+            'rps': requests / elapsed,
+            'queries_per_request': sum(queries) / requests,
+        }
+
+    def allocations(self, path, query, cookie):
+        """Пик выделенной Python памяти за запрос. tracemalloc замедляет
+        интерпретатор, поэтому замер идёт отдельно от задержек."""
+        peaks = []
+        tracemalloc.start()
+        try:
+            for _ in range(self.allocation_samples):
+                if self.cold_cache:
+                    cache.clear()
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                self.request(path, query, cookie)
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        finally:
+            tracemalloc.stop()
+        peaks.sort()
+        peak = percentile(peaks, 0.50)
+        return {'peak_allocated_kb': peak / 1024 if peak is not None else 0}
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts import cards, images
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Готовит варианты изображений для постов, загруженных раньше'
+
+    def handle(self, *args, **options):
+        built = failed = 0
+        posts = Post.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).filter(image_variants='').only('image')
+        for post in posts.iterator():
+            try:
+                variants = images.make_variants(post.image)
+            except (OSError, ValueError,
+                    Image.DecompressionBombError) as error:
+                failed += 1
+                self.stderr.write(f'{post.image.name}: {error}')
+                continue
+            Post.objects.filter(pk=post.pk).update(image_variants=variants)
+            cards.bump_post(post.pk)
+            built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {built}, с ошибками: {failed}'
+        ))
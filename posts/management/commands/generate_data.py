@@ -0,0 +1,186 @@
+import itertools
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from posts import counters, search, suggestions, timeline
+from posts.models import Comment, Follow, Group, Post, User, manual_dates
+
+USERNAME_PREFIX = 'gen_user_'
+GROUP_PREFIX = 'gen-group-'
+
+
+def zipf_weights(size, exponent):
+    """Накопленные веса степенного распределения: первые объекты
+    выбираются на порядки чаще последних."""
+    return list(itertools.accumulate(
+        1 / (rank ** exponent) for rank in range(1, size + 1)
+    ))
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(itertools.islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетических пользователей, группы, посты, '
+            'комментарии и подписки со степенным распределением')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--follows', type=int, default=100000)
+        parser.add_argument('--exponent', type=float, default=1.1,
+                            help='Показатель степенного распределения')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределены даты')
+        parser.add_argument('--batch', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch = options['batch']
+        self.exponent = options['exponent']
+        self.now = timezone.now()
+        self.period = timedelta(days=options['days']).total_seconds()
+        started = time.monotonic()
+        users = self.step('Пользователи', self.create_users,
+                          options['users'])
+        groups = self.step('Группы', self.create_groups, options['groups'])
+        posts = self.step('Посты', self.create_posts, options['posts'],
+                          users, groups)
+        self.step('Комментарии', self.create_comments, options['comments'],
+                  users, posts)
+        self.step('Подписки', self.create_follows, options['follows'],
+                  users)
+        self.step('Счётчики', counters.repair)
+        self.step('Ленты', timeline.rebuild)
+        self.step('Рекомендации', suggestions.rebuild)
+        if not search.uses_fts():
+            # FTS5-индекс обновляют триггеры, SearchTerm — только сигналы.
+            self.step('Поиск', search.rebuild)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с'
+        ))
+
+    def step(self, title, function, *args):
+        started = time.monotonic()
+        result = function(*args)
+        self.stdout.write(f'{title}: {time.monotonic() - started:.1f} с')
+        return result
+
+    def date(self):
+        return self.now - timedelta(
+            seconds=self.random.random() * self.period
+        )
+
+    def insert(self, model, objects):
+        """bulk_create через QuerySet, без сигнала bulk_created: ленты
+        и счётчики пересобираются одним проходом в конце."""
+        for chunk in chunks(objects, self.batch):
+            with transaction.atomic():
+                model.objects.all().bulk_create(chunk)
+
+    def ids(self, queryset):
+        # Настоящие ключи: в живой базе между ними бывают пропуски.
+        return list(queryset.order_by('pk').values_list('pk', flat=True))
+
+    def pick(self, population, weights, count):
+        return self.random.choices(population, cum_weights=weights, k=count)
+
+    def create_users(self, count):
+        start = User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).count()
+        self.insert(User, (
+            User(username=f'{USERNAME_PREFIX}{number}', password='!')
+            for number in range(start, start + count)
+        ))
+        users = self.ids(User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ))
+        # Популярность не связана с порядком создания.
+        self.random.shuffle(users)
+        return users
+
+    def create_groups(self, count):
+        start = Group.objects.filter(slug__startswith=GROUP_PREFIX).count()
+        self.insert(Group, (
+            Group(title=f'Группа {number}', slug=f'{GROUP_PREFIX}{number}',
+                  description=f'Описание группы {number}')
+            for number in range(start, start + count)
+        ))
+        return self.ids(Group.objects.filter(slug__startswith=GROUP_PREFIX))
+
+    def create_posts(self, count, users, groups):
+        if not users:
+            return []
+        last = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        authors = zipf_weights(len(users), self.exponent)
+        # Без групп все посты публикуются вне групп.
+        groups = groups or [None]
+        hot_groups = zipf_weights(len(groups), self.exponent)
+
+        def posts():
+            for chunk in chunks(range(count), self.batch):
+                chosen_authors = self.pick(users, authors, len(chunk))
+                chosen_groups = self.pick(groups, hot_groups, len(chunk))
+                for number, author, group in zip(chunk, chosen_authors,
+                                                 chosen_groups):
+                    yield Post(
+                        text=f'Синтетический пост {number}',
+                        author_id=author,
+                        # Часть постов публикуется без группы.
+                        group_id=group if number % 4 else None,
+                        pub_date=self.date(),
+                    )
+
+        with manual_dates(Post._meta.get_field('pub_date')):
+            self.insert(Post, posts())
+        return self.ids(Post.objects.filter(pk__gt=last))
+
+    def create_comments(self, count, users, posts):
+        if not posts:
+            return
+        # Обсуждают в основном немногие популярные посты.
+        hot_posts = zipf_weights(len(posts), self.exponent)
+
+        def comments():
+            for chunk in chunks(range(count), self.batch):
+                chosen_posts = self.pick(posts, hot_posts, len(chunk))
+                for number, post in zip(chunk, chosen_posts):
+                    yield Comment(
+                        text=f'Синтетический комментарий {number}',
+                        author_id=self.random.choice(users),
+                        post_id=post,
+                        created=self.date(),
+                    )
+
+        with manual_dates(Comment._meta.get_field('created')):
+            self.insert(Comment, comments())
+
+    def create_follows(self, count, users):
+        if len(users) < 2:
+            return
+        # Число подписчиков распределено по степенному закону.
+        popular = zipf_weights(len(users), self.exponent)
+        for chunk in chunks(range(count), self.batch):
+            pairs = zip((self.random.choice(users) for _ in chunk),
+                        self.pick(users, popular, len(chunk)))
+            with transaction.atomic():
+                Follow.objects.bulk_create(
+                    (Follow(user_id=user, author_id=author)
+                     for user, author in pairs if user != author),
+                    ignore_conflicts=True,
+                )
@@ -0,0 +1,126 @@
+import gzip
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import counters, ndjson, search, suggestions, timeline
+
+
+class Command(BaseCommand):
+    help = ('Загружает группы, посты, комментарии и подписки из NDJSON '
+            'пачками bulk_create, без сигналов на каждую строку')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл NDJSON (.gz — сжатый)')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Файл сжат gzip, даже без расширения .gz')
+        parser.add_argument('--batch', type=int, default=5000,
+                            help='Строк в одной транзакции')
+        parser.add_argument('--checkpoint',
+                            help='Файл с номером последней записанной '
+                                 'строки (по умолчанию <input>.checkpoint)')
+        parser.add_argument('--create-users', action='store_true',
+                            help='Заводить незнакомых пользователей')
+        parser.add_argument('--max-errors', type=int, default=100,
+                            help='Сколько строк можно отклонить')
+
+    def handle(self, *args, **options):
+        self.checkpoint = (options['checkpoint']
+                           or f"{options['input']}.checkpoint")
+        self.max_errors = options['max_errors']
+        self.verbosity = options['verbosity']
+        self.errors = 0
+        started = time.perf_counter()
+        importer = ndjson.Importer(options['create_users'])
+        skip = self.read_checkpoint()
+        if skip:
+            self.stdout.write(f'Продолжаем после строки {skip}')
+        records = []
+        number = skip
+        with self.open(options['input'], options['gzip']) as stream:
+            for number, line in enumerate(stream, 1):
+                if number <= skip or not line.strip():
+                    continue
+                try:
+                    records.append((number, *ndjson.parse(line)))
+                except ndjson.InvalidRow as error:
+                    self.reject(number, error)
+                if len(records) >= options['batch']:
+                    self.flush(importer, records, number, started)
+                    records = []
+        self.flush(importer, records, number, started)
+        total = sum(importer.counts.values())
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Загружено строк: {total} за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-9):.0f} строк/с), '
+            f'уже были в базе: {sum(importer.skipped.values())}, '
+            f'отклонено: {self.errors}'
+        )
+        self.finish(importer.counts)
+        os.remove(self.checkpoint)
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def open(self, path, compressed):
+        if compressed or path.endswith('.gz'):
+            return gzip.open(path, 'rt', encoding='utf-8')
+        return open(path, encoding='utf-8')
+
+    def read_checkpoint(self):
+        try:
+            with open(self.checkpoint) as checkpoint:
+                return int(checkpoint.read())
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            raise CommandError(f'Испорчен файл {self.checkpoint}')
+
+    def write_checkpoint(self, number):
+        # Через временный файл: сбой при записи не портит отметку.
+        temporary = f'{self.checkpoint}.tmp'
+        with open(temporary, 'w') as checkpoint:
+            checkpoint.write(str(number))
+        os.replace(temporary, self.checkpoint)
+
+    def reject(self, number, reason):
+        self.errors += 1
+        self.stderr.write(f'Строка {number}: {reason}')
+        if self.errors > self.max_errors:
+            raise CommandError(
+                f'Отклонено больше {self.max_errors} строк. Загрузка '
+                f'продолжится с отметки в {self.checkpoint}'
+            )
+
+    def flush(self, importer, records, number, started):
+        rejected = importer.flush(records)
+        self.write_checkpoint(number)
+        for line, reason in rejected:
+            self.reject(line, reason)
+        if self.verbosity > 1:
+            total = sum(importer.counts.values())
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'Строка {number}: записано {total}, '
+                f'{total / max(elapsed, 1e-9):.0f} строк/с'
+            )
+
+    def finish(self, counts):
+        """Производные таблицы пересчитываются один раз на всю загрузку.
+        Счётчики уже обновлены по пачкам, repair — сверка. Ленты
+        пересобираются целиком, как в generate_data: один INSERT ...
+        SELECT на пачку читателей быстрее раскладки каждой пачки строк."""
+        steps = [('Счётчики', counters.repair)]
+        if counts['post'] or counts['follow']:
+            steps.append(('Ленты', timeline.rebuild))
+        if counts['follow']:
+            steps.append(('Рекомендации', suggestions.rebuild))
+        if counts['post'] and not search.uses_fts():
+            # FTS5-индекс обновляют триггеры, SearchTerm — только сигналы.
+            steps.append(('Поиск', search.rebuild))
+        for title, function in steps:
+            step_started = time.perf_counter()
+            function()
+            self.stdout.write(
+                f'{title}: {time.perf_counter() - step_started:.1f} с'
+            )
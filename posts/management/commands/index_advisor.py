@@ -0,0 +1,201 @@
+import re
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Post
+
+ALIAS = re.compile(r'"(\w+)" (T\d+)')
+# Условие на значение, а не на другой столбец (как в JOIN ... ON).
+CONDITION = re.compile(r'"(\w+)"\."(\w+)" (?:= (?!")|IN \(|IS NULL)')
+ORDER = re.compile(r'"(\w+)"\."(\w+)" (ASC|DESC)')
+SCANNED = re.compile(r'^SCAN (\w+)(?: AS (\w+))?$')
+
+
+def plan_problems(plan):
+    """Строки плана, которые выдают полный просмотр таблицы или
+    сортировку во временном B-дереве."""
+    for detail in plan:
+        if detail.startswith('USE TEMP B-TREE') or SCANNED.match(detail):
+            yield detail
+
+
+def column_fields(table):
+    """Модель таблицы и соответствие её столбцов полям."""
+    for model in apps.get_models():
+        if model._meta.db_table == table:
+            return model, {field.column: field.name
+                           for field in model._meta.concrete_fields}
+    return None, {}
+
+
+def existing_prefixes(model):
+    """Наборы полей, с которых начинаются индексы и уникальные
+    ограничения модели."""
+    prefixes = [tuple(field.lstrip('-') for field in index.fields)
+                for index in model._meta.indexes]
+    prefixes += [tuple(constraint.fields)
+                 for constraint in model._meta.constraints
+                 if hasattr(constraint, 'fields')]
+    prefixes += [tuple(fields) for fields in model._meta.unique_together]
+    return prefixes
+
+
+def suggest(sql, problems):
+    """Индексы для таблиц из плана: сначала поля условий на равенство,
+    затем поля сортировки."""
+    aliases = {alias: table for table, alias in ALIAS.findall(sql)}
+    where, _, order = sql.partition(' ORDER BY ')
+    tables = set()
+    for detail in problems:
+        match = SCANNED.match(detail)
+        if match:
+            tables.add(aliases.get(match.group(1), match.group(1)))
+    if any(detail.startswith('USE TEMP B-TREE') for detail in problems):
+        tables.update(aliases.get(table, table)
+                      for table, _, _ in ORDER.findall(order))
+    for table in tables:
+        model, fields = column_fields(table)
+        if model is None:
+            continue
+        columns = [fields[column] for name, column in
+                   CONDITION.findall(where)
+                   if aliases.get(name, name) == table and column in fields]
+        columns = list(dict.fromkeys(columns))
+        columns += [('-' if direction == 'DESC' else '') + fields[column]
+                    for name, column, direction in ORDER.findall(order)
+                    if aliases.get(name, name) == table and column in fields
+                    and fields[column] not in columns]
+        if columns:
+            yield model, tuple(columns)
+
+
+def missing_indexes(suggestions):
+    """Строки Meta.indexes для предложений, которые не покрыты
+    началом уже существующих индексов."""
+    for model, candidates in sorted(suggestions.items(),
+                                    key=lambda item: item[0].__name__):
+        prefixes = existing_prefixes(model)
+        for fields in sorted(candidates):
+            plain = tuple(field.lstrip('-') for field in fields)
+            if any(prefix[:len(plain)] == plain for prefix in prefixes):
+                continue
+            name = '_'.join([model._meta.model_name]
+                            + [field.lstrip('-') for field in fields])
+            yield (f'{model.__name__}.Meta.indexes: models.Index('
+                   f'fields={list(fields)!r}, name={name[:30]!r})')
+
+
+class Command(BaseCommand):
+    help = ('Запрашивает страницы приложения posts, прогоняет их SQL через '
+            'EXPLAIN QUERY PLAN и предлагает недостающие индексы')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Завершиться ошибкой, если нужны индексы')
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Печатать SQL и план каждого запроса')
+
+    def pages(self):
+        follow = Follow.objects.select_related('user').first()
+        if follow is None:
+            raise CommandError('Нужны данные: запустите generate_data')
+        post = (Post.objects.filter(author=follow.author, group__isnull=False)
+                .select_related('author', 'group').first()
+                or Post.objects.select_related('author', 'group').first())
+        if post is None:
+            raise CommandError('Нужны данные: запустите generate_data')
+        author = post.author.username
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse('posts:index') + '?cursor=',
+            reverse('posts:follow_index'),
+            reverse('posts:profile', args=[author]),
+            reverse('posts:post_view', args=[author, post.id]),
+            reverse('posts:post_edit', args=[author, post.id]),
+            reverse('posts:new_post'),
+            reverse('posts:search') + '?q=' + post.text.split()[0],
+        ]
+        if post.group:
+            pages.append(reverse('posts:group_posts',
+                                 args=[post.group.slug]))
+        return follow.user, post.author, pages
+
+    def capture(self, user, author, pages):
+        """SQL каждой страницы для анонима, подписчика и автора. Всё
+        выполняется в транзакции, которая откатывается, со своим кешем в
+        памяти: общий кеш сервера не очищается и не получает страниц из
+        отменённых данных. Метрики и статистика SQL не пишутся."""
+        queries = defaultdict(set)
+        isolated = override_settings(
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'index-advisor',
+            }},
+            METRICS_DIR=None,
+            SQL_STATS_PATH=None,
+        )
+        with isolated, transaction.atomic():
+            clients = [Client(), Client(), Client()]
+            clients[1].force_login(user)
+            clients[2].force_login(author)
+            for page in pages:
+                for client in clients:
+                    cache.clear()
+                    with CaptureQueriesContext(connection) as captured:
+                        client.get(page)
+                    for query in captured.captured_queries:
+                        if query['sql'].startswith('SELECT'):
+                            queries[query['sql']].add(page)
+            transaction.set_rollback(True)
+        return queries
+
+    def explain(self, queries, verbose):
+        """Печатает проблемные планы и возвращает число таких запросов
+        и предложенные индексы по моделям."""
+        suggestions = defaultdict(set)
+        flagged = 0
+        with connection.cursor() as cursor:
+            for sql, sources in sorted(queries.items()):
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = [row[3] for row in cursor.fetchall()]
+                problems = list(plan_problems(plan))
+                if verbose or problems:
+                    self.stdout.write(', '.join(sorted(sources)))
+                    self.stdout.write(f'  {sql[:300]}')
+                    for detail in plan:
+                        marker = '!' if detail in problems else ' '
+                        self.stdout.write(f'  {marker} {detail}')
+                if problems:
+                    flagged += 1
+                    for model, fields in suggest(sql, problems):
+                        suggestions[model].add(fields)
+        return flagged, suggestions
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN есть только в SQLite')
+        user, author, pages = self.pages()
+        queries = self.capture(user, author, pages)
+        flagged, suggestions = self.explain(queries,
+                                            options['verbose_plans'])
+        missing = list(missing_indexes(suggestions))
+        self.stdout.write(
+            f'Запросов: {len(queries)}, с полным просмотром или '
+            f'сортировкой: {flagged}'
+        )
+        if not missing:
+            self.stdout.write(self.style.SUCCESS('Новых индексов не нужно'))
+            return
+        self.stdout.write('Добавьте индексы и запустите makemigrations:')
+        for line in missing:
+            self.stdout.write(f'  {line}')
+        if options['check']:
+            raise CommandError(f'Не хватает индексов: {len(missing)}')
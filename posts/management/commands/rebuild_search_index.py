@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковый индекс по текстам постов'
+
+    def handle(self, *args, **options):
+        search.rebuild()
+        backend = 'FTS5' if search.uses_fts() else 'SearchTerm'
+        self.stdout.write(self.style.SUCCESS(f'Индекс пересобран: {backend}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации авторов по всему графу подписок'
+
+    def handle(self, *args, **options):
+        total = suggestions.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Рекомендаций: {total}'))
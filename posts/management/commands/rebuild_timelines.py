@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters, timeline
+from posts.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок по таблице подписок'
+
+    def handle(self, *args, **options):
+        counters.repair()
+        timeline.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {TimelineEntry.objects.count()}'
+        ))
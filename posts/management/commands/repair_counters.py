@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики комментариев, записей и подписок '
+            'и исправляет расхождения')
+
+    def handle(self, *args, **options):
+        fixed = counters.repair()
+        self.stdout.write(self.style.SUCCESS(f'Исправлено строк: {fixed}'))
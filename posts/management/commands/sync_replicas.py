@@ -0,0 +1,46 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from posts import generations
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу в реплики из DATABASE_REPLICAS через '
+            'backup API SQLite')
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*',
+                            help='Какие реплики обновить (по умолчанию все)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Реплики поддерживаются только для SQLite')
+        aliases = options['aliases'] or settings.DATABASE_REPLICAS
+        unknown = set(aliases) - set(settings.DATABASE_REPLICAS)
+        if unknown:
+            raise CommandError(f'Не реплики: {", ".join(sorted(unknown))}')
+        if not aliases:
+            self.stdout.write('Реплики не настроены')
+            return
+        connection.ensure_connection()
+        for alias in aliases:
+            started = time.perf_counter()
+            path = connections[alias].settings_dict['NAME']
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            # Страницы пишутся в открытую базу реплики одной транзакцией:
+            # её читатели в режиме WAL видят либо старую копию, либо новую,
+            # а их постоянные соединения не нужно переоткрывать.
+            target = sqlite3.connect(path)
+            try:
+                connection.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(
+                f'{alias}: {time.perf_counter() - started:.2f} с'
+            )
+        generations.bump(generations.key(generations.REPLICAS))
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.6 on 2026-10-18 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_suggestion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryFingerprint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.TextField(verbose_name='Отпечаток запроса')),
+            ],
+            options={
+                'verbose_name': 'Запрос SQL',
+                'verbose_name_plural': 'Запросы SQL',
+                'managed': False,
+            },
+        ),
+    ]
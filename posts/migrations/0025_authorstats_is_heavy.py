@@ -0,0 +1,27 @@
+# Generated by Django 2.2.6 on 2026-10-18 21:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_heavy_authors(apps, schema_editor):
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    AuthorStats.objects.filter(
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).update(is_heavy=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_query_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='is_heavy',
+            field=models.BooleanField(default=False, verbose_name='Посты подмешиваются при чтении'),
+        ),
+        migrations.RunPython(mark_heavy_authors, migrations.RunPython.noop),
+    ]
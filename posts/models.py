@@ -1,9 +1,34 @@
+from contextlib import contextmanager
+
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from . import images, resize
+from .signals import bulk_created
+
 User = get_user_model()
 
 
+@contextmanager
+def manual_dates(*fields):
+    """Отключает auto_now_add, чтобы даты можно было задать самим."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class BulkSignalManager(models.Manager):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        bulk_created.send(sender=self.model, objs=objs)
+        return objs
+
+
 class Group(models.Model):
     title = models.CharField(
         verbose_name='Группа',
@@ -52,11 +77,53 @@ class Post(models.Model):
         null=True,
         help_text='Можно добавить изображение',
     )
+    image_variants = models.TextField(
+        verbose_name='Варианты изображения',
+        blank=True,
+        default='',
+        editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Количество комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = BulkSignalManager()
+
+    archived = False
 
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_id'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='post_author_pub_date'),
+            models.Index(fields=['group', '-pub_date'],
+                         name='post_group_pub_date'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Новая картинка — из формы, админки или кода — очищается от
+        # метаданных и сразу получает варианты, иначе они устаревают.
+        if 'image' not in self.get_deferred_fields():
+            if not self.image:
+                self.image_variants = ''
+            elif not self.image._committed:
+                self.image = images.clean_upload(self.image)
+                self.image_variants = images.make_variants(self.image)
+        super().save(*args, **kwargs)
+
+    @property
+    def image_sources(self):
+        if self.image_variants:
+            return images.sources(self.image_variants)
+        if self.image:
+            return resize.sources(self.image.name)
+        return None
 
     def __str__(self):
         return (f'Группа: {self.group} Автор: {self.author.username}'
@@ -86,16 +153,107 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    objects = BulkSignalManager()
+
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['post', '-created'],
+                         name='comment_post_created'),
+        ]
 
     def __str__(self):
         return (f'Автор: {self.author.username} Комментарий: {self.text[:15]} '
                 f'Дата: {self.created} В ответ на пост: {self.post.text[:15]}')
 
 
+class ArchivedPost(models.Model):
+    """Пост старше ARCHIVE_AFTER_DAYS, перенесённый командой
+    archive_posts. Хранит тот же id, поэтому ссылки на пост не меняются.
+    Архив только читается."""
+    id = models.IntegerField(primary_key=True)
+    text = models.TextField(verbose_name='Текст поста')
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_posts',
+        verbose_name='Автор'
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        related_name='archived_posts',
+        blank=True,
+        null=True,
+        verbose_name='Группа',
+    )
+    image = models.ImageField(
+        verbose_name='Изображение',
+        upload_to='posts/',
+        blank=True,
+        null=True,
+    )
+    image_variants = models.TextField(
+        verbose_name='Варианты изображения',
+        blank=True,
+        default='',
+    )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Количество комментариев',
+        default=0,
+    )
+
+    archived = True
+    image_sources = Post.image_sources
+
+    class Meta:
+        verbose_name = 'Пост в архиве'
+        verbose_name_plural = 'Посты в архиве'
+        ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['author', '-pub_date'],
+                         name='archived_post_author_date'),
+        ]
+
+    def __str__(self):
+        return (f'Архив. Автор: {self.author.username}'
+                f' Текст: {self.text[:15]} Дата: {self.pub_date}')
+
+
+class ArchivedComment(models.Model):
+    id = models.IntegerField(primary_key=True)
+    post = models.ForeignKey(
+        ArchivedPost,
+        on_delete=models.CASCADE,
+        related_name='comments',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_comments',
+        verbose_name='Автор'
+    )
+    text = models.TextField(verbose_name='Комментарий')
+    created = models.DateTimeField(verbose_name='Дата комментария')
+
+    class Meta:
+        verbose_name = 'Комментарий в архиве'
+        verbose_name_plural = 'Комментарии в архиве'
+        ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['post', '-created'],
+                         name='archived_comment_post_created'),
+        ]
+
+    def __str__(self):
+        return (f'Архив. Автор: {self.author.username} '
+                f'Комментарий: {self.text[:15]} Дата: {self.created}')
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -118,3 +276,129 @@ class Follow(models.Model):
     def __str__(self):
         return (f'Пользователь: {self.user.username} '
                 f'Подписан на: {self.author.username}')
+
+
+class SearchTerm(models.Model):
+    term = models.CharField('Терм', max_length=100)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Пост'
+    )
+    weight = models.PositiveSmallIntegerField('Вес', default=1)
+
+    class Meta:
+        verbose_name = 'Терм поиска'
+        verbose_name_plural = 'Термы поиска'
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'post'],
+                                    name='search_terms'),
+        ]
+
+    def __str__(self):
+        return f'Терм: {self.term} Пост: {self.post_id} Вес: {self.weight}'
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Количество записей',
+                                              default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписан', default=0)
+    # Посты автора не раскладываются по лентам, а подмешиваются при
+    # чтении (posts/timeline.py).
+    is_heavy = models.BooleanField('Посты подмешиваются при чтении',
+                                   default=False)
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return (f'Автор: {self.user.username} Записей: {self.posts_count} '
+                f'Подписчиков: {self.followers_count} '
+                f'Подписан: {self.following_count}')
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='timeline_user_date'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='timeline_entries'),
+        ]
+
+    def __str__(self):
+        return (f'Лента: {self.user.username} '
+                f'Пост: {self.post_id} Дата: {self.pub_date}')
+
+
+class Suggestion(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggestions',
+        verbose_name='Пользователь'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggested_to',
+        verbose_name='Рекомендуемый автор'
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        ordering = ('-score',)
+        indexes = [
+            models.Index(fields=['user', '-score'],
+                         name='suggestion_user_score'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='suggestions'),
+        ]
+
+    def __str__(self):
+        return (f'Пользователю: {self.user.username} '
+                f'Автор: {self.author.username} Оценка: {self.score:.2f}')
+
+
+class QueryFingerprint(models.Model):
+    """Строка отчёта о запросах SQL (yatube/sqlstats.py). Данные лежат в
+    общем файле статистики, а модель без таблицы нужна, чтобы отчёт
+    встал в админку рядом с постами и комментариями."""
+    fingerprint = models.TextField('Отпечаток запроса')
+
+    class Meta:
+        managed = False
+        verbose_name = 'Запрос SQL'
+        verbose_name_plural = 'Запросы SQL'
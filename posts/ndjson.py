@@ -0,0 +1,463 @@
+"""Выгрузка и загрузка данных в NDJSON: один JSON-объект на строку.
+
+Строка — {"model": "post", ...}. Связи записаны естественными ключами:
+автор и подписчик — username, группа — slug, пост комментария — id.
+Архив выгружается вместе с горячими таблицами: для получателя это те
+же посты и комментарии.
+
+Таблицы читаются пачками по ключу (id больше последнего выгруженного),
+без OFFSET и без курсора, который держал бы транзакцию чтения всю
+выгрузку. Имена авторов и slug групп подтягиваются одним запросом на
+пачку. В памяти только текущая пачка, поэтому расход не зависит от
+размера таблиц.
+
+Загрузка (Importer) пишет строки пачками: одна пачка — одна транзакция
+и по одному bulk_create на модель. Пользователи и группы находятся по
+словарям username → id и slug → id в памяти. Вставка идёт через
+QuerySet.bulk_create, без сигнала bulk_created: счётчики затронутых
+постов и авторов пересчитываются одним UPDATE на пачку, метки поколений
+кеша меняются одним обращением на пачку, а ленты и рекомендации
+пересобираются один раз после загрузки.
+
+Перед вставкой отбрасываются строки, которые уже есть в базе: с id — по
+id (в том числе в архиве), без id — по естественному ключу: автор, дата
+и текст поста или пост, автор, дата и текст комментария. Поэтому
+повторная загрузка того же файла ничего не удваивает, а counts
+считает только действительно вставленные строки.
+"""
+import json
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_slug
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cards, counters, generations
+from .models import (ArchivedComment, ArchivedPost, Comment, Follow, Group,
+                     Post, User, manual_dates)
+
+MODELS = ('group', 'post', 'comment', 'follow')
+BATCH = 1000
+
+
+def _chunks(queryset, fields, size):
+    last = None
+    while True:
+        chunk = queryset if last is None else queryset.filter(id__gt=last)
+        rows = list(chunk.order_by('id').values(*fields)[:size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]['id']
+
+
+def _since(queryset, since, date_field=None):
+    """Строки после since: числа — по id, даты — по date_field. У
+    таблиц без даты при выгрузке с даты берутся все строки."""
+    if isinstance(since, int):
+        return queryset.filter(id__gt=since)
+    if since is not None and date_field:
+        return queryset.filter(**{f'{date_field}__gte': since})
+    return queryset
+
+
+def _names(model, field, rows, *columns):
+    ids = {row[column] for row in rows for column in columns}
+    ids.discard(None)
+    return dict(model.objects.filter(id__in=ids).values_list('id', field))
+
+
+def _groups(since, size):
+    # Групп немного, и без них не загрузить посты: всегда целиком.
+    for rows in _chunks(Group.objects.all(),
+                        ('id', 'title', 'slug', 'description'), size):
+        yield from rows
+
+
+def _posts(since, size):
+    fields = ('id', 'text', 'pub_date', 'author_id', 'group_id', 'image')
+    for model in (ArchivedPost, Post):
+        queryset = _since(model.objects.all(), since, 'pub_date')
+        for rows in _chunks(queryset, fields, size):
+            authors = _names(User, 'username', rows, 'author_id')
+            groups = _names(Group, 'slug', rows, 'group_id')
+            for row in rows:
+                yield {
+                    'id': row['id'],
+                    'text': row['text'],
+                    'pub_date': row['pub_date'].isoformat(),
+                    'author': authors[row['author_id']],
+                    'group': groups.get(row['group_id']),
+                    'image': row['image'] or None,
+                }
+
+
+def _comments(since, size):
+    fields = ('id', 'post_id', 'author_id', 'text', 'created')
+    for model in (ArchivedComment, Comment):
+        queryset = _since(model.objects.all(), since, 'created')
+        for rows in _chunks(queryset, fields, size):
+            authors = _names(User, 'username', rows, 'author_id')
+            for row in rows:
+                yield {
+                    'id': row['id'],
+                    'post': row['post_id'],
+                    'author': authors[row['author_id']],
+                    'text': row['text'],
+                    'created': row['created'].isoformat(),
+                }
+
+
+def _follows(since, size):
+    queryset = _since(Follow.objects.all(), since)
+    for rows in _chunks(queryset, ('id', 'user_id', 'author_id'), size):
+        users = _names(User, 'username', rows, 'user_id', 'author_id')
+        for row in rows:
+            yield {
+                'id': row['id'],
+                'user': users[row['user_id']],
+                'author': users[row['author_id']],
+            }
+
+
+READERS = {
+    'group': _groups,
+    'post': _posts,
+    'comment': _comments,
+    'follow': _follows,
+}
+
+
+def export(stream, models=MODELS, since=None, size=BATCH):
+    """Пишет строки выбранных моделей в текстовый поток stream.
+
+    since — словарь {модель: id или дата}, с которых начинается
+    выгрузка; id у каждой таблицы свои. Возвращает пару (число строк,
+    последний id) по моделям: последние id годятся как since для
+    следующей выгрузки.
+    """
+    since = since or {}
+    counts = Counter()
+    last = {}
+    for model in MODELS:
+        if model not in models:
+            continue
+        for row in READERS[model](since.get(model), size):
+            stream.write(json.dumps({'model': model, **row},
+                                    ensure_ascii=False,
+                                    separators=(',', ':')) + '\n')
+            counts[model] += 1
+            last[model] = max(last.get(model, 0), row['id'])
+    return counts, last
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def _string(row, name, model=None, optional=False, field=None):
+    value = row.get(name)
+    if value is None and optional:
+        return None
+    if not isinstance(value, str) or not value.strip():
+        raise InvalidRow(f'{name}: нужна непустая строка')
+    max_length = (model._meta.get_field(field or name).max_length
+                  if model else None)
+    if max_length and len(value) > max_length:
+        raise InvalidRow(f'{name}: длиннее {max_length} символов')
+    return value
+
+
+def _id(row, name, optional=False):
+    value = row.get(name)
+    if value is None and optional:
+        return None
+    if type(value) is not int or value <= 0:
+        raise InvalidRow(f'{name}: нужно положительное целое')
+    return value
+
+
+def _date(row, name):
+    value = row.get(name)
+    moment = parse_datetime(value) if isinstance(value, str) else None
+    if moment is None:
+        raise InvalidRow(f'{name}: нужна дата ISO 8601')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _username(row, name):
+    return _string(row, name, User, field='username')
+
+
+def _parse_group(row):
+    slug = _string(row, 'slug', Group)
+    try:
+        validate_slug(slug)
+    except ValidationError:
+        raise InvalidRow('slug: недопустимые символы')
+    return {
+        'title': _string(row, 'title', Group),
+        'slug': slug,
+        'description': row.get('description') or '',
+    }
+
+
+def _parse_post(row):
+    return {
+        'id': _id(row, 'id', optional=True),
+        'text': _string(row, 'text', Post),
+        'pub_date': _date(row, 'pub_date'),
+        'author': _username(row, 'author'),
+        'group': _string(row, 'group', optional=True),
+        'image': _string(row, 'image', optional=True) or '',
+    }
+
+
+def _parse_comment(row):
+    return {
+        'id': _id(row, 'id', optional=True),
+        'post': _id(row, 'post'),
+        'author': _username(row, 'author'),
+        'text': _string(row, 'text', Comment),
+        'created': _date(row, 'created'),
+    }
+
+
+def _parse_follow(row):
+    user, author = _username(row, 'user'), _username(row, 'author')
+    if user == author:
+        raise InvalidRow('подписка на самого себя')
+    return {'user': user, 'author': author}
+
+
+PARSERS = {
+    'group': _parse_group,
+    'post': _parse_post,
+    'comment': _parse_comment,
+    'follow': _parse_follow,
+}
+
+
+def parse(line):
+    """Строка NDJSON → (модель, проверенные поля); InvalidRow, если
+    строку загрузить нельзя. Ссылки остаются именами: их разрешает
+    Importer при записи пачки."""
+    try:
+        row = json.loads(line)
+    except ValueError:
+        raise InvalidRow('не JSON')
+    if not isinstance(row, dict) or row.get('model') not in PARSERS:
+        raise InvalidRow('неизвестная модель')
+    return row['model'], PARSERS[row['model']](row)
+
+
+class Importer:
+    """Записывает пачки разобранных строк.
+
+    create_users — заводить пользователей, которых ещё нет, с
+    непригодным паролем. Иначе строки с ними отклоняются. Строки с уже
+    занятым id пропускаются, поэтому повторная загрузка пачки после
+    сбоя безопасна. counts — вставленные строки по моделям, skipped —
+    пропущенные как уже загруженные.
+    """
+
+    def __init__(self, create_users=False):
+        self.create_users = create_users
+        self.users = dict(User.objects.values_list(
+            'username', 'pk'
+        ).iterator())
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.counts = Counter()
+        self.skipped = Counter()
+
+    def flush(self, records):
+        """records — тройки (номер строки, модель, поля). Возвращает
+        отклонённые строки: пары (номер строки, причина)."""
+        by_model = {model: [] for model in MODELS}
+        for number, model, data in records:
+            by_model[model].append((number, data))
+        self.rejected = []
+        self.keys = {generations.key(generations.INDEX)}
+        self.post_ids = set()
+        self.user_ids = set()
+        with transaction.atomic():
+            self._groups(by_model['group'])
+            self._users(by_model)
+            self._posts(by_model['post'])
+            self._comments(by_model['comment'])
+            self._follows(by_model['follow'])
+            counters.recount(self.post_ids, self.user_ids)
+        generations.bump(*self.keys)
+        return self.rejected
+
+    def _resolve(self, number, mapping, value, reason):
+        if value is None:
+            return None
+        if value not in mapping:
+            self.rejected.append((number, f'{reason}: {value}'))
+            raise KeyError(value)
+        return mapping[value]
+
+    def _unseen(self, model, objects, natural, archive=None):
+        """Объекты, которых ещё нет ни в базе, ни раньше в пачке: с id —
+        по id в model и archive, без id — по полям natural. Первое поле
+        natural должно быть почти уникальным: по нему идёт выборка."""
+        ids = {obj.pk for obj in objects if obj.pk is not None}
+        seen_ids = set(model.objects.filter(
+            pk__in=ids
+        ).values_list('pk', flat=True))
+        if archive is not None:
+            seen_ids.update(archive.objects.filter(
+                pk__in=ids - seen_ids
+            ).values_list('pk', flat=True))
+        first = natural[0]
+        values = {getattr(obj, first) for obj in objects if obj.pk is None}
+        seen_keys = set(model.objects.filter(
+            **{f'{first}__in': values}
+        ).values_list(*natural)) if values else set()
+        fresh = []
+        for obj in objects:
+            if obj.pk is None:
+                key, seen = tuple(getattr(obj, f) for f in natural), seen_keys
+            else:
+                key, seen = obj.pk, seen_ids
+            if key in seen:
+                self.skipped[model._meta.model_name] += 1
+                continue
+            seen.add(key)
+            fresh.append(obj)
+        return fresh
+
+    def _groups(self, rows):
+        new = {}
+        for _, data in rows:
+            if data['slug'] in self.groups or data['slug'] in new:
+                self.skipped['group'] += 1
+            else:
+                new[data['slug']] = Group(**data)
+        if not new:
+            return
+        existing = dict(Group.objects.filter(
+            slug__in=new
+        ).values_list('slug', 'pk'))
+        self.skipped['group'] += len(existing)
+        Group.objects.bulk_create(
+            (group for slug, group in new.items() if slug not in existing),
+            ignore_conflicts=True,
+        )
+        self.groups.update(Group.objects.filter(
+            slug__in=new
+        ).values_list('slug', 'pk'))
+        self.keys.add(generations.key(generations.GROUPS))
+        self.counts['group'] += len(new) - len(existing)
+
+    def _users(self, by_model):
+        if not self.create_users:
+            return
+        names = {data[field] for model, fields in (
+            ('post', ('author',)), ('comment', ('author',)),
+            ('follow', ('user', 'author')),
+        ) for _, data in by_model[model] for field in fields}
+        missing = names - set(self.users)
+        if not missing:
+            return
+        User.objects.bulk_create(
+            (User(username=name, password='!') for name in missing),
+            ignore_conflicts=True,
+        )
+        created = dict(User.objects.filter(
+            username__in=missing
+        ).values_list('username', 'pk'))
+        self.users.update(created)
+        self.user_ids.update(created.values())
+
+    def _posts(self, rows):
+        posts = []
+        for number, data in rows:
+            try:
+                author_id = self._resolve(number, self.users, data['author'],
+                                          'нет пользователя')
+                group_id = self._resolve(number, self.groups, data['group'],
+                                         'нет группы')
+            except KeyError:
+                continue
+            posts.append(Post(
+                id=data['id'], text=data['text'], pub_date=data['pub_date'],
+                author_id=author_id, group_id=group_id, image=data['image'],
+            ))
+        posts = self._unseen(Post, posts, ('pub_date', 'author_id', 'text'),
+                             archive=ArchivedPost)
+        for post in posts:
+            self.user_ids.add(post.author_id)
+            self.keys.add(generations.key(generations.AUTHOR, post.author_id))
+            if post.group_id is not None:
+                self.keys.add(generations.key(generations.GROUP,
+                                              post.group_id))
+        with manual_dates(Post._meta.get_field('pub_date')):
+            Post.objects.all().bulk_create(posts, ignore_conflicts=True)
+        self.counts['post'] += len(posts)
+
+    def _comments(self, rows):
+        post_ids = {data['post'] for _, data in rows}
+        posts = {post['pk']: post for post in Post.objects.filter(
+            pk__in=post_ids
+        ).values('pk', 'author_id', 'group_id')}
+        archived = set(ArchivedPost.objects.filter(
+            pk__in=post_ids - set(posts)
+        ).values_list('pk', flat=True))
+        comments = []
+        for number, data in rows:
+            if data['post'] in archived:
+                self.rejected.append((number, 'пост уже в архиве'))
+                continue
+            try:
+                self._resolve(number, posts, data['post'], 'нет поста')
+                author_id = self._resolve(number, self.users, data['author'],
+                                          'нет пользователя')
+            except KeyError:
+                continue
+            comments.append(Comment(
+                id=data['id'], post_id=data['post'], author_id=author_id,
+                text=data['text'], created=data['created'],
+            ))
+        comments = self._unseen(
+            Comment, comments, ('created', 'post_id', 'author_id', 'text'),
+            archive=ArchivedComment,
+        )
+        self.post_ids.update(comment.post_id for comment in comments)
+        for post_id in self.post_ids:
+            post = posts[post_id]
+            self.keys.add(generations.key(cards.POST_CARD, post_id))
+            self.keys.add(generations.key(generations.AUTHOR,
+                                          post['author_id']))
+            if post['group_id'] is not None:
+                self.keys.add(generations.key(generations.GROUP,
+                                              post['group_id']))
+        with manual_dates(Comment._meta.get_field('created')):
+            Comment.objects.all().bulk_create(comments,
+                                              ignore_conflicts=True)
+        self.counts['comment'] += len(comments)
+
+    def _follows(self, rows):
+        follows = []
+        for number, data in rows:
+            try:
+                user_id = self._resolve(number, self.users, data['user'],
+                                        'нет пользователя')
+                author_id = self._resolve(number, self.users, data['author'],
+                                          'нет пользователя')
+            except KeyError:
+                continue
+            follows.append(Follow(user_id=user_id, author_id=author_id))
+        follows = self._unseen(Follow, follows, ('user_id', 'author_id'))
+        for follow in follows:
+            self.user_ids.update((follow.user_id, follow.author_id))
+            self.keys.add(generations.key(generations.AUTHOR, follow.user_id))
+            self.keys.add(generations.key(generations.AUTHOR,
+                                          follow.author_id))
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        self.counts['follow'] += len(follows)
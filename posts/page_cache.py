@@ -0,0 +1,111 @@
+"""Кеш целых страниц для анонимных посетителей.
+
+До вызова view считается метка страницы из поколений кеша
+(generations): одно обращение к кешу и не больше одного запроса к базе
+по индексу. Совпал ETag с присланным клиентом — отвечаем 304 без
+рендеринга и без вызова view. Иначе отдаём готовый ответ из кеша, а
+view вызываем лишь при промахе.
+
+Last-Modified не отдаётся: дата самой свежей записи не меняется при
+правке или удалении поста и при новых подписчиках, и клиент, который
+шлёт только If-Modified-Since, получал бы 304 на устаревшую страницу.
+Поколение меняется при любом из этих изменений.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from . import cards, generations
+from .models import ArchivedPost, Group, Post, User
+
+
+def _first(queryset):
+    # first() добавил бы сортировку по pk, которая здесь не нужна.
+    return next(iter(queryset.order_by()[:1]), None)
+
+
+def index():
+    return generations.index()
+
+
+def group_posts(slug):
+    group = _first(Group.objects.filter(slug=slug).values_list('pk',
+                                                               flat=True))
+    if group is None:
+        return None
+    return generations.group(group)
+
+
+def profile(username):
+    author = _first(User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ))
+    if author is None:
+        return None
+    return generations.author(author)
+
+
+def post_view(username, post_id):
+    for model in (Post, ArchivedPost):
+        post = _first(model.objects.filter(
+            pk=post_id, author__username=username
+        ).values('author_id', 'group_id'))
+        if post is not None:
+            break
+    else:
+        return None
+    keys = [generations.key(cards.POST_CARD, post_id),
+            generations.key(generations.AUTHOR, post['author_id'])]
+    if post['group_id'] is not None:
+        keys.append(generations.key(cards.GROUP_CARD, post['group_id']))
+    return generations.token(*keys)
+
+
+def _set_validators(response, etag):
+    response['ETag'] = etag
+    # Клиенты и прокси хранят страницу, но сверяют её при каждом
+    # обращении: для них это обычно ответ 304.
+    patch_cache_control(response, public=True, max_age=0)
+    return response
+
+
+def anonymous(validators, shared=False):
+    """Кеширует ответы view для анонимных GET-запросов.
+
+    validators получает аргументы view и возвращает метку поколений
+    страницы или None, если страницы нет: тогда ответ (обычно 404)
+    строит сама view.
+
+    shared — ответ не зависит от пользователя (как в JSON API): он
+    кешируется для всех, и сессия не читается.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or (
+                    not shared and request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            token = validators(*args, **kwargs)
+            if token is None:
+                return view(request, *args, **kwargs)
+            etag = quote_etag(hashlib.md5(
+                f'{request.get_full_path()}:{token}'.encode()
+            ).hexdigest())
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                key = f'anonymous_page:{etag}'
+                response = cache.get(key)
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                    if response.status_code != 200 or response.cookies:
+                        return response
+                    _set_validators(response, etag)
+                    cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+                return response
+            return _set_validators(response, etag)
+        return wrapper
+    return decorator
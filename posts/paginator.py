@@ -0,0 +1,173 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+from yatube.settings import POSTS_COUNT
+
+POST_ORDERING = ('-pub_date', '-id')
+COMMENT_ORDERING = ('-created', '-id')
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, values):
+    values = [value.isoformat() if hasattr(value, 'isoformat') else value
+              for value in values]
+    data = json.dumps([direction, values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (направление, значения) или None для битого курсора."""
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(data.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class CursorPage(Sequence):
+    """Страница курсорной пагинации: вместо номера у неё курсоры соседних
+    страниц, а количество объектов не считается."""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None, extra_query=''):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        # Параметры запроса, которые ссылки на соседние страницы
+        # сохраняют перед cursor=, например 'q=...&'.
+        self.extra_query = extra_query
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self)}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Пагинация по ключу (keyset): страница выбирается условием на поля
+    сортировки последнего показанного объекта, без COUNT и OFFSET.
+
+    ordering должен однозначно упорядочивать выборку, поэтому последним
+    полем в нём идёт id.
+    """
+
+    def __init__(self, object_list, per_page, ordering=POST_ORDERING):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = ordering
+        self.fields = [field.lstrip('-') for field in ordering]
+
+    def _value(self, item, field):
+        if isinstance(item, dict):
+            return item[field]
+        return getattr(item, field)
+
+    def encode_cursor(self, item, direction):
+        return encode_cursor(direction, [self._value(item, field)
+                                         for field in self.fields])
+
+    def decode_cursor(self, cursor):
+        """Значения курсора приводятся к типам полей модели; курсор с
+        неверными значениями считается битым (None)."""
+        decoded = decode_cursor(cursor)
+        if decoded is None or len(decoded[1]) != len(self.fields):
+            return None
+        direction, values = decoded
+        model = self.object_list.model
+        try:
+            values = [model._meta.get_field(field).to_python(value)
+                      for field, value in zip(self.fields, values)]
+        except (ValueError, TypeError, ValidationError):
+            return None
+        if None in values:
+            return None
+        return direction, values
+
+    def _beyond(self, values, reverse=False):
+        query = Q()
+        equal = {}
+        for field, name, value in zip(self.ordering, self.fields, values):
+            descending = field.startswith('-') != reverse
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            query |= Q(**equal, **{lookup: value})
+            equal[name] = value
+        # Нестрогое условие на первое поле избыточно, но без него OR
+        # мешает базе читать индекс диапазоном.
+        first = self.ordering[0].startswith('-') != reverse
+        return Q(**{
+            f'{self.fields[0]}__lte' if first else f'{self.fields[0]}__gte':
+            values[0]
+        }) & query
+
+    def _reversed_ordering(self):
+        return [field[1:] if field.startswith('-') else f'-{field}'
+                for field in self.ordering]
+
+    def get_page(self, cursor=None):
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            items = list(self.object_list.order_by(
+                *self.ordering
+            )[:self.per_page + 1])
+            has_next = len(items) > self.per_page
+            items = items[:self.per_page]
+            has_previous = False
+        elif decoded[0] == NEXT:
+            items = list(self.object_list.filter(
+                self._beyond(decoded[1])
+            ).order_by(*self.ordering)[:self.per_page + 1])
+            has_next = len(items) > self.per_page
+            items = items[:self.per_page]
+            has_previous = True
+        else:
+            items = list(self.object_list.filter(
+                self._beyond(decoded[1], reverse=True)
+            ).order_by(*self._reversed_ordering())[:self.per_page + 1])
+            has_previous = len(items) > self.per_page
+            items = items[:self.per_page][::-1]
+            has_next = True
+        return CursorPage(
+            items,
+            self,
+            next_cursor=(self.encode_cursor(items[-1], NEXT)
+                         if has_next and items else None),
+            previous_cursor=(self.encode_cursor(items[0], PREVIOUS)
+                             if has_previous and items else None),
+        )
+
+
+def paginate(request, object_list, ordering=POST_ORDERING):
+    """Страница для списка: курсорная, если в запросе есть ?cursor=,
+    иначе обычная нумерованная."""
+    cursor = request.GET.get('cursor')
+    if cursor is not None:
+        return CursorPaginator(object_list, POSTS_COUNT,
+                               ordering).get_page(cursor)
+    paginator = Paginator(object_list, POSTS_COUNT)
+    return paginator.get_page(request.GET.get('page'))
@@ -0,0 +1,115 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import cards, counters, generations, search, suggestions, timeline
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+from .signals import bulk_created
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+def install_search(sender, using, **kwargs):
+    search.install(using)
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    # Запоминаем исходную группу: при смене группы при редактировании
+    # сбрасывать нужно страницы обеих групп.
+    instance.loaded_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+        counters.bump_author(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, **kwargs):
+    cards.bump_post(instance.pk)
+    generations.bump_posts([instance])
+    instance.loaded_group_id = instance.group_id
+    if not search.uses_fts():
+        search.index_posts([instance])
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    cards.bump_post(instance.pk)
+    generations.bump_posts([instance])
+    counters.bump_author(instance.author_id, 'posts_count', -1)
+
+
+@receiver(bulk_created, sender=Post)
+def posts_bulk_created(sender, objs, **kwargs):
+    timeline.fan_out_bulk(objs)
+    counters.posts_bulk_created(objs)
+    generations.bump_posts(objs)
+    if not search.uses_fts():
+        search.index_posts(objs)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_post(instance.post_id, 1)
+        cards.bump_post(instance.post_id)
+        generations.bump_posts([instance.post])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+    cards.bump_post(instance.post_id)
+    # При каскадном удалении поста его может уже не быть.
+    generations.bump_posts(Post.objects.filter(pk=instance.post_id).only(
+        'author_id', 'group_id'))
+
+
+@receiver(bulk_created, sender=Comment)
+def comments_bulk_created(sender, objs, **kwargs):
+    counters.comments_bulk_created(objs)
+    post_ids = {comment.post_id for comment in objs}
+    for post_id in post_ids:
+        cards.bump_post(post_id)
+    generations.bump_posts(Post.objects.filter(pk__in=post_ids).only(
+        'author_id', 'group_id'))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    cards.bump_group(instance.pk)
+    generations.bump_group(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        # Ленты после счётчиков: по числу подписчиков решается, не стал
+        # ли автор тяжёлым (см. timeline.followers).
+        counters.bump_author(instance.author_id, 'followers_count', 1)
+        counters.bump_author(instance.user_id, 'following_count', 1)
+        timeline.follow(instance)
+        generations.bump_follow(instance)
+        # После коммита: при удалении пользователя его строки ещё
+        # удаляются, и рекомендации на него ссылаться не должны.
+        transaction.on_commit(partial(suggestions.refresh, instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, 'followers_count', -1)
+    counters.bump_author(instance.user_id, 'following_count', -1)
+    timeline.unfollow(instance)
+    generations.bump_follow(instance)
+    transaction.on_commit(partial(suggestions.refresh, instance.user_id))
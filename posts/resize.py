@@ -0,0 +1,212 @@
+"""Изображения постов нужного размера по подписанной ссылке.
+
+Ссылка подписывает имя исходника, ширину и формат, поэтому страница
+строит её без обращений к диску, а посторонний не заставит сервер
+нарезать произвольные размеры. Вариант создаётся один раз в пуле из
+RESIZE_WORKERS потоков и кладётся в дисковый кеш. При превышении
+RESIZE_CACHE_BYTES из кеша удаляются файлы, которые дольше всего не
+читали.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousOperation
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from PIL import Image
+
+from . import images
+
+SALT = 'posts.resize'
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Отметку последнего чтения обновляем не чаще раза в минуту.
+TOUCH_INTERVAL = 60
+
+_lock = threading.RLock()
+_jobs = {}
+_pool = {}
+
+
+class Busy(Exception):
+    """Очередь нарезки заполнена."""
+
+
+def url(name, width, extension):
+    token = signing.dumps([name, width, extension], salt=SALT, compress=True)
+    return reverse('posts:resize', args=[token])
+
+
+def sources(name):
+    """srcset карточки для картинки без готовых вариантов."""
+    variants = []
+    for width in images.WIDTHS:
+        variant = dict(zip(('width', 'height'), images.card_size(width)))
+        for extension in images.FORMATS:
+            variant[extension] = (name, width, extension)
+        variants.append(variant)
+    return images.picture(variants, lambda key: url(*key))
+
+
+def _executor():
+    # Потоки не переживают fork: после него пул создаётся заново.
+    if _pool.get('pid') != os.getpid():
+        _pool.update(
+            pid=os.getpid(),
+            executor=ThreadPoolExecutor(settings.RESIZE_WORKERS),
+            slots=threading.BoundedSemaphore(settings.RESIZE_QUEUE),
+            size=None,
+        )
+    return _pool
+
+
+def _files():
+    for directory, _, names in os.walk(settings.RESIZE_CACHE_DIR):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                yield path, os.stat(path)
+            except FileNotFoundError:
+                continue
+
+
+def _evict(pool, added):
+    """Держит объём кеша в пределах RESIZE_CACHE_BYTES.
+
+    Объём считается обходом каталога один раз на процесс и дальше
+    только растёт на размер новых файлов. Когда он превышает предел,
+    каталог обходится заново (его могли чистить другие процессы) и
+    удаляются самые давно читавшиеся файлы.
+    """
+    limit = settings.RESIZE_CACHE_BYTES
+    if pool['size'] is None:
+        pool['size'] = sum(stat.st_size for _, stat in _files())
+    pool['size'] += added
+    if pool['size'] <= limit:
+        return
+    files = sorted(_files(), key=lambda item: item[1].st_mtime)
+    size = sum(stat.st_size for _, stat in files)
+    for path, stat in files:
+        if size <= limit * 0.9:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        size -= stat.st_size
+    pool['size'] = size
+
+
+def _resize(path, name, width, extension):
+    if not default_storage.exists(name):
+        raise FileNotFoundError(name)
+    with default_storage.open(name) as source:
+        image = images.open_image(source.read())
+    data = images.encode(image, images.card_size(width), extension)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}'
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, path)
+    with _lock:
+        _evict(_pool, len(data))
+    return data
+
+
+def _build(path, name, width, extension):
+    """Ставит нарезку в пул (или присоединяется к уже идущей), ждёт её
+    и возвращает готовый файл."""
+    with _lock:
+        future = _jobs.get(path)
+        if future is None:
+            pool = _executor()
+            if not pool['slots'].acquire(blocking=False):
+                raise Busy
+            future = pool['executor'].submit(_resize, path, name, width,
+                                             extension)
+            _jobs[path] = future
+
+            def done(future, slots=pool['slots']):
+                with _lock:
+                    _jobs.pop(path, None)
+                slots.release()
+
+            future.add_done_callback(done)
+    return future.result(timeout=settings.RESIZE_TIMEOUT)
+
+
+def _read(path):
+    try:
+        if os.stat(path).st_mtime < time.time() - TOUCH_INTERVAL:
+            os.utime(path)
+        with open(path, 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def _ranged(request, data, content_type):
+    """Ответ целиком или одним диапазоном из заголовка Range."""
+    length = len(data)
+    match = RANGE.match(request.META.get('HTTP_RANGE', ''))
+    if match is None or match.group(1) == match.group(2) == '':
+        response = HttpResponse(data, content_type=content_type)
+    else:
+        start, end = match.groups()
+        if start == '':
+            start, end = max(0, length - int(end)), length - 1
+        else:
+            start = int(start)
+            end = min(int(end), length - 1) if end else length - 1
+        if start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{length}'
+            return response
+        response = HttpResponse(data[start:end + 1],
+                                content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{length}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve(request, token):
+    try:
+        name, width, extension = signing.loads(token, salt=SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise Http404('Неверная подпись')
+    if width not in images.WIDTHS or extension not in images.FORMATS:
+        raise Http404('Размер не поддерживается')
+    key = hashlib.sha256(f'{name}:{width}:{extension}'.encode()).hexdigest()
+    etag = quote_etag(key)
+    # Разбор If-None-Match по RFC: списки меток, W/ и «*».
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        path = os.path.join(settings.RESIZE_CACHE_DIR, key[:2],
+                            f'{key}.{extension}')
+        data = _read(path)
+        if data is None:
+            try:
+                data = _build(path, name, width, extension)
+            except (Busy, FutureTimeoutError):
+                response = HttpResponse('Изображение готовится', status=503)
+                response['Retry-After'] = 1
+                return response
+            except Image.DecompressionBombError:
+                return HttpResponse('Изображение слишком большое',
+                                    status=422)
+            except (OSError, ValueError, SuspiciousOperation):
+                raise Http404('Изображение не найдено')
+        response = _ranged(request, data, images.CONTENT_TYPES[extension])
+    response['ETag'] = etag
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
@@ -0,0 +1,212 @@
+import math
+import re
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.db import OperationalError, connection, connections
+from django.db.models import Count, Q, Sum
+from django.db.models.expressions import RawSQL
+
+from yatube.settings import POSTS_COUNT
+
+from .models import Post, SearchTerm
+from .paginator import NEXT, CursorPage, decode_cursor, encode_cursor
+
+FTS_TABLE = 'posts_post_fts'
+WORD = re.compile(r'\w+')
+MIN_STEM = 3
+# Частые окончания русских слов: поиск по основе находит «Пушкина»
+# по запросу «Пушкин» и наоборот.
+ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией',
+    'иям', 'иях', 'ием', 'ах', 'ях', 'ов', 'ев', 'ей', 'ой', 'ый', 'ий',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ую', 'юю', 'ом', 'ем', 'ам', 'ям',
+    'ия', 'ии', 'ью', 'ье', 'ья', 'ть', 'ся', 'сь',
+    'а', 'я', 'ы', 'и', 'у', 'ю', 'е', 'о', 'ь',
+), key=len, reverse=True)
+
+# Полнотекстовый индекс SQLite (FTS5) с внешним содержимым: текст хранится
+# только в posts_post, а триггеры поддерживают индекс при любых вставках,
+# правках и удалениях, в том числе через bulk_create.
+FTS_SQL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE} (rowid, text) VALUES (new.id, new.text);
+    END""",
+)
+
+_fts_databases = {}
+
+
+def stem(word):
+    word = word.lower()
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def terms(text):
+    return [stem(word) for word in WORD.findall(text)]
+
+
+def uses_fts():
+    """Есть ли в текущей базе FTS5-индекс; иначе ищем по SearchTerm."""
+    name = connection.settings_dict['NAME']
+    if name not in _fts_databases:
+        _fts_databases[name] = connection.vendor == 'sqlite' and (
+            FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_databases[name]
+
+
+def install(using):
+    """Создаёт FTS5-таблицу и триггеры. Вызывается после каждого migrate:
+    SQLite пересоздаёт posts_post при изменении схемы, и триггеры
+    пропадают вместе со старой таблицей."""
+    database = connections[using]
+    if database.vendor != 'sqlite':
+        return
+    with database.cursor() as cursor:
+        exists = FTS_TABLE in database.introspection.table_names(cursor)
+        try:
+            for sql in FTS_SQL:
+                cursor.execute(sql)
+        except OperationalError:
+            # SQLite собран без FTS5: остаётся индекс на SearchTerm.
+            return
+        if not exists:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"
+            )
+    _fts_databases.pop(database.settings_dict['NAME'], None)
+
+
+def _match(stems):
+    return ' '.join(f'"{term}"*' for term in stems)
+
+
+def index_posts(posts):
+    """Индексирует посты для поиска без FTS5."""
+    posts = [post for post in posts if post.pk is not None]
+    SearchTerm.objects.filter(post__in=posts).delete()
+    SearchTerm.objects.bulk_create(
+        SearchTerm(term=term[:100], post_id=post.pk, weight=weight)
+        for post in posts
+        for term, weight in Counter(terms(post.text)).items()
+    )
+
+
+def rebuild(chunk_size=1000):
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"
+            )
+        return
+    SearchTerm.objects.all().delete()
+    chunk = []
+    for post in Post.objects.only('id', 'text').iterator():
+        chunk.append(post)
+        if len(chunk) == chunk_size:
+            index_posts(chunk)
+            chunk = []
+    index_posts(chunk)
+
+
+def matching(queryset, query):
+    """Фильтр queryset по поисковому запросу без ранжирования."""
+    stems = set(terms(query))
+    if not stems:
+        return queryset.none()
+    if uses_fts():
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [_match(stems)]
+        ))
+    return queryset.filter(pk__in=SearchTerm.objects.filter(
+        term__in=stems
+    ).values('post_id').annotate(
+        matched=Count('id')
+    ).filter(matched=len(stems)).values('post_id'))
+
+
+def _fts_ranked(stems, after, limit):
+    # bm25 тем меньше, чем лучше совпадение.
+    sql = (
+        f'SELECT id, score FROM (SELECT rowid AS id, bm25({FTS_TABLE}) '
+        f'AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)'
+    )
+    params = [_match(stems)]
+    if after:
+        sql += ' WHERE score > %s OR (score = %s AND id < %s)'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY score, id DESC LIMIT %s'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+def _terms_ranked(stems, after, limit):
+    # Вес — сумма вхождений терминов; сортируем по -вес, как bm25.
+    ranked = SearchTerm.objects.filter(term__in=stems).values(
+        'post_id'
+    ).annotate(
+        weight=Sum('weight'), matched=Count('id')
+    ).filter(matched=len(stems))
+    if after:
+        ranked = ranked.filter(Q(weight__lt=-after[0])
+                               | Q(weight=-after[0], post_id__lt=after[1]))
+    return [(post_id, -weight) for post_id, weight in ranked.order_by(
+        '-weight', '-post_id'
+    ).values_list('post_id', 'weight')[:limit]]
+
+
+def _after(cursor):
+    """(ранг, id) из курсора или None, если курсор битый."""
+    decoded = decode_cursor(cursor) if cursor else None
+    if not decoded or decoded[0] != NEXT or len(decoded[1]) != 2:
+        return None
+    rank, post_id = decoded[1]
+    if (isinstance(rank, bool) or not isinstance(rank, (int, float))
+            or not math.isfinite(rank)):
+        return None
+    if isinstance(post_id, bool) or not isinstance(post_id, int):
+        return None
+    return rank, post_id
+
+
+def search(query, cursor=None, per_page=POSTS_COUNT):
+    """Страница результатов по релевантности. Курсор хранит (ранг, id)
+    последнего результата, поэтому страницы не используют OFFSET."""
+    stems = sorted(set(terms(query)))
+    after = _after(cursor)
+    rows = []
+    if stems:
+        ranked = _fts_ranked if uses_fts() else _terms_ranked
+        rows = ranked(stems, after, per_page + 1)
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    posts = Post.objects.in_bulk([post_id for post_id, _ in rows])
+    return CursorPage(
+        [posts[post_id] for post_id, _ in rows if post_id in posts],
+        None,
+        next_cursor=(encode_cursor(NEXT, [rows[-1][1], rows[-1][0]])
+                     if has_next else None),
+        extra_query=urlencode({'q': query}) + '&',
+    )
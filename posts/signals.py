@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# bulk_create() не отправляет post_save, поэтому массовые вставки
+# сообщают о себе отдельно: получатель узнаёт список созданных объектов.
+bulk_created = Signal(providing_args=['objs'])
@@ -0,0 +1,153 @@
+"""Рекомендации «на кого подписаться» по графу подписок.
+
+Подписки — разреженная матрица A: строка читателя — множество авторов,
+на которых он подписан. Оценка автора a для читателя u складывается из:
+
+- друзей друзей: (A·A)[u, a] — число путей u → f → a;
+- похожих читателей: A·Aᵀ даёт число общих подписок u с каждым
+  читателем v, из него получается косинусная близость, и строки A[v]
+  суммируются с этим весом.
+
+numpy и scipy в зависимостях проекта нет, поэтому строки матрицы —
+множества, а произведения — суммы Counter по ненулевым элементам.
+Работа пропорциональна числу рёбер в окрестности читателя, а не размеру
+матрицы. Авторы, у которых подписчиков больше SUGGESTIONS_POPULAR_LIMIT,
+не участвуют в поиске похожих читателей: общая подписка на них почти
+ничего не говорит о сходстве, а окрестность от них разрастается.
+
+rebuild() пересчитывает всех по графу, прочитанному одним запросом,
+refresh() — одного читателя после изменения его подписок. refresh()
+выполняется при подписке, поэтому похожих читателей берёт из последних
+SUGGESTIONS_REFRESH_NEIGHBOURS подписок на его авторов: на выборке
+оценки приблизительны, но время подписки не растёт с числом чужих
+подписок. Рекомендации остальных читателей догоняет rebuild()
+(команда rebuild_suggestions). Готовые
+рекомендации лежат в Suggestion, и показ стоит одного запроса по индексу.
+Оценки считаются вне транзакции, а записываются короткими транзакциями
+по пачкам читателей: SQLite открывает их с BEGIN IMMEDIATE, и одна
+длинная транзакция остановила бы все записи на сайте.
+"""
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import AuthorStats, Follow, Suggestion
+
+# Сколько строк рекомендаций (и не больше стольких читателей)
+# записывается одной транзакцией при полном пересчёте.
+CHUNK = 1000
+
+
+def score(user_id, following, followers):
+    """Лучшие авторы для user_id: список пар (автор, оценка).
+
+    following — строки A: читатель → множество авторов; нужны строки
+    самого читателя, его авторов и похожих читателей. followers —
+    столбцы A для авторов читателя, кроме популярных.
+    """
+    own = following.get(user_id, set())
+    scores = Counter()
+    for friend in own:
+        scores.update(following.get(friend, ()))
+    common = Counter()
+    for author in own:
+        common.update(followers.get(author, ()))
+    common.pop(user_id, None)
+    for reader, shared in common.items():
+        authors = following.get(reader)
+        if not authors:
+            continue
+        similarity = shared / math.sqrt(len(own) * len(authors))
+        for author in authors:
+            scores[author] += similarity
+    for author in own | {user_id}:
+        scores.pop(author, None)
+    return scores.most_common(settings.SUGGESTIONS_PER_USER)
+
+
+def _rows(user_id, scored):
+    return (Suggestion(user_id=user_id, author_id=author_id, score=value)
+            for author_id, value in scored)
+
+
+def rebuild():
+    """Пересчитывает рекомендации всех читателей, возвращает их число."""
+    following = defaultdict(set)
+    followers = defaultdict(set)
+    for user_id, author_id in Follow.objects.order_by().values_list(
+            'user_id', 'author_id').iterator():
+        following[user_id].add(author_id)
+        followers[author_id].add(user_id)
+    followers = {author_id: readers
+                 for author_id, readers in followers.items()
+                 if len(readers) <= settings.SUGGESTIONS_POPULAR_LIMIT}
+    total = 0
+    user_ids = []
+    rows = []
+    for user_id in following:
+        user_ids.append(user_id)
+        rows.extend(_rows(user_id, score(user_id, following, followers)))
+        if len(rows) >= CHUNK or len(user_ids) >= CHUNK:
+            total += _replace(user_ids, rows)
+            user_ids, rows = [], []
+    total += _replace(user_ids, rows)
+    # Читатели, которые ни на кого не подписаны, рекомендаций не имеют.
+    Suggestion.objects.exclude(
+        user_id__in=Follow.objects.values('user_id')
+    ).delete()
+    return total
+
+
+def _replace(user_ids, rows):
+    """Заменяет рекомендации пачки читателей одной короткой транзакцией."""
+    if not user_ids:
+        return 0
+    with transaction.atomic():
+        Suggestion.objects.filter(user_id__in=user_ids).delete()
+        return len(Suggestion.objects.bulk_create(rows))
+
+
+def refresh(user_id):
+    """Пересчитывает рекомендации одного читателя по выборке из его
+    окрестности."""
+    own = set(Follow.objects.filter(user_id=user_id).values_list(
+        'author_id', flat=True
+    ))
+    scored = []
+    if own:
+        popular = AuthorStats.objects.filter(
+            user_id__in=own,
+            followers_count__gt=settings.SUGGESTIONS_POPULAR_LIMIT,
+        ).values('user_id')
+        columns = Follow.objects.filter(author_id__in=own).exclude(
+            author_id__in=popular
+        ).exclude(user_id=user_id).order_by('-id').values_list(
+            'user_id', 'author_id'
+        )[:settings.SUGGESTIONS_REFRESH_NEIGHBOURS]
+        followers = defaultdict(set)
+        for reader, author_id in columns:
+            followers[author_id].add(reader)
+        neighbours = set().union(*followers.values())
+        following = defaultdict(set)
+        following[user_id] = own
+        # Строки авторов читателя и похожих читателей — одним запросом.
+        for reader, author_id in Follow.objects.filter(
+                Q(user_id__in=own) | Q(user_id__in=neighbours)
+        ).exclude(user_id=user_id).order_by().values_list('user_id',
+                                                          'author_id'):
+            following[reader].add(author_id)
+        scored = score(user_id, following, followers)
+    with transaction.atomic():
+        Suggestion.objects.filter(user_id=user_id).delete()
+        Suggestion.objects.bulk_create(_rows(user_id, scored))
+
+
+def for_user(user):
+    if not user.is_authenticated:
+        return []
+    return list(Suggestion.objects.filter(user=user).select_related(
+        'author'
+    )[:settings.SUGGESTIONS_SHOWN])
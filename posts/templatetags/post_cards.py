@@ -0,0 +1,10 @@
+from django import template
+
+from posts import cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    return cards.render_card(post, context.get('user'))
@@ -0,0 +1,140 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Group, Post, User
+from posts.paginator import NEXT, encode_cursor
+from yatube.settings import POSTS_COUNT
+
+
+class TestApi(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author_user = User.objects.create(username='Pushkin')
+        self.group = Group.objects.create(title='Поэзия', slug='poetry')
+        self.posts = [
+            Post.objects.create(text=f'Пост {number}',
+                                author=self.author_user, group=self.group)
+            for number in range(POSTS_COUNT + 2)
+        ]
+        self.post = self.posts[-1]
+        self.comment = Comment.objects.create(
+            text='Комментарий', author=self.author_user, post=self.post
+        )
+        self.client = Client()
+
+    def get_json(self, url, data=None, status=200, **extra):
+        response = self.client.get(url, data, **extra)
+        self.assertEqual(response.status_code, status)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response, json.loads(response.content.decode())
+
+    def test_feed_pages_follow_cursor(self):
+        """Проверяем, что ленты отдаются курсорными страницами, а ссылка
+        на следующую страницу ведёт к оставшимся постам."""
+        expected = [post.pk for post in reversed(self.posts)]
+        for url in (reverse('posts:api_index'),
+                    reverse('posts:api_group', args=[self.group.slug]),
+                    reverse('posts:api_profile',
+                            args=[self.author_user.username])):
+            with self.subTest(url=url):
+                _, first = self.get_json(url)
+                self.assertIsNone(first['previous'])
+                _, second = self.get_json(first['next'])
+                self.assertIsNone(second['next'])
+                self.assertIsNotNone(second['previous'])
+                ids = [item['id'] for item in first['results']]
+                ids += [item['id'] for item in second['results']]
+                self.assertEqual(ids, expected)
+                self.assertEqual(first['results'][0], {
+                    'id': self.post.pk,
+                    'text': self.post.text,
+                    'pub_date': first['results'][0]['pub_date'],
+                    'author': self.author_user.username,
+                    'group': self.group.slug,
+                    'image': None,
+                    'comments_count': 1,
+                })
+
+    def test_fields_selection(self):
+        """Проверяем, что ?fields= оставляет только нужные поля, сохраняется
+        в ссылках на страницы, а неизвестное поле даёт ошибку 400."""
+        url = reverse('posts:api_index')
+        _, page = self.get_json(url, {'fields': 'id,author'})
+        self.assertEqual(page['results'][0],
+                         {'id': self.post.pk, 'author': 'Pushkin'})
+        self.assertIn('fields=id%2Cauthor', page['next'])
+        _, error = self.get_json(url, {'fields': 'id,password'}, status=400)
+        self.assertIn('password', error['detail'])
+
+    def test_broken_cursor_returns_400(self):
+        """Проверяем, что битый курсор или курсор с неверными значениями
+        даёт ошибку 400 в JSON."""
+        url = reverse('posts:api_index')
+        for cursor in ('!!!',
+                       encode_cursor(NEXT, ['2020-13-45T00:00:00', 1]),
+                       encode_cursor(NEXT, ['2020-01-01T00:00:00Z', [1]])):
+            with self.subTest(cursor=cursor):
+                _, error = self.get_json(url, {'cursor': cursor},
+                                         status=400)
+                self.assertIn('курсор', error['detail'])
+
+    def test_post_and_comments(self):
+        """Проверяем, что пост и его комментарии отдаются в JSON."""
+        args = [self.author_user.username, self.post.pk]
+        _, post = self.get_json(reverse('posts:api_post', args=args),
+                                {'fields': 'text'})
+        self.assertEqual(post, {'text': self.post.text})
+        _, comments = self.get_json(reverse('posts:api_comments',
+                                            args=args))
+        self.assertEqual(comments['results'], [{
+            'id': self.comment.pk,
+            'text': self.comment.text,
+            'created': comments['results'][0]['created'],
+            'author': self.author_user.username,
+        }])
+
+    def test_missing_objects_return_json_404(self):
+        """Проверяем, что несуществующие страницы отдают 404 в JSON."""
+        for url in (reverse('posts:api_group', args=['missing']),
+                    reverse('posts:api_profile', args=['missing']),
+                    reverse('posts:api_post', args=['missing', 1]),
+                    reverse('posts:api_comments',
+                            args=[self.author_user.username, 0])):
+            with self.subTest(url=url):
+                self.get_json(url, status=404)
+
+    def test_etag_is_shared_and_tracks_changes(self):
+        """Проверяем, что ETag не зависит от входа и меняется после
+        новой записи."""
+        url = reverse('posts:api_index')
+        response, _ = self.get_json(url)
+        reader = Client()
+        reader.force_login(self.author_user)
+        cached = reader.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        Post.objects.create(text='Свежий пост', author=self.author_user)
+        response, page = self.get_json(url,
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(page['results'][0]['text'], 'Свежий пост')
+
+    def test_archived_post_and_comments(self):
+        """Проверяем, что архивный пост и его комментарии доступны."""
+        Post.objects.filter(pk=self.post.pk).update(
+            pub_date=timezone.now() - timedelta(days=400)
+        )
+        call_command('archive_posts', days=30, stdout=StringIO())
+        args = [self.author_user.username, self.post.pk]
+        _, post = self.get_json(reverse('posts:api_post', args=args))
+        self.assertEqual(post['comments_count'], 1)
+        _, comments = self.get_json(reverse('posts:api_comments',
+                                            args=args))
+        self.assertEqual([item['id'] for item in comments['results']],
+                         [self.comment.pk])
@@ -0,0 +1,110 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import counters
+from posts.models import (ArchivedComment, ArchivedPost, AuthorStats,
+                          Comment, Post, User)
+from yatube.settings import POSTS_COUNT
+
+MAIN_URL = reverse('posts:index')
+
+
+class TestArchive(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author_user = User.objects.create(username='Pushkin')
+        self.client = Client()
+        self.client.force_login(self.author_user)
+        old = timezone.now() - timedelta(days=400)
+        self.old_posts = []
+        for number in range(POSTS_COUNT):
+            post = Post.objects.create(text=f'Старый пост {number}',
+                                       author=self.author_user)
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=old + timedelta(minutes=number)
+            )
+            self.old_posts.append(post)
+        self.comment = Comment.objects.create(
+            text='Старый комментарий', author=self.author_user,
+            post=self.old_posts[0],
+        )
+        self.new_posts = [
+            Post.objects.create(text=f'Новый пост {number}',
+                                author=self.author_user)
+            for number in range(POSTS_COUNT + 1)
+        ]
+        call_command('archive_posts', days=30, batch=3, stdout=StringIO())
+
+    def test_old_posts_moved_with_comments(self):
+        """Проверяем, что старые посты и их комментарии переехали в архив
+        с прежними id, а счётчики не изменились."""
+        old_ids = {post.pk for post in self.old_posts}
+        self.assertFalse(Post.objects.filter(pk__in=old_ids).exists())
+        self.assertEqual(
+            set(ArchivedPost.objects.values_list('pk', flat=True)), old_ids
+        )
+        archived = ArchivedComment.objects.get(pk=self.comment.pk)
+        self.assertEqual(archived.post_id, self.old_posts[0].pk)
+        self.assertEqual(archived.post.comments_count, 1)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.author_user).posts_count, 2 * POSTS_COUNT + 1)
+        self.assertEqual(counters.repair(), 0)
+
+    def test_feed_reads_only_hot_posts(self):
+        """Проверяем, что архивные посты не попадают в ленту."""
+        pages = [self.client.get(MAIN_URL).content.decode(),
+                 self.client.get(MAIN_URL + '?page=2').content.decode()]
+        for page in pages:
+            self.assertNotIn('Старый пост', page)
+
+    def test_post_view_falls_through_to_archive(self):
+        """Проверяем, что страница архивного поста открывается и
+        показывает комментарии, но не форму комментария."""
+        post = self.old_posts[0]
+        url = reverse('posts:post_view', args=[self.author_user.username,
+                                               post.pk])
+        for client in (self.client, Client()):
+            with self.subTest(authenticated=client is self.client):
+                response = client.get(url)
+                self.assertContains(response, post.text)
+                self.assertContains(response, self.comment.text)
+                self.assertNotContains(response, reverse(
+                    'posts:add_comment',
+                    args=[self.author_user.username, post.pk]
+                ))
+                self.assertNotContains(response, reverse(
+                    'posts:post_edit',
+                    args=[self.author_user.username, post.pk]
+                ))
+
+    def test_profile_pages_continue_into_archive(self):
+        """Проверяем, что нумерованные и курсорные страницы профиля
+        продолжаются архивом в порядке публикации."""
+        expected = [post.pk for post in reversed(self.new_posts)]
+        expected += [post.pk for post in reversed(self.old_posts)]
+        url = reverse('posts:profile', args=[self.author_user.username])
+        numbered = []
+        for number in (1, 2, 3):
+            page = self.client.get(url, {'page': number}).context['page']
+            numbered += [post.pk for post in page]
+        self.assertEqual(numbered, expected)
+        cursored = []
+        cursor = ''
+        while cursor is not None:
+            page = self.client.get(url, {'cursor': cursor}).context['page']
+            cursored += [post.pk for post in page]
+            cursor = page.next_cursor
+        self.assertEqual(cursored, expected)
+        previous = self.client.get(
+            url, {'cursor': page.previous_cursor}
+        ).context['page']
+        self.assertEqual([post.pk for post in previous],
+                         expected[-POSTS_COUNT - 1:-1])
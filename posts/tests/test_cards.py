@@ -0,0 +1,65 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase
+
+from posts import cards, generations
+from posts.models import Comment, Group, Post, User
+
+
+def fresh(post):
+    return Post.objects.select_related('author', 'group').get(pk=post.pk)
+
+
+class TestPostCards(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create(username='Pushkin')
+        cls.reader_user = User.objects.create(username='Lermontov')
+        cls.group = Group.objects.create(title='Поэты', slug='poets')
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(text='Тестовый текст',
+                                        author=self.author_user,
+                                        group=self.group)
+
+    def test_card_is_cached(self):
+        """Проверяем, что повторная отрисовка берёт карточку из кеша."""
+        cards.render_card(fresh(self.post))
+        Post.objects.filter(pk=self.post.pk).update(text='Мимо сигналов')
+        self.assertIn('Тестовый текст', cards.render_card(fresh(self.post)))
+
+    def test_edit_button_only_for_author(self):
+        """Проверяем, что кешированная карточка не выдаёт кнопку чужим."""
+        edit = 'Редактировать'
+        self.assertIn(edit, cards.render_card(fresh(self.post),
+                                              self.author_user))
+        self.assertNotIn(edit, cards.render_card(fresh(self.post),
+                                                 self.reader_user))
+        self.assertNotIn(edit, cards.render_card(fresh(self.post),
+                                                 AnonymousUser()))
+
+    def test_card_invalidated_by_changes(self):
+        """Проверяем, что правки поста, комментарии и группа сбрасывают
+        карточку."""
+        cards.render_card(fresh(self.post))
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.assertIn('Новый текст', cards.render_card(fresh(self.post)))
+        Comment.objects.create(text='Комментарий', author=self.reader_user,
+                               post=self.post)
+        self.assertIn('Комментариев: 1', cards.render_card(fresh(self.post)))
+        self.group.title = 'Прозаики'
+        self.group.save()
+        self.assertIn('Прозаики', cards.render_card(fresh(self.post)))
+
+    def test_lost_version_does_not_revive_old_card(self):
+        """Проверяем, что вытесненная версия не возвращает старую
+        карточку."""
+        cards.render_card(fresh(self.post))
+        self.post.text = 'Новый текст'
+        self.post.save()
+        cache.delete(generations.key(cards.POST_CARD, self.post.pk))
+        self.assertIn('Новый текст', cards.render_card(fresh(self.post)))
@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase
+
+from posts.models import (AuthorStats, Comment, Follow, Group, Post,
+                          TimelineEntry, User)
+
+
+class TestDataCommands(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('generate_data', users=30, groups=3, posts=200,
+                     comments=100, follows=60, stdout=StringIO())
+
+    def test_generate_data_creates_rows(self):
+        """Проверяем, что генератор создаёт данные и производные таблицы."""
+        rows = {
+            Group.objects.count(): 3,
+            Post.objects.count(): 200,
+            Comment.objects.count(): 100,
+            AuthorStats.objects.count(): 30,
+        }
+        for count, expected in rows.items():
+            self.assertEqual(count, expected)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertEqual(
+            sum(AuthorStats.objects.values_list('posts_count', flat=True)),
+            200
+        )
+
+    def test_bench_views_writes_report(self):
+        """Проверяем, что бенчмарк пишет отчёт по всем сценариям."""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('bench_views', requests=2, warmup=0,
+                         deep_page=1, output=output, stdout=StringIO())
+            with open(output) as report_file:
+                report = json.load(report_file)
+        for name in ('index', 'profile', 'follow_index', 'post_view'):
+            with self.subTest(scenario=name):
+                scenario = report['scenarios'][name]
+                self.assertEqual(scenario['statuses'], {'200 OK': 2})
+                self.assertGreater(scenario['queries_per_request'], 0)
+                self.assertIsNotNone(scenario['p99_ms'])
+        self.assertFalse(Session.objects.exists())
+
+    def test_bench_views_needs_requests(self):
+        """Проверяем, что бенчмарк без запросов не запускается."""
+        with self.assertRaises(CommandError):
+            call_command('bench_views', requests=0, warmup=0,
+                         output=os.devnull, stdout=StringIO())
+
+    def test_cold_cache_bench_keeps_server_cache(self):
+        """Проверяем, что бенчмарк с холодным кешем очищает свой кеш,
+        а не кеш сервера."""
+        cache.set('kept', 1)
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('bench_views', requests=1, warmup=0, deep_page=1,
+                         cold_cache=True, allocation_samples=1,
+                         output=os.path.join(directory, 'bench.json'),
+                         stdout=StringIO())
+        self.assertEqual(cache.get('kept'), 1)
+
+    def test_index_advisor_finds_no_missing_indexes(self):
+        """Проверяем, что страницам хватает индексов моделей."""
+        output = StringIO()
+        cache.set('kept', 1)
+        call_command('index_advisor', check=True, stdout=output)
+        self.assertIn('Новых индексов не нужно', output.getvalue())
+        self.assertEqual(cache.get('kept'), 1)
+
+
+class TestGenerateData(TestCase):
+
+    def generate(self, **options):
+        call_command('generate_data', comments=10, follows=10,
+                     stdout=StringIO(), **options)
+
+    def test_generator_uses_existing_keys(self):
+        """Проверяем, что генератор работает без групп и ссылается только
+        на существующих пользователей, даже если между ключами пропуски."""
+        self.generate(users=6, groups=0, posts=10)
+        user_ids = list(
+            User.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        User.objects.filter(pk__in=user_ids[1:5:2]).delete()
+        self.generate(users=0, groups=0, posts=20)
+        users = User.objects.all()
+        self.assertFalse(Post.objects.exclude(author__in=users).exists())
+        self.assertFalse(Comment.objects.exclude(author__in=users).exists())
+        self.assertFalse(Follow.objects.exclude(author__in=users).exists())
+        self.assertFalse(Post.objects.exclude(group=None).exists())
+
+
+class TestDatabaseBenchmark(TransactionTestCase):
+    """Копия базы снимается через backup API, а он не дождётся конца
+    транзакции, которую держит TestCase."""
+
+    def setUp(self):
+        call_command('generate_data', users=5, groups=1, posts=30,
+                     comments=5, follows=5, stdout=StringIO())
+
+    def test_bench_database_compares_profiles(self):
+        """Проверяем, что бенчмарк базы прогоняет оба профиля без
+        ошибок блокировки в настроенном."""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('bench_database', threads=2, seconds=0.3,
+                         output=output, stdout=StringIO())
+            with open(output) as report_file:
+                report = json.load(report_file)
+        for name in ('plain', 'tuned'):
+            with self.subTest(profile=name):
+                self.assertGreater(report['profiles'][name]['reads'], 0)
+        self.assertEqual(report['profiles']['tuned']['engine'],
+                         'yatube.sqlite')
+        self.assertEqual(report['profiles']['tuned']['locked'], 0)
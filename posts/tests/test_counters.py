@@ -0,0 +1,96 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import AuthorStats, Comment, Post, User
+
+AUTHOR_USERNAME = 'Pushkin'
+PROFILE_URL = reverse('posts:profile', args=[AUTHOR_USERNAME])
+FOLLOW_URL = reverse('posts:profile_follow', args=[AUTHOR_USERNAME])
+UNFOLLOW_URL = reverse('posts:profile_unfollow', args=[AUTHOR_USERNAME])
+NEW_POST_URL = reverse('posts:new_post')
+
+
+class TestCounters(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create(username=AUTHOR_USERNAME)
+        cls.follower_user = User.objects.create(username='Block')
+        cls.post = Post.objects.create(text='Тестовый текст',
+                                       author=cls.author_user)
+        cls.COMMENT_URL = reverse('posts:add_comment',
+                                  args=[AUTHOR_USERNAME, cls.post.id])
+
+    def setUp(self):
+        self.author = Client()
+        self.author.force_login(self.author_user)
+        self.follower = Client()
+        self.follower.force_login(self.follower_user)
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_write_paths_update_counters(self):
+        """Проверяем, что счётчики меняются вместе с данными."""
+        self.author.post(NEW_POST_URL, data={'text': 'Новый текст'})
+        self.follower.post(self.COMMENT_URL, data={'text': 'Комментарий'})
+        self.follower.get(FOLLOW_URL)
+        self.post.refresh_from_db()
+        counters = {
+            self.stats(self.author_user).posts_count: 2,
+            self.stats(self.author_user).followers_count: 1,
+            self.stats(self.follower_user).following_count: 1,
+            self.post.comments_count: 1,
+        }
+        for counter, expected in counters.items():
+            self.assertEqual(counter, expected)
+        self.follower.get(UNFOLLOW_URL)
+        Comment.objects.all().delete()
+        Post.objects.exclude(pk=self.post.pk).delete()
+        self.post.refresh_from_db()
+        counters = {
+            self.stats(self.author_user).posts_count: 1,
+            self.stats(self.author_user).followers_count: 0,
+            self.stats(self.follower_user).following_count: 0,
+            self.post.comments_count: 0,
+        }
+        for counter, expected in counters.items():
+            self.assertEqual(counter, expected)
+
+    def test_bulk_created_comments_counted(self):
+        """Проверяем, что bulk_create комментариев учитывается."""
+        Comment.objects.bulk_create(
+            Comment(text=f'Комментарий {number}', author=self.author_user,
+                    post=self.post) for number in range(3)
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 3)
+
+    def test_repair_counters_command(self):
+        """Проверяем, что команда исправляет разошедшиеся счётчики."""
+        Post.objects.filter(pk=self.post.pk).update(comments_count=5)
+        AuthorStats.objects.filter(user=self.author_user).update(
+            posts_count=7
+        )
+        AuthorStats.objects.filter(user=self.follower_user).delete()
+        out = StringIO()
+        call_command('repair_counters', stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertEqual(self.stats(self.author_user).posts_count, 1)
+        self.assertEqual(self.stats(self.follower_user).following_count, 0)
+        self.assertIn('2', out.getvalue())
+
+    def test_profile_renders_without_aggregates(self):
+        """Проверяем, что COUNT на профиле остался только у пагинатора."""
+        with CaptureQueriesContext(connection) as queries:
+            self.author.get(PROFILE_URL)
+        counts = [query['sql'] for query in queries.captured_queries
+                  if 'COUNT(' in query['sql']]
+        self.assertEqual(len(counts), 1, counts)
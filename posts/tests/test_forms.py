@@ -3,7 +3,7 @@ import tempfile
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from posts.models import Comment, Group, Post, User
@@ -26,7 +26,10 @@ class TestForm(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.MEDIA_ROOT)
+        cls.media = override_settings(
+            MEDIA_ROOT=tempfile.mkdtemp(dir=settings.MEDIA_ROOT)
+        )
+        cls.media.enable()
         cls.guest = Client()
         cls.not_author = Client()
         cls.not_author_user = User.objects.create(username='Block')
@@ -65,6 +68,7 @@ class TestForm(TestCase):
     @classmethod
     def tearDownClass(cls):
         shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media.disable()
         super().tearDownClass()
 
     def test_new_form_for_guest(self):
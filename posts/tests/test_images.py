@@ -0,0 +1,119 @@
+import json
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post, User
+
+NEW_POST_URL = reverse('posts:new_post')
+MAIN_URL = reverse('posts:index')
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+# Тег EXIF Orientation: 6 — снимок нужно повернуть на 90° по часовой.
+ORIENTATION = 0x0112
+# Ссылка на блок координат GPS.
+GPS = 0x8825
+
+
+def rotated_jpeg():
+    """Альбомный кадр 1200x600, записанный боком с пометкой в EXIF."""
+    image = Image.new('RGB', (600, 1200), 'red')
+    exif = Image.Exif()
+    exif[ORIENTATION] = 6
+    exif[GPS] = {1: 'N', 2: (55.0, 45.0, 0.0)}
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class TestImageVariants(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = override_settings(
+            MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR)
+        )
+        cls.media.enable()
+        cls.author_user = User.objects.create(username='Pushkin')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media.disable()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.author = Client()
+        self.author.force_login(self.author_user)
+
+    def upload(self, name, content):
+        self.author.post(NEW_POST_URL, data={
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name=name, content=content),
+        })
+        return json.loads(Post.objects.latest('pk').image_variants)
+
+    def test_tiny_gif_gets_variants(self):
+        """Проверяем, что крошечный GIF даёт WebP и JPEG без ошибок."""
+        variants = self.upload('tiny.gif', SMALL_GIF)
+        self.assertEqual(len(variants), 1)
+        for extension in ('webp', 'jpeg'):
+            with default_storage.open(variants[0][extension]) as file:
+                self.assertEqual(Image.open(file).format, extension.upper())
+
+    def test_orientation_fixed_and_metadata_stripped(self):
+        """Проверяем поворот по EXIF, удаление метаданных и ширины."""
+        variants = self.upload('photo.jpg', rotated_jpeg())
+        self.assertEqual([variant['width'] for variant in variants],
+                         [480, 960])
+        with default_storage.open(variants[-1]['jpeg']) as file:
+            image = Image.open(file)
+            self.assertEqual(image.size, (960, 339))
+            self.assertNotIn(ORIENTATION, image.getexif())
+
+    def test_card_uses_srcset(self):
+        """Проверяем, что карточка выводит srcset и ленивую загрузку."""
+        self.upload('tiny.gif', SMALL_GIF)
+        content = self.author.get(MAIN_URL).content.decode()
+        self.assertIn('type="image/webp"', content)
+        self.assertIn('srcset=', content)
+        self.assertIn('loading="lazy"', content)
+
+    def test_original_is_stored_without_metadata(self):
+        """Проверяем, что исходник сохраняется повёрнутым и без EXIF,
+        в том числе без координат."""
+        self.upload('photo.jpg', rotated_jpeg())
+        post = Post.objects.latest('pk')
+        with default_storage.open(post.image.name) as file:
+            image = Image.open(file)
+            self.assertEqual(image.size, (1200, 600))
+            self.assertEqual(dict(image.getexif()), {})
+
+    def test_variants_follow_saves_outside_the_form(self):
+        """Проверяем, что варианты готовятся и сбрасываются при сохранении
+        модели, например из админки, а не только через форму."""
+        post = Post.objects.create(
+            text='Пост', author=self.author_user,
+            image=SimpleUploadedFile(name='tiny.gif', content=SMALL_GIF),
+        )
+        self.assertEqual(len(json.loads(post.image_variants)), 1)
+        post.image = None
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants, '')
@@ -0,0 +1,71 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.loaders import DataLoader, load_posts
+from posts.models import Comment, Group, Post, User
+from posts.paginator import CursorPaginator
+from yatube.settings import POSTS_COUNT
+
+MAIN_URL = reverse('posts:index')
+
+
+class TestDataLoader(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create(username='Pushkin')
+        cls.post = Post.objects.create(text='Тестовый текст',
+                                       author=cls.author_user)
+
+    def setUp(self):
+        cache.clear()
+
+    def add_posts(self, number):
+        start = Post.objects.count()
+        for index in range(start, start + number):
+            author = User.objects.create(username=f'author_{index}')
+            group = Group.objects.create(title=f'Группа {index}',
+                                         slug=f'group_{index}')
+            post = Post.objects.create(text=f'Текст {index}', author=author,
+                                       group=group)
+            Comment.objects.create(text='Комментарий', author=author,
+                                   post=post)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            Client().get(url)
+        return len(queries.captured_queries)
+
+    def test_index_queries_do_not_grow_with_page(self):
+        """Проверяем, что число запросов не зависит от числа карточек."""
+        self.add_posts(1)
+        small_page = self.count_queries(MAIN_URL)
+        self.add_posts(POSTS_COUNT)
+        self.assertEqual(self.count_queries(MAIN_URL), small_page)
+
+    def test_loader_attaches_related_objects(self):
+        """Проверяем, что загрузчик подставляет авторов и группы."""
+        self.add_posts(3)
+        page = CursorPaginator(Post.objects.filter(group__isnull=False),
+                               POSTS_COUNT).get_page()
+        with self.assertNumQueries(2):
+            load_posts(page)
+        with self.assertNumQueries(0):
+            for post in page:
+                self.assertEqual(post.author.pk, post.author_id)
+                self.assertEqual(post.group.pk, post.group_id)
+
+    def test_primed_objects_are_not_queried(self):
+        """Проверяем, что известные объекты не запрашиваются повторно."""
+        page = CursorPaginator(Post.objects.filter(pk=self.post.pk),
+                               POSTS_COUNT).get_page()
+        loader = DataLoader()
+        loader.prime(self.author_user)
+        with self.assertNumQueries(0):
+            load_posts(page, loader)
+        self.assertIs(page[0].author, self.author_user)
@@ -0,0 +1,151 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from yatube import metrics
+
+MAIN_URL = reverse('posts:index')
+METRICS_URL = reverse('metrics')
+NEW_POST_URL = reverse('posts:new_post')
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class TestMetrics(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings = override_settings(
+            METRICS_DIR=os.path.join(self.directory, 'metrics'),
+            MEDIA_ROOT=os.path.join(self.directory, 'media'),
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author_user = User.objects.create(username='Pushkin')
+        Post.objects.create(text='Пост', author=self.author_user)
+        self.guest = Client()
+
+    def scrape(self):
+        response = self.guest.get(METRICS_URL)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode().splitlines()
+
+    def test_requests_are_counted_per_view(self):
+        """Проверяем, что время, коды ответов и число запросов к базе
+        записываются по имени адреса."""
+        for _ in range(2):
+            self.assertEqual(self.guest.get(MAIN_URL).status_code, 200)
+        self.guest.get('/no/such/page/')
+        lines = self.scrape()
+        for line in (
+            'yatube_responses_total{view="posts:index",status="200"} 2',
+            'yatube_responses_total{view="unmatched",status="404"} 1',
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 2',
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            'yatube_db_queries_per_request_count{view="posts:index"} 2',
+            '# TYPE yatube_request_duration_seconds histogram',
+        ):
+            self.assertIn(line, lines)
+
+    def test_metric_without_samples_cannot_be_created(self):
+        """Проверяем, что метрику без samples() не создать."""
+        with self.assertRaises(TypeError):
+            metrics.Metric('yatube_broken', 'Без выдачи')
+
+    def test_series_of_all_processes_are_summed(self):
+        """Проверяем, что ряды из файлов других процессов складываются
+        с рядами текущего, а доля попаданий в кеш считается по сумме."""
+        metrics.RESPONSES.inc(view='posts:index', status=200)
+        metrics.CACHE_REQUESTS.inc(2, result='hit')
+        other = metrics._File(
+            os.path.join(self.directory, 'metrics', f'0{metrics.SUFFIX}'),
+            capacity=8,
+        )
+        other.add(('yatube_responses_total', ('posts:index', '200'), ''), 4)
+        other.add(('yatube_cache_requests_total', ('hit',), ''), 1)
+        other.add(('yatube_cache_requests_total', ('miss',), ''), 1)
+        lines = self.scrape()
+        self.assertIn(
+            'yatube_responses_total{view="posts:index",status="200"} 5',
+            lines
+        )
+        self.assertIn('yatube_cache_hit_ratio 0.75', lines)
+
+    def test_upload_and_thumbnails_are_measured(self):
+        """Проверяем, что загрузка картинки записывает её размер и время
+        нарезки каждого варианта."""
+        author = Client()
+        author.force_login(self.author_user)
+        author.post(NEW_POST_URL, {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile('image.gif', SMALL_GIF,
+                                        content_type='image/gif'),
+        })
+        lines = self.scrape()
+        self.assertIn(f'yatube_upload_bytes_sum {len(SMALL_GIF)}', lines)
+        for extension in ('webp', 'jpeg'):
+            self.assertIn(
+                f'yatube_thumbnail_seconds_count{{format="{extension}"}} 1',
+                lines
+            )
+
+    def test_scrape_is_limited_to_allowed_addresses(self):
+        """Проверяем, что чужой адрес не получает метрики, в том числе
+        через прокси на этой же машине."""
+        response = Client(REMOTE_ADDR='10.0.0.1').get(METRICS_URL)
+        self.assertEqual(response.status_code, 403)
+        proxied = Client(HTTP_X_FORWARDED_FOR='203.0.113.5, 127.0.0.1')
+        self.assertEqual(proxied.get(METRICS_URL).status_code, 403)
+        local = Client(HTTP_X_FORWARDED_FOR='127.0.0.1')
+        self.assertEqual(local.get(METRICS_URL).status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_scrape_with_token(self):
+        """Проверяем, что с токеном метрики отдаются только по нему."""
+        self.assertEqual(self.guest.get(METRICS_URL).status_code, 403)
+        response = Client(REMOTE_ADDR='10.0.0.1').get(
+            METRICS_URL, HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_files_of_dead_processes_are_merged(self):
+        """Проверяем, что ряды завершённых процессов и прежнего процесса
+        с тем же pid переносятся в общий файл, их файлы удаляются, а свой
+        файл процесс начинает с нуля."""
+        directory = os.path.join(self.directory, 'metrics')
+        os.makedirs(directory)
+        dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+        dead.wait()
+        key = ('yatube_responses_total', ('posts:index', '200'), '')
+        for pid, amount in ((dead.pid, 4), (os.getpid(), 2)):
+            metrics._File(os.path.join(directory, f'{pid}{metrics.SUFFIX}'),
+                          capacity=8).add(key, amount)
+        metrics.RESPONSES.inc(view='posts:index', status=200)
+        self.assertEqual(
+            sorted(name for name in os.listdir(directory)
+                   if name.endswith(metrics.SUFFIX)),
+            sorted([metrics.AGGREGATE, f'{os.getpid()}{metrics.SUFFIX}'])
+        )
+        with open(os.path.join(directory, f'{os.getpid()}{metrics.SUFFIX}'),
+                  'rb') as own:
+            self.assertEqual([value for _, _, value in
+                              metrics._slots(own.read())], [1])
+        self.assertIn(
+            'yatube_responses_total{view="posts:index",status="200"} 7',
+            self.scrape()
+        )
@@ -0,0 +1,210 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts import counters
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry,
+                          User)
+
+
+class TestExport(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.author_user = User.objects.create(username='Pushkin')
+        self.reader_user = User.objects.create(username='Reader')
+        self.group = Group.objects.create(title='Поэзия', slug='poetry',
+                                          description='Стихи')
+        self.posts = [
+            Post.objects.create(text=f'Пост {number}',
+                                author=self.author_user,
+                                group=self.group if number % 2 else None)
+            for number in range(5)
+        ]
+        self.comment = Comment.objects.create(
+            text='Комментарий', author=self.reader_user, post=self.posts[0]
+        )
+        Follow.objects.create(user=self.reader_user, author=self.author_user)
+
+    def export(self, *args, **options):
+        stderr = StringIO()
+        path = os.path.join(self.directory, 'export.ndjson.gz')
+        call_command('export_ndjson', path, *args, stderr=stderr,
+                     **options)
+        with gzip.open(path, 'rt', encoding='utf-8') as export:
+            return [json.loads(line) for line in export], stderr.getvalue()
+
+    def test_export_writes_every_model(self):
+        """Проверяем, что выгрузка содержит все модели, а связи записаны
+        именами пользователей и slug групп."""
+        rows, report = self.export(batch=2)
+        self.assertEqual([row['model'] for row in rows],
+                         ['group'] + ['post'] * 5 + ['comment', 'follow'])
+        self.assertEqual(rows[2], {
+            'model': 'post',
+            'id': self.posts[1].pk,
+            'text': 'Пост 1',
+            'pub_date': self.posts[1].pub_date.isoformat(),
+            'author': 'Pushkin',
+            'group': 'poetry',
+            'image': None,
+        })
+        self.assertEqual(rows[-2]['post'], self.posts[0].pk)
+        self.assertEqual(rows[-2]['author'], 'Reader')
+        self.assertEqual((rows[-1]['user'], rows[-1]['author']),
+                         ('Reader', 'Pushkin'))
+        self.assertIn('Выгружено строк: 8', report)
+
+    def test_incremental_export(self):
+        """Проверяем, что --since по id выгружает только новые строки, а
+        группы — целиком."""
+        rows, _ = self.export(since=f'post={self.posts[2].pk}',
+                              models=['group', 'post'])
+        self.assertEqual([row.get('slug') or row['id'] for row in rows],
+                         ['poetry', self.posts[3].pk, self.posts[4].pk])
+        rows, _ = self.export(since='2000-01-01', models=['comment'])
+        self.assertEqual([row['id'] for row in rows], [self.comment.pk])
+        rows, _ = self.export(since='2999-01-01', models=['post'])
+        self.assertEqual(rows, [])
+        with self.assertRaises(CommandError):
+            self.export(since=str(self.posts[2].pk))
+
+    def test_next_export_continues_every_table(self):
+        """Проверяем, что выгрузка с предложенным --since отдаёт ровно
+        новые строки каждой таблицы: id у таблиц свои."""
+        _, report = self.export()
+        since = report.split('Следующая выгрузка: --since ')[1].split()[0]
+        comment = Comment.objects.create(text='Новый комментарий',
+                                         author=self.author_user,
+                                         post=self.posts[4])
+        follow = Follow.objects.create(user=self.author_user,
+                                       author=self.reader_user)
+        rows, _ = self.export(since=since)
+        self.assertEqual([(row['model'], row['id']) for row in rows[1:]],
+                         [('comment', comment.pk), ('follow', follow.pk)])
+
+
+class TestImport(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'import.ndjson')
+        self.author_user = User.objects.create(username='Pushkin')
+
+    def write(self, *rows):
+        with open(self.path, 'w', encoding='utf-8') as source:
+            for row in rows:
+                source.write(row if isinstance(row, str)
+                             else json.dumps(row, ensure_ascii=False))
+                source.write('\n')
+
+    def load(self, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_ndjson', self.path, stdout=stdout,
+                     stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_round_trip_keeps_rows_and_rebuilds_derived_tables(self):
+        """Проверяем, что выгрузка загружается в пустую базу с теми же
+        id, а счётчики и ленты пересобраны."""
+        reader = User.objects.create(username='Reader')
+        group = Group.objects.create(title='Поэзия', slug='poetry')
+        post = Post.objects.create(text='Пост', author=self.author_user,
+                                   group=group)
+        Comment.objects.create(text='Комментарий', author=reader, post=post)
+        Follow.objects.create(user=reader, author=self.author_user)
+        call_command('export_ndjson', self.path, stderr=StringIO())
+        pub_date = post.pub_date
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.assertFalse(Post.objects.exists())
+        report, errors = self.load(create_users=True, batch=2)
+        self.assertEqual(errors, '')
+        self.assertIn('Загружено строк: 4', report)
+        post = Post.objects.select_related('author', 'group').get(pk=post.pk)
+        self.assertEqual((post.author.username, post.group.slug),
+                         ('Pushkin', 'poetry'))
+        self.assertEqual(post.pub_date, pub_date)
+        self.assertEqual(post.comments_count, 1)
+        reader = User.objects.get(username='Reader')
+        self.assertEqual(reader.stats.following_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(user=reader,
+                                                     post=post).exists())
+        self.assertEqual(counters.repair(), 0)
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+
+    def test_invalid_rows_are_rejected(self):
+        """Проверяем, что строки с ошибками и неизвестными ссылками
+        отклоняются с номером строки, а остальные загружаются."""
+        post = {'model': 'post', 'text': 'Пост', 'author': 'Pushkin',
+                'pub_date': '2020-01-01T00:00:00+00:00'}
+        self.write(
+            post,
+            'не json',
+            {**post, 'pub_date': 'вчера'},
+            {**post, 'author': 'Nobody'},
+            {**post, 'group': 'missing'},
+            {'model': 'comment', 'post': 10 ** 6, 'author': 'Pushkin',
+             'text': 'Комментарий', 'created': '2020-01-01'},
+        )
+        _, errors = self.load()
+        for number in (2, 3, 4, 5, 6):
+            self.assertIn(f'Строка {number}:', errors)
+        self.assertEqual(list(Post.objects.values_list('text', flat=True)),
+                         ['Пост'])
+        self.write(*[{**post, 'author': 'Nobody'}] * 3)
+        with self.assertRaises(CommandError):
+            self.load(max_errors=2)
+
+    def test_repeated_load_does_not_duplicate_rows(self):
+        """Проверяем, что повторная загрузка того же файла, в том числе
+        строк без id, ничего не удваивает и не считается загруженной,
+        а ленты получают только новые посты."""
+        reader = User.objects.create(username='Reader')
+        Follow.objects.create(user=reader, author=self.author_user)
+        Group.objects.create(title='Поэзия', slug='poetry')
+        self.write(
+            {'model': 'group', 'title': 'Поэзия', 'slug': 'poetry'},
+            {'model': 'post', 'text': 'Без id', 'author': 'Pushkin',
+             'pub_date': '2020-01-01T00:00:00+03:00'},
+            {'model': 'post', 'id': 500, 'text': 'С id', 'author': 'Pushkin',
+             'pub_date': '2020-01-02T00:00:00Z'},
+            {'model': 'follow', 'user': 'Reader', 'author': 'Pushkin'},
+        )
+        report, _ = self.load()
+        self.assertIn('Загружено строк: 2', report)
+        self.assertIn('уже были в базе: 2,', report)
+        self.assertIn('Ленты', report)
+        self.assertEqual(TimelineEntry.objects.filter(user=reader).count(),
+                         2)
+        report, _ = self.load()
+        self.assertIn('Загружено строк: 0', report)
+        self.assertIn('уже были в базе: 4,', report)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertNotIn('Ленты', report)
+
+    def test_resume_from_checkpoint(self):
+        """Проверяем, что загрузка продолжается после записанной строки."""
+        self.write(*[
+            {'model': 'post', 'id': 100 + number, 'text': f'Пост {number}',
+             'author': 'Pushkin', 'pub_date': '2020-01-01T00:00:00Z'}
+            for number in range(4)
+        ])
+        with open(f'{self.path}.checkpoint', 'w') as checkpoint:
+            checkpoint.write('2')
+        report, _ = self.load()
+        self.assertIn('Продолжаем после строки 2', report)
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list('pk', flat=True)),
+            [102, 103]
+        )
@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from posts import views
+from posts.models import Comment, Follow, Group, Post, User
+
+MAIN_URL = reverse('posts:index')
+
+
+class TestAnonymousPageCache(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create(username='Pushkin')
+        cls.group = Group.objects.create(title='Поэты', slug='poets')
+        cls.post = Post.objects.create(text='Тестовый текст',
+                                       author=cls.author_user,
+                                       group=cls.group)
+        cls.urls = [
+            MAIN_URL,
+            reverse('posts:group_posts', args=[cls.group.slug]),
+            reverse('posts:profile', args=[cls.author_user.username]),
+            reverse('posts:post_view', args=[cls.author_user.username,
+                                             cls.post.id]),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+
+    def test_validators_match_without_view(self):
+        """Проверяем, что при совпадении ETag view не вызывается."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.guest.get(url)['ETag']
+                cache.delete(f'anonymous_page:{etag}')
+                with mock.patch.object(views, 'render') as render:
+                    response = self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                render.assert_not_called()
+
+    def test_if_modified_since_does_not_hide_edits(self):
+        """Проверяем, что страница отдаётся без Last-Modified, и клиент,
+        который шлёт только If-Modified-Since, видит правку поста."""
+        response = self.guest.get(MAIN_URL)
+        self.assertFalse(response.has_header('Last-Modified'))
+        since = http_date()
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный текст'
+        post.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest.get(url, HTTP_IF_MODIFIED_SINCE=since)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Исправленный текст',
+                              response.content.decode())
+
+    def test_cached_page_served_until_change(self):
+        """Проверяем, что страница берётся из кеша до первого изменения."""
+        post_url = self.urls[3]
+        first = self.guest.get(post_url).content
+        Post.objects.filter(pk=self.post.pk).update(text='Мимо сигналов')
+        self.assertEqual(self.guest.get(post_url).content, first)
+        Comment.objects.create(text='Новый комментарий',
+                               author=self.author_user, post=self.post)
+        self.assertIn('Новый комментарий',
+                      self.guest.get(post_url).content.decode())
+
+    def test_follow_changes_profile(self):
+        """Проверяем, что подписка меняет ETag профиля."""
+        profile_url = self.urls[2]
+        etag = self.guest.get(profile_url)['ETag']
+        Follow.objects.create(
+            user=User.objects.create(username='Lermontov'),
+            author=self.author_user,
+        )
+        self.assertNotEqual(self.guest.get(profile_url)['ETag'], etag)
+
+    def test_authorized_users_bypass_cache(self):
+        """Проверяем, что страницы авторизованных не кешируются целиком."""
+        client = Client()
+        client.force_login(self.author_user)
+        response = client.get(MAIN_URL)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIsNotNone(response.context)
@@ -0,0 +1,98 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post, User
+from posts.paginator import NEXT, encode_cursor
+from yatube.settings import POSTS_COUNT
+
+MAIN_URL = reverse('posts:index')
+POSTS_TOTAL = POSTS_COUNT * 2 + 3
+
+
+class TestCursorPaginator(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create(username='Pushkin')
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст {number}', author=cls.author_user)
+            for number in range(POSTS_TOTAL)
+        )
+        cls.post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(text=f'Комментарий {number}', author=cls.author_user,
+                    post=cls.post)
+            for number in range(POSTS_COUNT + 1)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+
+    def walk(self, url):
+        pages = []
+        cursor = ''
+        while cursor is not None:
+            page = self.guest.get(url, {'cursor': cursor}).context['page']
+            pages.append(page)
+            cursor = page.next_cursor
+        return pages
+
+    def test_cursor_pages_cover_all_posts(self):
+        """Проверяем, что курсорные страницы проходят все посты по порядку."""
+        pages = self.walk(MAIN_URL)
+        posts = [post for page in pages for post in page]
+        self.assertEqual([len(page) for page in pages],
+                         [POSTS_COUNT, POSTS_COUNT, 3])
+        self.assertEqual(posts, list(Post.objects.order_by('-pub_date',
+                                                           '-id')))
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Проверяем, что переход назад возвращает ту же страницу."""
+        first, second, _ = self.walk(MAIN_URL)
+        self.assertFalse(first.has_previous())
+        page = self.guest.get(
+            MAIN_URL, {'cursor': second.previous_cursor}
+        ).context['page']
+        self.assertEqual(list(page), list(first))
+
+    def test_cursor_page_has_no_count_query(self):
+        """Проверяем, что курсорная страница не считает COUNT(*)."""
+        second_cursor = self.walk(MAIN_URL)[0].next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.guest.get(MAIN_URL, {'cursor': second_cursor})
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'COUNT(' in query['sql']])
+
+    def test_comments_cursor_pages(self):
+        """Проверяем курсорную пагинацию комментариев."""
+        url = reverse('posts:post_view',
+                      args=[self.author_user.username, self.post.id])
+        pages = self.walk(url)
+        self.assertEqual([len(page) for page in pages], [POSTS_COUNT, 1])
+
+    def test_broken_cursor_returns_first_page(self):
+        """Проверяем, что битый курсор открывает первую страницу."""
+        page = self.guest.get(MAIN_URL, {'cursor': '!!!'}).context['page']
+        self.assertEqual(len(page), POSTS_COUNT)
+        self.assertFalse(page.has_previous())
+
+    def test_cursor_with_invalid_values_returns_first_page(self):
+        """Проверяем, что курсор с несуществующей датой, значениями не
+        того типа или пустыми значениями открывает первую страницу."""
+        for values in (['2020-13-45T00:00:00', 1],
+                       ['2020-01-01T00:00:00+00:00', [1]],
+                       [{'date': 1}, 'id'],
+                       [None, None]):
+            with self.subTest(values=values):
+                response = self.guest.get(
+                    MAIN_URL, {'cursor': encode_cursor(NEXT, values)}
+                )
+                self.assertEqual(response.status_code, 200)
+                page = response.context['page']
+                self.assertEqual(len(page), POSTS_COUNT)
+                self.assertFalse(page.has_previous())
@@ -0,0 +1,229 @@
+import os
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import resize
+from posts.models import Comment, Follow, Group, Post, User
+
+# Размеры таблиц, на которых проверяются страницы. Для прогона
+# на больших объёмах: QUERY_BUDGET_SIZES=10,1000,100000
+SIZES = [int(size) for size in os.environ.get(
+    'QUERY_BUDGET_SIZES', '10,1000'
+).split(',')]
+
+# Во сколько раз может вырасти работа SQLite (шаги виртуальной машины)
+# на курсорной странице, пока таблицы растут от меньшего размера
+# к большему. Линейный рост даёт кратно большие значения.
+STEPS_GROWTH_LIMIT = 3
+
+# Верхняя граница числа запросов для каждой страницы.
+QUERY_BUDGETS = {
+    'posts:index': 6,
+    'posts:group_posts': 6,
+    'posts:profile': 8,
+    'posts:post_view': 7,
+    'posts:follow_index': 8,
+    'posts:new_post': 3,
+    'posts:post_edit': 4,
+    'posts:add_comment': 6,
+    'posts:profile_follow': 2,
+    'posts:profile_unfollow': 2,
+    'posts:page_not_found': 3,
+    'posts:server_error': 3,
+    'posts:search': 6,
+    'posts:resize': 2,
+    'posts:api_index': 2,
+    'posts:api_group': 3,
+    'posts:api_profile': 4,
+    'posts:api_post': 2,
+    'posts:api_comments': 3,
+    'signup': 2,
+    'about:author': 2,
+    'about:tech': 2,
+    'metrics': 0,
+}
+
+# Страницы списков, которые в курсорном режиме должны стоить одинаково
+# на любом объёме данных.
+CURSOR_URLS = (
+    'posts:index',
+    'posts:group_posts',
+    'posts:profile',
+    'posts:post_view',
+    'posts:follow_index',
+)
+
+
+def grow(size):
+    """Доводит Group, Post, Comment и Follow до size строк (групп и
+    пользователей — в десять раз меньше)."""
+    users_count = max(10, size // 10)
+    existing = User.objects.filter(username__startswith='user_').count()
+    User.objects.bulk_create(
+        User(username=f'user_{number}')
+        for number in range(existing, users_count)
+    )
+    users = list(User.objects.filter(
+        username__startswith='user_'
+    ).order_by('pk').values_list('pk', flat=True))
+    groups_count = max(1, size // 10)
+    existing = Group.objects.count()
+    Group.objects.bulk_create(
+        Group(title=f'Группа {number}', slug=f'group_{number}')
+        for number in range(existing, groups_count)
+    )
+    groups = list(Group.objects.order_by('pk').values_list('pk', flat=True))
+    existing = Post.objects.count()
+    Post.objects.bulk_create(
+        (Post(text=f'Текст {number}',
+              author_id=users[number % len(users)],
+              group_id=groups[number % len(groups)])
+         for number in range(existing, size)),
+        batch_size=100,
+    )
+    posts = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+    existing = Comment.objects.count()
+    Comment.objects.bulk_create(
+        (Comment(text=f'Комментарий {number}',
+                 author_id=users[number % len(users)],
+                 post_id=posts[0] if number % 2 else posts[number % size])
+         for number in range(existing, size)),
+        batch_size=100,
+    )
+    Follow.objects.bulk_create(
+        (Follow(user_id=users[number % len(users)],
+                author_id=users[(number + 1 + number // len(users))
+                                % len(users)])
+         for number in range(Follow.objects.count(), size)),
+        batch_size=100,
+        ignore_conflicts=True,
+    )
+
+
+class TestQueryBudget(TestCase):
+    """Число запросов каждой страницы не должно зависеть от объёма
+    таблиц и размера страницы, а курсорные страницы ещё и не должны
+    дорожать по работе базы."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        grow(SIZES[0])
+        cls.author_user = User.objects.get(username='user_0')
+        cls.viewer_user = User.objects.create(username='viewer')
+        Follow.objects.create(user=cls.viewer_user, author=cls.author_user)
+        cls.post = Post.objects.filter(author=cls.author_user).earliest('pk')
+        cls.group = cls.post.group
+
+    def setUp(self):
+        self.viewer = Client()
+        self.viewer.force_login(self.viewer_user)
+        self.author = Client()
+        self.author.force_login(self.author_user)
+
+    def urls(self):
+        author = self.author_user.username
+        post_args = [author, self.post.id]
+        return {
+            'posts:index': (self.viewer, reverse('posts:index')),
+            'posts:group_posts': (self.viewer, reverse(
+                'posts:group_posts', args=[self.group.slug])),
+            'posts:profile': (self.viewer, reverse('posts:profile',
+                                                   args=[author])),
+            'posts:post_view': (self.viewer, reverse('posts:post_view',
+                                                     args=post_args)),
+            'posts:follow_index': (self.viewer,
+                                   reverse('posts:follow_index')),
+            'posts:new_post': (self.viewer, reverse('posts:new_post')),
+            'posts:post_edit': (self.author, reverse('posts:post_edit',
+                                                     args=post_args)),
+            'posts:add_comment': (self.viewer, reverse('posts:add_comment',
+                                                       args=post_args)),
+            'posts:profile_follow': (self.author, reverse(
+                'posts:profile_follow', args=[author])),
+            'posts:profile_unfollow': (self.viewer, reverse(
+                'posts:profile_unfollow', args=['viewer'])),
+            'posts:page_not_found': (self.viewer,
+                                     reverse('posts:page_not_found')),
+            'posts:server_error': (self.viewer,
+                                   reverse('posts:server_error')),
+            'posts:search': (self.viewer,
+                             reverse('posts:search') + '?q=текст'),
+            'posts:resize': (self.viewer,
+                             resize.url('posts/missing.gif', 480, 'jpeg')),
+            'posts:api_index': (self.viewer, reverse('posts:api_index')),
+            'posts:api_group': (self.viewer, reverse(
+                'posts:api_group', args=[self.group.slug])),
+            'posts:api_profile': (self.viewer, reverse('posts:api_profile',
+                                                       args=[author])),
+            'posts:api_post': (self.viewer, reverse('posts:api_post',
+                                                    args=post_args)),
+            'posts:api_comments': (self.viewer, reverse(
+                'posts:api_comments', args=post_args)),
+            'signup': (self.viewer, reverse('signup')),
+            'about:author': (self.viewer, reverse('about:author')),
+            'about:tech': (self.viewer, reverse('about:tech')),
+            'metrics': (self.viewer, reverse('metrics')),
+        }
+
+    def measure(self, client, url, data=None):
+        """Возвращает (число запросов, шаги SQLite) для одного GET."""
+        cache.clear()
+        connection.ensure_connection()
+        steps = []
+        connection.connection.set_progress_handler(
+            lambda: steps.append(1), 10
+        )
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                client.get(url, data)
+        finally:
+            connection.connection.set_progress_handler(None, 0)
+        return len(queries.captured_queries), len(steps)
+
+    def cursor_url(self, client, url):
+        """Вторая курсорная страница: с условием по ключу."""
+        page = client.get(url, {'cursor': ''}).context['page']
+        return page.next_cursor or ''
+
+    def test_every_url_is_covered(self):
+        """Проверяем, что бюджет задан для всех адресов приложений."""
+        self.assertEqual(set(self.urls()), set(QUERY_BUDGETS))
+
+    def test_queries_within_budget_and_constant(self):
+        """Проверяем, что число запросов не растёт с объёмом данных."""
+        measured = {}
+        for size in SIZES:
+            grow(size)
+            for name, (client, url) in self.urls().items():
+                queries, _ = self.measure(client, url)
+                measured.setdefault(name, []).append(queries)
+        for name, queries in measured.items():
+            with self.subTest(url=name, sizes=SIZES):
+                self.assertLessEqual(max(queries), QUERY_BUDGETS[name])
+                self.assertEqual(len(set(queries)), 1, queries)
+
+    def test_cursor_pages_do_not_scan_tables(self):
+        """Проверяем, что курсорные страницы не дорожают с ростом таблиц."""
+        measured = {}
+        for size in (SIZES[0], SIZES[-1]):
+            grow(size)
+            urls = self.urls()
+            for name in CURSOR_URLS:
+                client, url = urls[name]
+                cursor = self.cursor_url(client, url)
+                measured.setdefault(name, []).append(
+                    self.measure(client, url, {'cursor': cursor})
+                )
+        for name, ((small_queries, small_steps),
+                   (large_queries, large_steps)) in measured.items():
+            with self.subTest(url=name):
+                self.assertEqual(small_queries, large_queries)
+                self.assertLessEqual(
+                    large_steps, max(small_steps, 1) * STEPS_GROWTH_LIMIT,
+                    (small_steps, large_steps)
+                )
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from yatube.replicas import STICKY_COOKIE, ReplicaRouter
+
+MAIN_URL = reverse('posts:index')
+
+
+class TestReplicas(TransactionTestCase):
+    """Реплика — файл SQLite, который обновляет sync_replicas. Копия
+    снимается через backup API, поэтому тест не держит транзакцию."""
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        connections.databases['replica'] = {
+            'ENGINE': 'yatube.sqlite',
+            'NAME': os.path.join(directory, 'replica.sqlite3'),
+        }
+        self.addCleanup(connections.databases.pop, 'replica')
+        self.addCleanup(lambda: connections['replica'].close())
+        replicas = override_settings(DATABASE_REPLICAS=['replica'])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+        self.author_user = User.objects.create(username='Pushkin')
+        self.post = Post.objects.create(text='Синхронизированный пост',
+                                        author=self.author_user)
+        call_command('sync_replicas', stdout=StringIO())
+        self.guest = Client()
+
+    def test_read_views_use_replica_until_sync(self):
+        """Проверяем, что главная читает реплику и видит новый пост только
+        после синхронизации, даже если страница уже в кеше."""
+        self.assertContains(self.guest.get(MAIN_URL), self.post.text)
+        Post.objects.create(text='Ещё не на реплике',
+                            author=self.author_user)
+        self.assertNotContains(self.guest.get(MAIN_URL),
+                               'Ещё не на реплике')
+        call_command('sync_replicas', stdout=StringIO())
+        self.assertContains(self.guest.get(MAIN_URL), 'Ещё не на реплике')
+
+    def test_writer_reads_own_post(self):
+        """Проверяем, что после записи автор читает из основной базы."""
+        author = Client()
+        author.force_login(self.author_user)
+        response = author.post(reverse('posts:new_post'),
+                               {'text': 'Только что написанный'},
+                               follow=True)
+        self.assertContains(response, 'Только что написанный')
+        self.assertIn(STICKY_COOKIE, author.cookies)
+        self.assertNotContains(self.guest.get(MAIN_URL),
+                               'Только что написанный')
+
+    def test_write_by_get_pins_to_primary(self):
+        """Проверяем, что подписка по GET тоже закрепляет основную базу."""
+        reader = Client()
+        reader.force_login(User.objects.create(username='Reader'))
+        reader.get(reverse('posts:profile_follow',
+                           args=[self.author_user.username]))
+        self.assertIn(STICKY_COOKIE, reader.cookies)
+
+    def test_reads_without_writes_set_no_cookie(self):
+        """Проверяем, что чтение не закрепляет основную базу и страница
+        остаётся пригодной для кеша."""
+        response = self.guest.get(MAIN_URL)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_migrations_skip_replicas(self):
+        """Проверяем, что схему реплик приносит копия, а не миграции."""
+        router = ReplicaRouter()
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+        self.assertTrue(router.allow_migrate('default', 'posts'))
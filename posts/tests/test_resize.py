@@ -0,0 +1,107 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import Client, SimpleTestCase, override_settings
+from PIL import Image
+
+from posts import resize
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class TestResizeEndpoint(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.settings = override_settings(
+            MEDIA_ROOT=f'{self.directory}/media',
+            RESIZE_CACHE_DIR=f'{self.directory}/resized',
+        )
+        self.settings.enable()
+        self.name = default_storage.save('posts/small.gif',
+                                         ContentFile(SMALL_GIF))
+        self.guest = Client()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory)
+
+    def test_serves_resized_image_with_cache_headers(self):
+        """Проверяем нарезку, формат и долгое кеширование."""
+        response = self.guest.get(resize.url(self.name, 480, 'webp'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        image = Image.open(ContentFile(response.content))
+        self.assertEqual(image.size, (480, 170))
+        repeated = self.guest.get(resize.url(self.name, 480, 'webp'),
+                                  HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeated.status_code, 304)
+
+    def test_if_none_match_lists_and_star(self):
+        """Проверяем, что If-None-Match понимает списки меток, слабые
+        метки и «*»."""
+        link = resize.url(self.name, 480, 'jpeg')
+        etag = self.guest.get(link)['ETag']
+        for header in (f'"other", {etag}', f'W/{etag}', '*'):
+            with self.subTest(header=header):
+                response = self.guest.get(link, HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, 304)
+        response = self.guest.get(link, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_decompression_bomb_is_rejected(self):
+        """Проверяем, что слишком большой по пикселям исходник даёт 4xx,
+        а не ошибку сервера."""
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 0):
+            response = self.guest.get(resize.url(self.name, 960, 'jpeg'))
+        self.assertEqual(response.status_code, 422)
+
+    def test_range_requests(self):
+        """Проверяем ответы на запросы диапазонов."""
+        link = resize.url(self.name, 480, 'jpeg')
+        full = self.guest.get(link).content
+        response = self.guest.get(link, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, full[:10])
+        self.assertEqual(response['Content-Range'],
+                         f'bytes 0-9/{len(full)}')
+        suffix = self.guest.get(link, HTTP_RANGE='bytes=-5')
+        self.assertEqual(suffix.content, full[-5:])
+        outside = self.guest.get(link,
+                                 HTTP_RANGE=f'bytes={len(full)}-')
+        self.assertEqual(outside.status_code, 416)
+
+    def test_rejects_forged_and_unknown(self):
+        """Проверяем, что чужая подпись, размер и файл дают 404."""
+        link = resize.url(self.name, 480, 'jpeg')
+        forged = link.replace(':', ':x', 1)
+        self.assertEqual(self.guest.get(forged).status_code, 404)
+        self.assertEqual(
+            self.guest.get(resize.url(self.name, 123, 'jpeg')).status_code,
+            404,
+        )
+        self.assertEqual(
+            self.guest.get(resize.url('posts/missing.gif', 480,
+                                      'jpeg')).status_code,
+            404,
+        )
+
+    def test_cache_evicts_least_recently_read(self):
+        """Проверяем, что кеш не растёт больше заданного объёма."""
+        with override_settings(RESIZE_CACHE_BYTES=1):
+            resize._pool.clear()
+            for width in (480, 960):
+                self.guest.get(resize.url(self.name, width, 'jpeg'))
+        self.assertLessEqual(len(list(resize._files())), 1)
@@ -1,5 +1,6 @@
+from django.conf import settings
 from django.test import TestCase
-from django.urls import reverse
+from django.urls import get_resolver, reverse
 
 from posts.models import Post, User
 
@@ -41,3 +42,24 @@ class TestRoutes(TestCase):
         }
         for url, route in routes.items():
             self.assertEqual(url, route)
+
+    def test_fixed_sections_are_reserved_usernames(self):
+        """Проверяем, что имя пользователя не может совпасть с разделом
+        сайта: иначе его профиль закрыл бы раздел или наоборот."""
+        sections = set()
+        patterns = list(get_resolver().url_patterns)
+        while patterns:
+            pattern = patterns.pop()
+            route = str(pattern.pattern)
+            if not route and hasattr(pattern, 'url_patterns'):
+                patterns.extend(pattern.url_patterns)
+            elif route and not route.startswith('<'):
+                sections.add(route.split('/')[0])
+        self.assertLessEqual(sections, set(settings.RESERVED_USERNAMES))
+        response = self.client.post(reverse('signup'), {
+            'username': 'Search',
+            'password1': 'Pa55-word-long',
+            'password2': 'Pa55-word-long',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(User.objects.filter(username='Search').exists())
@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.contrib.auth.models import User as AdminUser
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post, User
+from posts.paginator import NEXT, encode_cursor
+from yatube.settings import POSTS_COUNT
+
+SEARCH_URL = reverse('posts:search')
+
+
+class TestSearch(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create(username='Pushkin')
+        cls.poem = Post.objects.create(
+            text='Я помню чудное мгновенье: передо мной явилась ты',
+            author=cls.author_user
+        )
+        cls.letter = Post.objects.create(
+            text='Письмо Пушкина о чудном мгновенье и мгновенье ином',
+            author=cls.author_user
+        )
+        cls.other = Post.objects.create(text='Совсем другой текст',
+                                        author=cls.author_user)
+
+    def setUp(self):
+        self.guest = Client()
+
+    def found(self, query, **params):
+        return list(self.guest.get(
+            SEARCH_URL, {'q': query, **params}
+        ).context['page'])
+
+    def test_search_finds_word_forms(self):
+        """Проверяем, что поиск находит другие формы русских слов."""
+        self.assertEqual(self.found('Пушкин'), [self.letter])
+        self.assertEqual(set(self.found('чудного мгновения')),
+                         {self.poem, self.letter})
+        self.assertEqual(self.found('тексты'), [self.other])
+        self.assertEqual(self.found(''), [])
+
+    def test_search_ranks_results(self):
+        """Проверяем, что пост с большим числом совпадений выше."""
+        self.assertEqual(self.found('мгновенье')[0], self.letter)
+
+    def test_index_follows_edit_and_delete(self):
+        """Проверяем, что индекс следует за правкой и удалением."""
+        post = Post.objects.create(text='Пророк', author=self.author_user)
+        self.assertEqual(self.found('пророк'), [post])
+        post.text = 'Анчар'
+        post.save()
+        self.assertEqual(self.found('пророк'), [])
+        self.assertEqual(self.found('анчар'), [post])
+        post.delete()
+        self.assertEqual(self.found('анчар'), [])
+
+    def test_search_cursor_pages(self):
+        """Проверяем, что результаты листаются курсором без повторов."""
+        Post.objects.bulk_create(
+            Post(text=f'Стихотворение номер {number}',
+                 author=self.author_user)
+            for number in range(POSTS_COUNT + 2)
+        )
+        first = self.guest.get(SEARCH_URL,
+                               {'q': 'стихотворение'}).context['page']
+        second = self.guest.get(SEARCH_URL, {
+            'q': 'стихотворение', 'cursor': first.next_cursor
+        }).context['page']
+        self.assertEqual(len(first), POSTS_COUNT)
+        self.assertEqual(len(second), 2)
+        self.assertFalse(set(first) & set(second))
+        self.assertIn('q=', first.extra_query)
+
+    def test_broken_search_cursor_returns_first_page(self):
+        """Проверяем, что курсор со значениями не того типа открывает
+        первую страницу результатов."""
+        for values in ([1.5, [1]], ['ранг', 1], [1.5, 2.5], [True, 1]):
+            with self.subTest(values=values):
+                response = self.guest.get(SEARCH_URL, {
+                    'q': 'мгновенье', 'cursor': encode_cursor(NEXT, values)
+                })
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context['page']), 2)
+
+    def test_search_without_fts(self):
+        """Проверяем запасной индекс на чистом Python."""
+        with mock.patch('posts.search.uses_fts', return_value=False):
+            search.rebuild()
+            self.assertEqual(self.found('пушкину'), [self.letter])
+            post = Post.objects.create(text='Пушкин пишет Пушкину',
+                                       author=self.author_user)
+            self.assertEqual(self.found('Пушкин'), [post, self.letter])
+
+    def test_admin_uses_index(self):
+        """Проверяем, что поиск в админке идёт по тому же индексу."""
+        admin = AdminUser.objects.create_superuser('admin', '', 'password')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(reverse('admin:posts_post_changelist'),
+                              {'q': 'Пушкина'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.letter])
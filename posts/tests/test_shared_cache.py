@@ -0,0 +1,101 @@
+import multiprocessing
+import shutil
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from yatube.cache import SharedCache, _slot
+
+
+def make_cache(location, **options):
+    return SharedCache(location, {'OPTIONS': options})
+
+
+def write_in_other_process(location, key, value):
+    make_cache(location).set(key, value)
+
+
+class TestSharedCache(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = f'{self.directory}/cache.sqlite3'
+        self.cache = make_cache(self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_basic_operations(self):
+        """Проверяем чтение, запись, add, incr и удаление."""
+        cache = self.cache
+        self.assertIsNone(cache.get('key'))
+        cache.set('key', {'value': 1})
+        self.assertEqual(cache.get('key'), {'value': 1})
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('counter', 1))
+        self.assertEqual(cache.incr('counter', 2), 3)
+        self.assertEqual(cache.get_many(['key', 'counter', 'missing']),
+                         {'key': {'value': 1}, 'counter': 3})
+        cache.delete('key')
+        self.assertIsNone(cache.get('key'))
+        cache.clear()
+        self.assertIsNone(cache.get('counter'))
+
+    def test_expired_values_are_not_returned(self):
+        """Проверяем, что истёкшие значения не читаются ни из L1, ни из
+        базы."""
+        self.cache.set('key', 'value', 0.05)
+        self.assertEqual(self.cache.get('key'), 'value')
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+
+    def test_repeated_reads_hit_l1(self):
+        """Проверяем, что повторное чтение обслуживается L1."""
+        self.cache.set('key', 'value')
+        self.cache.get('key')
+        before = self.cache.stats()
+        self.cache.get('key')
+        after = self.cache.stats()
+        self.assertEqual(after['l1_hits'], before['l1_hits'] + 1)
+
+    def test_write_in_other_process_invalidates_l1(self):
+        """Проверяем, что запись другого процесса сбрасывает копию в L1."""
+        self.cache.set('key', 'old')
+        self.assertEqual(self.cache.get('key'), 'old')
+        process = multiprocessing.get_context('fork').Process(
+            target=write_in_other_process,
+            args=(self.location, 'key', 'new'),
+        )
+        process.start()
+        process.join()
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_old_entries_are_evicted(self):
+        """Проверяем, что при переполнении старые ключи вытесняются."""
+        cache = make_cache(self.location, MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        cache.set_many({f'key_{index}': index for index in range(100)})
+        self.assertLess(len(cache.get_many(
+            [f'key_{index}' for index in range(100)])), 100)
+        self.assertGreater(cache.stats()['evictions'], 0)
+        self.assertEqual(cache.get('key_99'), 99)
+
+    def test_bump_from_threads_loses_no_increments(self):
+        """Проверяем, что счётчик версий, увеличиваемый из нескольких
+        потоков процесса, не теряет прибавок."""
+        tier = self.cache._tier
+        slot = _slot('key')
+        before = tier.stamp(slot)[1]
+
+        def bump():
+            for _ in range(2000):
+                tier.bump([slot])
+
+        threads = [threading.Thread(target=bump) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(tier.stamp(slot)[1], before + 8 * 2000)
@@ -0,0 +1,80 @@
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from yatube import sqlstats
+
+
+class TestSqlStats(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        stats = override_settings(
+            SQL_STATS_PATH=f'{directory}/sql_stats.sqlite3'
+        )
+        stats.enable()
+        self.addCleanup(stats.disable)
+        self.author_user = User.objects.create(username='Pushkin')
+        Post.objects.create(text='Пост', author=self.author_user)
+        sqlstats.collector.clear()
+        self.guest = Client()
+
+    def test_fingerprint_hides_values(self):
+        """Проверяем, что отпечаток не зависит от значений и числа
+        параметров."""
+        queries = [
+            "SELECT * FROM t WHERE id IN (%s, %s) AND name = 'a' LIMIT 10",
+            "SELECT *  FROM t WHERE id IN (%s) AND name = 'b''c' LIMIT 21",
+        ]
+        self.assertEqual({sqlstats.fingerprint(sql) for sql in queries},
+                         {'SELECT * FROM t WHERE id IN (...) AND name = ? '
+                          'LIMIT ?'})
+        self.assertEqual(
+            sqlstats.fingerprint('INSERT INTO t VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO t VALUES (...), ...'
+        )
+
+    def test_report_groups_queries_by_view(self):
+        """Проверяем, что отчёт складывает вызовы по отпечаткам и знает,
+        сколько раз за запрос их выполняет страница."""
+        url = reverse('posts:profile', args=[self.author_user.username])
+        for _ in range(2):
+            # Без кеша страниц оба запроса выполняют все запросы view.
+            cache.clear()
+            self.guest.get(url)
+        report = sqlstats.report()
+        profile = [row for row in report
+                   if row['fingerprint'].startswith('SELECT "auth_user"')
+                   and any(view['view'] == 'posts:profile'
+                           for view in row['views'])]
+        self.assertTrue(profile)
+        row = profile[0]
+        self.assertGreaterEqual(row['calls'], 2)
+        self.assertIsNotNone(row['p95_ms'])
+        view = next(view for view in row['views']
+                    if view['view'] == 'posts:profile')
+        self.assertEqual(view['per_request'], view['calls'] / 2)
+
+    @override_settings(SQL_SLOW_MS=0)
+    def test_slow_queries_are_logged(self):
+        """Проверяем, что запросы дольше порога попадают в лог и журнал."""
+        with self.assertLogs('yatube.sql', 'WARNING'):
+            Post.objects.count()
+        self.assertIn('COUNT', sqlstats.slow_queries()[0]['sql'])
+
+    def test_admin_shows_report(self):
+        """Проверяем, что отчёт открывается в админке."""
+        Post.objects.filter(text='Пост').exists()
+        admin = Client()
+        admin.force_login(User.objects.create(
+            username='admin', is_staff=True, is_superuser=True
+        ))
+        response = admin.get(
+            reverse('admin:posts_queryfingerprint_changelist')
+        )
+        self.assertContains(response, 'FROM &quot;posts_post&quot;')
@@ -0,0 +1,109 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from posts import suggestions
+from posts.models import Follow, Suggestion, User
+
+
+def suggested(user):
+    return list(Suggestion.objects.filter(user=user).values_list(
+        'author__username', flat=True
+    ))
+
+
+class TestSuggestions(TestCase):
+
+    def setUp(self):
+        self.users = {name: User.objects.create(username=name)
+                      for name in ('reader', 'friend', 'fof', 'twin',
+                                   'favourite', 'stranger')}
+        for user, author in (('reader', 'friend'), ('friend', 'fof'),
+                             ('twin', 'friend'), ('twin', 'favourite')):
+            Follow.objects.create(user=self.users[user],
+                                  author=self.users[author])
+        call_command('rebuild_suggestions', stdout=StringIO())
+
+    def test_friends_of_friends_and_similar_readers(self):
+        """Проверяем, что рекомендуются авторы друзей и авторы читателей
+        с теми же подписками, но не свои подписки и не сам читатель."""
+        self.assertEqual(set(suggested(self.users['reader'])),
+                         {'fof', 'favourite'})
+
+    def test_refresh_matches_rebuild(self):
+        """Проверяем, что пересчёт одного читателя совпадает с полным."""
+        before = list(Suggestion.objects.filter(
+            user=self.users['reader']
+        ).values_list('author_id', 'score'))
+        suggestions.refresh(self.users['reader'].pk)
+        after = list(Suggestion.objects.filter(
+            user=self.users['reader']
+        ).values_list('author_id', 'score'))
+        self.assertEqual(after, before)
+
+    @override_settings(SUGGESTIONS_REFRESH_NEIGHBOURS=1)
+    def test_refresh_samples_latest_neighbours(self):
+        """Проверяем, что при пересчёте одного читателя похожие читатели
+        берутся только из последних подписок на его авторов."""
+        latest = User.objects.create(username='latest')
+        newcomer = User.objects.create(username='newcomer')
+        Follow.objects.create(user=latest, author=self.users['friend'])
+        Follow.objects.create(user=latest, author=newcomer)
+        suggestions.refresh(self.users['reader'].pk)
+        self.assertEqual(set(suggested(self.users['reader'])),
+                         {'fof', 'newcomer'})
+
+    def test_rebuild_in_batches_replaces_rows(self):
+        """Проверяем, что пересчёт мелкими пачками даёт те же
+        рекомендации и убирает их у читателей без подписок."""
+        before = set(Suggestion.objects.values_list('user_id', 'author_id',
+                                                    'score'))
+        Suggestion.objects.create(user=self.users['stranger'],
+                                  author=self.users['fof'], score=1)
+        with mock.patch.object(suggestions, 'CHUNK', 1):
+            total = suggestions.rebuild()
+        after = set(Suggestion.objects.values_list('user_id', 'author_id',
+                                                   'score'))
+        self.assertEqual(after, before)
+        self.assertEqual(total, len(before))
+
+    def test_served_by_one_query(self):
+        """Проверяем, что показ рекомендаций стоит одного запроса."""
+        with self.assertNumQueries(1):
+            shown = suggestions.for_user(self.users['reader'])
+            [suggestion.author.username for suggestion in shown]
+        self.assertEqual(len(shown), 2)
+
+    def test_shown_on_follow_index(self):
+        """Проверяем, что рекомендации видны в ленте подписок."""
+        client = Client()
+        client.force_login(self.users['reader'])
+        response = client.get(reverse('posts:follow_index'))
+        self.assertContains(response, reverse(
+            'posts:profile_follow', args=['favourite']
+        ))
+
+
+class TestSuggestionsRefresh(TransactionTestCase):
+    """Рекомендации пересчитываются после коммита подписки, поэтому
+    тесту нужны настоящие транзакции."""
+
+    def test_follow_refreshes_reader(self):
+        """Проверяем, что после подписки автор пропадает из рекомендаций
+        и появляются его авторы."""
+        reader, friend, fof, next_author = (
+            User.objects.create(username=name)
+            for name in ('reader', 'friend', 'fof', 'next')
+        )
+        Follow.objects.create(user=friend, author=fof)
+        Follow.objects.create(user=fof, author=next_author)
+        Follow.objects.create(user=reader, author=friend)
+        self.assertEqual(suggested(reader), ['fof'])
+        client = Client()
+        client.force_login(reader)
+        client.get(reverse('posts:profile_follow', args=['fof']))
+        self.assertEqual(suggested(reader), ['next'])
@@ -0,0 +1,137 @@
+from unittest import mock
+
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import AuthorStats, Follow, Post, TimelineEntry, User
+
+AUTHOR_USERNAME = 'Pushkin'
+FOLLOW_URL = reverse('posts:profile_follow', args=[AUTHOR_USERNAME])
+UNFOLLOW_URL = reverse('posts:profile_unfollow', args=[AUTHOR_USERNAME])
+FOLLOW_INDEX_URL = reverse('posts:follow_index')
+NEW_POST_URL = reverse('posts:new_post')
+
+
+class TestTimeline(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create(username=AUTHOR_USERNAME)
+        cls.follower_user = User.objects.create(username='Block')
+        cls.old_post = Post.objects.create(text='Старый пост',
+                                           author=cls.author_user)
+
+    def setUp(self):
+        self.author = Client()
+        self.author.force_login(self.author_user)
+        self.follower = Client()
+        self.follower.force_login(self.follower_user)
+
+    def feed(self):
+        return list(self.follower.get(FOLLOW_INDEX_URL).context['page'])
+
+    def test_follow_backfills_timeline(self):
+        """Проверяем, что при подписке в ленту попадают старые посты."""
+        self.follower.get(FOLLOW_URL)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower_user, post=self.old_post
+        ).exists())
+        self.assertEqual(self.feed(), [self.old_post])
+
+    def test_new_post_fans_out(self):
+        """Проверяем, что новый пост раскладывается по лентам подписчиков."""
+        self.follower.get(FOLLOW_URL)
+        self.author.post(NEW_POST_URL, data={'text': 'Новый пост'})
+        post = Post.objects.get(text='Новый пост')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower_user, post=post
+        ).exists())
+        self.assertEqual(self.feed(), [post, self.old_post])
+
+    def test_bulk_created_posts_fan_out(self):
+        """Проверяем, что bulk_create тоже попадает в ленты."""
+        self.follower.get(FOLLOW_URL)
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=self.author_user)
+            for number in range(3)
+        )
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.follower_user
+        ).count(), 4)
+
+    def test_unfollow_cleans_timeline(self):
+        """Проверяем, что после отписки лента очищается."""
+        self.follower.get(FOLLOW_URL)
+        self.follower.get(UNFOLLOW_URL)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.follower_user
+        ).exists())
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_heavy_author_merged_on_read(self):
+        """Проверяем, что посты популярных авторов собираются при чтении."""
+        Follow.objects.create(user=self.follower_user,
+                              author=self.author_user)
+        post = Post.objects.create(text='Новый пост', author=self.author_user)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2, TIMELINE_FANOUT_HYSTERESIS=1)
+    def test_author_crossing_limit_keeps_posts_in_feeds(self):
+        """Проверяем, что посты автора видны в лентах, пока он становится
+        тяжёлым и обратно, а после возврата ленты заполняются."""
+        readers = [self.follower_user] + [
+            User.objects.create(username=name) for name in ('Fet', 'Blok')
+        ]
+        follows = [Follow.objects.create(user=reader,
+                                         author=self.author_user)
+                   for reader in readers]
+        self.assertTrue(AuthorStats.objects.get(
+            user=self.author_user
+        ).is_heavy)
+        post = Post.objects.create(text='Пост тяжёлого автора',
+                                   author=self.author_user)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        follows[2].delete()
+        # Внутри запаса автор остаётся тяжёлым и подмешивается при чтении.
+        self.assertEqual(self.feed(), [post, self.old_post])
+        follows[1].delete()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower_user, post=post
+        ).exists())
+        self.assertEqual(self.feed(), [post, self.old_post])
+        new_post = Post.objects.create(text='Пост после возврата',
+                                       author=self.author_user)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower_user, post=new_post
+        ).exists())
+        self.assertEqual(self.feed(), [new_post, post, self.old_post])
+
+    def test_rebuild_keeps_authors_without_stats(self):
+        """Проверяем, что пересборка раскладывает посты автора, у которого
+        нет строки счётчиков."""
+        Follow.objects.create(user=self.follower_user,
+                              author=self.author_user)
+        AuthorStats.objects.filter(user=self.author_user).delete()
+        timeline.rebuild()
+        self.assertEqual(self.feed(), [self.old_post])
+
+    def test_rebuild_in_chunks_of_readers(self):
+        """Проверяем, что пересборка по пачкам читателей раскладывает
+        посты всем подписчикам и очищает ленты тех, кто отписался."""
+        readers = [User.objects.create(username=f'reader{number}')
+                   for number in range(3)]
+        for reader in readers[:2]:
+            Follow.objects.create(user=reader, author=self.author_user)
+        TimelineEntry.objects.create(user=readers[2], post=self.old_post,
+                                     pub_date=self.old_post.pub_date)
+        TimelineEntry.objects.all().exclude(user=readers[2]).delete()
+        with mock.patch.object(timeline, 'CHUNK', 1):
+            timeline.rebuild()
+        self.assertEqual(
+            sorted(TimelineEntry.objects.values_list('user_id', flat=True)),
+            [readers[0].pk, readers[1].pk]
+        )
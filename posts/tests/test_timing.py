@@ -0,0 +1,86 @@
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from django.db import connection
+from django.template.backends.django import Template
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from yatube import metrics
+
+MAIN_URL = reverse('posts:index')
+
+
+class TestTiming(TestCase):
+
+    def setUp(self):
+        author = User.objects.create(username='Pushkin')
+        Post.objects.create(text='Замеренный пост', author=author)
+        self.guest = Client()
+
+    @override_settings(TIMING_SAMPLE_RATE=1)
+    def test_sampled_request_reports_timings(self):
+        """Проверяем, что замеренный запрос получает Server-Timing и
+        оставляет строку в логе с числом запросов к базе."""
+        with self.assertLogs('yatube.timing', 'INFO') as logs:
+            response = self.guest.get(MAIN_URL)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        header = response['Server-Timing']
+        for metric in ('total;dur=', 'view;dur=', 'tpl;dur=',
+                       f"db;dur={record['db_ms']};desc=\""
+                       f"{record['queries']} SQL\""):
+            self.assertIn(metric, header)
+
+    def test_one_query_wrapper_for_timing_and_metrics(self):
+        """Проверяем, что замер и метрики считают запросы через одну
+        обёртку execute и получают одно и то же число."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        wrapper = mock.patch.object(connection, 'execute_wrapper',
+                                    wraps=connection.execute_wrapper)
+        with override_settings(TIMING_SAMPLE_RATE=1,
+                               METRICS_DIR=directory), wrapper as wrapped:
+            with self.assertLogs('yatube.timing', 'INFO') as logs:
+                self.guest.get(MAIN_URL)
+            lines = metrics.render(metrics.collect()).splitlines()
+        self.assertEqual(wrapped.call_count, 1)
+        queries = json.loads(logs.records[0].getMessage())['queries']
+        self.assertIn('yatube_db_queries_per_request_sum'
+                      f'{{view="posts:index"}} {queries}', lines)
+
+    def test_django_template_class_is_not_patched(self):
+        """Проверяем, что замер шаблонов идёт через свой бэкенд, а не
+        подменой Template.render у всех."""
+        self.assertFalse(hasattr(Template.render, 'timed'))
+
+    @override_settings(TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request_is_untouched(self):
+        """Проверяем, что незамеренный запрос отдаётся без заголовка."""
+        self.assertNotIn('Server-Timing', self.guest.get(MAIN_URL))
+
+    def test_cache_hits_and_misses(self):
+        """Проверяем, что с SharedCache в замер попадает кеш: повторная
+        страница берётся из него."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        caches = {'default': {
+            'BACKEND': 'yatube.cache.SharedCache',
+            'LOCATION': f'{directory}/cache.sqlite3',
+        }}
+        with override_settings(CACHES=caches, TIMING_SAMPLE_RATE=1):
+            with self.assertLogs('yatube.timing', 'INFO') as logs:
+                self.guest.get(MAIN_URL)
+                response = self.guest.get(MAIN_URL)
+        first, second = (json.loads(record.getMessage())
+                         for record in logs.records)
+        self.assertGreater(first['cache_misses'], 0)
+        self.assertEqual(second['cache_misses'], 0)
+        self.assertGreater(second['cache_hits'], 0)
+        self.assertIn('cache;desc=', response['Server-Timing'])
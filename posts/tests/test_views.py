@@ -4,7 +4,7 @@ import tempfile
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from posts.models import Comment, Group, Post, User
@@ -35,7 +35,10 @@ class TestView(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.media = override_settings(
+            MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR)
+        )
+        cls.media.enable()
         cls.guest = Client()
         cls.author = Client()
         cls.not_author = Client()
@@ -73,6 +76,9 @@ class TestView(TestCase):
         cls.COMMENTS_URL = reverse('posts:add_comment',
                                    args=[author.username, cls.post.id])
 
+    def setUp(self):
+        cache.clear()
+
     def test_paginator_for_ten_and_four_items(self):
         """Провеяем, что paginator работает правильно."""
         posts_count = 3
@@ -108,8 +114,9 @@ class TestView(TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        super().tearDownClass()
         shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media.disable()
+        super().tearDownClass()
 
     def test_response_correct_context_for_pages(self):
         """Провеяем, что посты на страницах возвращают ожидаемый контекст."""
@@ -151,15 +158,33 @@ class TestView(TestCase):
                 self.assertEqual(comment.post, self.post)
 
     def test_correct_cache_context_for_index(self):
-        """Провеяем, что кеширование на главной странице работает."""
+        """Провеяем, что кеширование на главной странице работает, а новый
+        пост виден сразу."""
         primary_response = self.author.get(MAIN_URL).content
-        self.author.post(NEW_POST_URL, data={'text': 'Новый текст'},
-                         follow=True)
+        Post.objects.filter(pk=self.post.pk).update(text='Мимо сигналов')
         secondary_response = self.author.get(MAIN_URL).content
         self.assertEqual(primary_response, secondary_response)
-        cache.clear()
+        self.author.post(NEW_POST_URL, data={'text': 'Новый текст'},
+                         follow=True)
         third_response = self.author.get(MAIN_URL).content
         self.assertNotEqual(primary_response, third_response)
+        self.assertIn('Новый текст', third_response.decode())
+
+    def test_page_caches_are_scoped(self):
+        """Проверяем, что пост в одной группе не сбрасывает кеш другой."""
+        other_post = Post.objects.create(
+            text='Текст другой группы', author=self.author_user,
+            group=Group.objects.get(slug='writer'))
+        primary_response = self.author.get(self.OTHER_GROUP_URL).content
+        Post.objects.filter(pk=other_post.pk).update(text='Мимо сигналов')
+        Post.objects.create(text='Текст группы', author=self.author_user,
+                            group=self.group)
+        self.assertEqual(self.author.get(self.OTHER_GROUP_URL).content,
+                         primary_response)
+        self.assertIn('Текст группы',
+                      self.author.get(GROUP_URL).content.decode())
+        self.assertIn('Текст группы',
+                      self.author.get(PROFILE_URL).content.decode())
 
     def test_group_page_contains_current_posts(self):
         """Проверяем, что пост находится на странице только своей группы."""
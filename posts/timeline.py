@@ -0,0 +1,196 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+# Сколько читателей пересобирается в одной транзакции rebuild().
+CHUNK = 500
+
+
+def _all_followers(author_id):
+    return list(Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True))
+
+
+def followers(author_id):
+    """Подписчики автора или None, если автор «тяжёлый».
+
+    Посты тяжёлых авторов не раскладываются по лентам, а подмешиваются
+    при чтении (см. feed). Автор становится тяжёлым, когда подписчиков
+    больше TIMELINE_FANOUT_LIMIT, и перестаёт им быть, лишь когда их
+    становится не больше лимита за вычетом TIMELINE_FANOUT_HYSTERESIS.
+    Флаг хранится в AuthorStats.is_heavy: по нему же читает feed, поэтому
+    пост всегда виден либо из ленты, либо подмешанным.
+    """
+    if AuthorStats.objects.filter(user_id=author_id, is_heavy=True).exists():
+        return None
+    return _all_followers(author_id)
+
+
+def _became_heavy(author_id):
+    return AuthorStats.objects.filter(
+        user_id=author_id, is_heavy=False,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).update(is_heavy=True)
+
+
+def _became_light(author_id):
+    # Условные UPDATE: флаг переключает ровно один из параллельных
+    # запросов, и только он заполняет ленты.
+    return AuthorStats.objects.filter(
+        user_id=author_id, is_heavy=True,
+        followers_count__lte=(settings.TIMELINE_FANOUT_LIMIT
+                              - settings.TIMELINE_FANOUT_HYSTERESIS),
+    ).update(is_heavy=False)
+
+
+def _mark_heavy():
+    return AuthorStats.objects.filter(
+        is_heavy=False, followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).update(is_heavy=True)
+
+
+def _mark_light():
+    return AuthorStats.objects.filter(
+        is_heavy=True,
+        followers_count__lte=(settings.TIMELINE_FANOUT_LIMIT
+                              - settings.TIMELINE_FANOUT_HYSTERESIS),
+    ).update(is_heavy=False)
+
+
+def heavy_authors(user):
+    return list(AuthorStats.objects.filter(
+        user__following__user=user, is_heavy=True,
+    ).values_list('user_id', flat=True))
+
+
+def backfill(author_id, user_ids, since=None):
+    posts = Post.objects.filter(author_id=author_id)
+    if since is not None:
+        posts = posts.filter(pub_date__gte=since)
+    posts = list(posts.order_by('-pub_date').values_list(
+        'id', 'pub_date'
+    )[:settings.TIMELINE_BACKFILL])
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for user_id in user_ids for post_id, pub_date in posts),
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(post):
+    user_ids = followers(post.author_id)
+    if not user_ids:
+        return
+    # Пост мог уже попасть в ленты, если автор только что перестал быть
+    # тяжёлым и его ленты заполнялись параллельно.
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in user_ids),
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_bulk(posts):
+    """Раскладка после bulk_create: на SQLite у объектов может не быть id,
+    поэтому посты каждого автора добираются из базы по дате."""
+    since = {}
+    for post in posts:
+        earliest = since.get(post.author_id)
+        if earliest is None or post.pub_date < earliest:
+            since[post.author_id] = post.pub_date
+    for author_id, pub_date in since.items():
+        user_ids = followers(author_id)
+        if user_ids:
+            backfill(author_id, user_ids, since=pub_date)
+
+
+def follow(follow):
+    """Вызывается после того, как счётчик подписчиков увеличен."""
+    if _became_heavy(follow.author_id):
+        return
+    if followers(follow.author_id) is not None:
+        backfill(follow.author_id, [follow.user_id])
+
+
+def unfollow(follow):
+    """Вызывается после того, как счётчик подписчиков уменьшен. Автор,
+    переставший быть тяжёлым, больше не подмешивается при чтении,
+    поэтому его посты раскладываются по лентам всех подписчиков."""
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id
+    ).delete()
+    if _became_light(follow.author_id):
+        backfill(follow.author_id, _all_followers(follow.author_id))
+
+
+def feed(user):
+    heavy = heavy_authors(user)
+    if not heavy:
+        return Post.objects.filter(
+            timeline_entries__user=user
+        ).order_by('-timeline_entries__pub_date')
+    entries = TimelineEntry.objects.filter(user=user).values('post_id')
+    return Post.objects.filter(Q(id__in=entries) | Q(author_id__in=heavy))
+
+
+def _chunks(user_ids):
+    for start in range(0, len(user_ids), CHUNK):
+        chunk = user_ids[start:start + CHUNK]
+        yield chunk[0], chunk[-1]
+
+
+def rebuild():
+    """Пересобирает все ленты по текущим подпискам. Нужен после массовой
+    загрузки в обход сигналов.
+
+    Ленты пересобираются пачками по CHUNK читателей: каждая пачка —
+    короткая транзакция из DELETE и INSERT ... SELECT по диапазону id,
+    поэтому блокировка записи SQLite (BEGIN IMMEDIATE) не держится всю
+    пересборку, а читатель видит свою ленту либо старой, либо новой.
+    Строки вставляются в порядке индекса ленты, так заметно быстрее,
+    чем по авторам.
+
+    Флаги тяжёлых авторов выставляются до пачек, а снимаются после них:
+    пост автора всё это время виден либо из ленты, либо подмешанным при
+    чтении. Автор без строки AuthorStats считается обычным, как и в
+    followers()."""
+    sql = (
+        f'INSERT INTO {TimelineEntry._meta.db_table} '
+        '(user_id, post_id, pub_date) '
+        'SELECT follow.user_id, post.id, post.pub_date '
+        f'FROM {Follow._meta.db_table} follow '
+        f'LEFT JOIN {AuthorStats._meta.db_table} stats '
+        '  ON stats.user_id = follow.author_id '
+        'JOIN (SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+        '        PARTITION BY author_id ORDER BY pub_date DESC'
+        f'      ) AS position FROM {Post._meta.db_table} '
+        '      WHERE author_id IN ('
+        f'        SELECT author_id FROM {Follow._meta.db_table} '
+        '        WHERE user_id BETWEEN %s AND %s)) post '
+        '  ON post.author_id = follow.author_id AND post.position <= %s '
+        'WHERE follow.user_id BETWEEN %s AND %s '
+        '  AND (stats.is_heavy IS NULL OR NOT stats.is_heavy '
+        '       OR stats.followers_count <= %s) '
+        'ORDER BY follow.user_id, post.pub_date'
+    )
+    light = (settings.TIMELINE_FANOUT_LIMIT
+             - settings.TIMELINE_FANOUT_HYSTERESIS)
+    _mark_heavy()
+    user_ids = sorted(
+        set(Follow.objects.values_list('user_id', flat=True).distinct())
+        | set(TimelineEntry.objects.values_list(
+            'user_id', flat=True
+        ).distinct())
+    )
+    for first, last in _chunks(user_ids):
+        with transaction.atomic():
+            TimelineEntry.objects.filter(
+                user__gte=first, user__lte=last
+            ).delete()
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [first, last, settings.TIMELINE_BACKFILL,
+                                     first, last, light])
+    _mark_light()
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
@@ -17,6 +17,27 @@ urlpatterns = [
     path('follow/',
          views.follow_index,
          name="follow_index"),
+    path('search/',
+         views.search_posts,
+         name='search'),
+    path('resize/<str:token>/',
+         views.resize_image,
+         name='resize'),
+    path('api/',
+         api.index,
+         name='api_index'),
+    path('api/group/<slug:slug>/',
+         api.group_posts,
+         name='api_group'),
+    path('api/<str:username>/',
+         api.profile,
+         name='api_profile'),
+    path('api/<str:username>/<int:post_id>/',
+         api.post_view,
+         name='api_post'),
+    path('api/<str:username>/<int:post_id>/comments/',
+         api.comments,
+         name='api_comments'),
     path('<str:username>/',
          views.profile,
          name='profile'),
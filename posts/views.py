@@ -1,11 +1,12 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 
-from yatube.settings import POSTS_COUNT
-
+from . import (archive, generations, page_cache, resize, search, suggestions,
+               timeline)
 from .forms import CommentForm, PostForm
+from .loaders import DataLoader, load_comments, load_posts
 from .models import Follow, Group, Post, User
+from .paginator import COMMENT_ORDERING, paginate
 
 
 def server_error(request):
@@ -19,28 +20,41 @@ def page_not_found(request, exception):
                   status=404)
 
 
+@page_cache.anonymous(page_cache.index)
 def index(request):
-    posts = Post.objects.all().select_related('group')
-    paginator = Paginator(posts, POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = load_posts(paginate(request, Post.objects.all()))
     return render(request, 'index.html', {
         'page': page,
+        'generation': generations.index(),
     })
 
 
+@page_cache.anonymous(page_cache.group_posts)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    loader = DataLoader()
+    loader.prime(group)
+    page = load_posts(paginate(request, group.posts.all()), loader)
     return render(request, 'group.html', {
         'group': group,
         'page': page,
+        'generation': generations.group(group.pk),
     })
 
 
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    page = load_posts(search.search(query, request.GET.get('cursor')))
+    return render(request, 'search.html', {
+        'query': query,
+        'page': page,
+    })
+
+
+def resize_image(request, token):
+    return resize.serve(request, token)
+
+
 @login_required
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -52,26 +66,35 @@ def new_post(request):
     return redirect('posts:index')
 
 
+@page_cache.anonymous(page_cache.profile)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    paginator = Paginator(author.posts.all(), POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    loader = DataLoader()
+    loader.prime(author)
+    page = load_posts(paginate(request, archive.author_posts(author)),
+                      loader)
     following = Follow.objects.filter(user__username=request.user.username,
                                       author=author).exists()
-    return render(request, 'profile.html', {'page': page,
-                                            'author': author,
-                                            'following': following})
+    return render(request, 'profile.html', {
+        'page': page,
+        'author': author,
+        'following': following,
+        'generation': generations.author(author.pk),
+        'suggestions': suggestions.for_user(request.user),
+    })
 
 
+@page_cache.anonymous(page_cache.post_view)
 def post_view(request, username, post_id):
-    post = get_object_or_404(
-        Post, author__username=username, id=post_id)
+    post = archive.get_post(('author__stats', 'group'),
+                            author__username=username, id=post_id)
     author = post.author
     comments = post.comments.all()
-    paginator = Paginator(comments, POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    loader = DataLoader()
+    loader.prime(author)
+    page = load_comments(paginate(request, comments, COMMENT_ORDERING),
+                         loader)
     form = CommentForm(request.POST or None)
     following = Follow.objects.filter(user__username=request.user.username,
                                       author=author).exists()
@@ -98,12 +121,15 @@ def post_edit(request, username, post_id):
 
 @login_required
 def add_comment(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        author__username=username, id=post_id)
     form = CommentForm(request.POST or None)
-    paginator = Paginator(post.comments.all(), POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
     if not form.is_valid():
+        loader = DataLoader()
+        loader.prime(post.author)
+        page = load_comments(paginate(request, post.comments.all(),
+                                      COMMENT_ORDERING), loader)
         return render(request, 'post.html', {'form': form,
                                              'post': post,
                                              'page': page,
@@ -117,12 +143,11 @@ def add_comment(request, username, post_id):
 
 @login_required
 def follow_index(request):
-    paginator = Paginator(Post.objects.filter(
-        author__following__user=request.user
-    ), POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'follow.html', {'page': page})
+    page = load_posts(paginate(request, timeline.feed(request.user)))
+    return render(request, 'follow.html', {
+        'page': page,
+        'suggestions': suggestions.for_user(request.user),
+    })
 
 
 @login_required
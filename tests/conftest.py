@@ -1,4 +1,14 @@
+import pytest
+
+from yatube.runner import isolated
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_settings():
+    with isolated():
+        yield
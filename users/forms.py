@@ -1,3 +1,5 @@
+from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
 
@@ -8,3 +10,11 @@ class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ("first_name", "last_name", "username", "email")
+
+    def clean_username(self):
+        username = self.cleaned_data['username']
+        if username.lower() in settings.RESERVED_USERNAMES:
+            raise forms.ValidationError(
+                'Это имя совпадает с адресом раздела сайта'
+            )
+        return username
@@ -0,0 +1,76 @@
+"""Учёт запросов к базе и обращений к кешу за время HTTP-запроса.
+
+Общий для TimingMiddleware и MetricsMiddleware: execute_wrapper
+ставится на соединения один раз, тем блоком usage(), который открыт
+первым, а вложенные блоки читают те же счётчики и считают разницу.
+Поэтому каждый запрос к базе проходит через одну обёртку, сколько бы
+middleware его ни учитывали. Попадания в кеш знает только SharedCache
+(thread_stats), с другим кешем cache остаётся None.
+"""
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.core.cache import caches
+from django.db import connections
+
+_state = threading.local()
+
+
+class _QueryCounter:
+
+    def __init__(self):
+        self.queries = 0
+        self.database = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.database += time.perf_counter() - started
+
+
+def _cache_stats():
+    stats = getattr(caches['default'], 'thread_stats', None)
+    return stats() if stats else None
+
+
+class Usage:
+    """Итог блока usage(): queries — запросов к базе, database — их
+    время в секундах, cache — {'hits': ..., 'misses': ...} или None."""
+
+    def __init__(self, counter):
+        self._counter = counter
+        self._queries = counter.queries
+        self._database = counter.database
+        self._cache = _cache_stats()
+        self.queries = 0
+        self.database = 0.0
+        self.cache = None
+
+    def _finish(self):
+        self.queries = self._counter.queries - self._queries
+        self.database = self._counter.database - self._database
+        cache = _cache_stats()
+        if self._cache is not None and cache is not None:
+            self.cache = {name: cache[name] - self._cache[name]
+                          for name in ('hits', 'misses')}
+
+
+@contextmanager
+def usage():
+    """Считает запросы к базе и обращения к кешу потока внутри блока."""
+    counter = getattr(_state, 'counter', None)
+    with ExitStack() as stack:
+        if counter is None:
+            counter = _state.counter = _QueryCounter()
+            stack.callback(setattr, _state, 'counter', None)
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+        result = Usage(counter)
+        try:
+            yield result
+        finally:
+            result._finish()
@@ -0,0 +1,360 @@
+"""Кеш, общий для всех процессов сервера на одной машине.
+
+Значения хранятся в SQLite в режиме WAL: читатели не блокируют писателя,
+а внешний сервис не нужен. Перед базой стоит небольшой LRU-кеш процесса
+(L1). Чтобы L1 не отдавал значения, изменённые другим процессом, каждый
+ключ привязан к одному из счётчиков в общем mmap-файле. Любая запись
+увеличивает счётчик ключа, и копия в L1 с устаревшим счётчиком
+отбрасывается. Проверка стоит одного чтения из памяти, без системных
+вызовов.
+"""
+import mmap
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+SLOTS = 4096
+COUNTER = struct.Struct('=Q')
+# Нулевой счётчик — эпоха всего кеша, её увеличивает clear().
+EPOCH = 0
+# Как часто (в записях) проверять, не пора ли вытеснять старые ключи.
+CULL_EVERY = 64
+# Ограничение SQLite на число параметров запроса.
+MAX_PARAMS = 900
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class _Tier:
+    """Всё, что один процесс держит для одного файла кеша: L1, счётчики
+    версий и статистику. Django создаёт свой экземпляр бэкенда в каждом
+    потоке, поэтому эти данные живут на уровне модуля, как у LocMemCache.
+    """
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Блокировки fcntl принадлежат процессу и не разделяют его потоки,
+        # поэтому потоки процесса увеличивают счётчики по очереди.
+        self.versions_lock = threading.Lock()
+        self.stats = Counter()
+        # Попадания и промахи по потокам: замер запроса (yatube.timing)
+        # берёт разницу до и после, не смешивая соседние потоки.
+        self.thread = threading.local()
+        self.writes = 0
+        self.file = open(path + '.versions', 'a+b')
+        size = SLOTS * COUNTER.size
+        if os.fstat(self.file.fileno()).st_size < size:
+            self.file.truncate(size)
+        self.versions = mmap.mmap(self.file.fileno(), size)
+
+    def stamp(self, slot):
+        return (COUNTER.unpack_from(self.versions, EPOCH)[0],
+                COUNTER.unpack_from(self.versions, slot * COUNTER.size)[0])
+
+    def bump(self, slots):
+        for slot in sorted(set(slots)):
+            offset = slot * COUNTER.size
+            with self.versions_lock:
+                if fcntl is not None:
+                    fcntl.lockf(self.file, fcntl.LOCK_EX, COUNTER.size,
+                                offset)
+                try:
+                    value = COUNTER.unpack_from(self.versions, offset)[0]
+                    COUNTER.pack_into(self.versions, offset, value + 1)
+                finally:
+                    if fcntl is not None:
+                        fcntl.lockf(self.file, fcntl.LOCK_UN, COUNTER.size,
+                                    offset)
+
+    def get(self, key, slot, now):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stamp, expires, value = entry
+            if stamp != self.stamp(slot) or (
+                    expires is not None and expires <= now):
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, stamp, expires, value):
+        with self.lock:
+            self.entries[key] = (stamp, expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats['l1_evictions'] += 1
+
+    def discard(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+
+def _tier(path, max_entries):
+    with _tiers_lock:
+        tier = _tiers.get(path)
+        if tier is None:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tier = _tiers[path] = _Tier(path, max_entries)
+        return tier
+
+
+def _slot(key):
+    return zlib.crc32(key.encode()) % (SLOTS - 1) + 1
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), MAX_PARAMS):
+        yield items[start:start + MAX_PARAMS]
+
+
+class SharedCache(BaseCache):
+    """Бэкенд кеша: SQLite-файл LOCATION, общий для процессов, и L1 на
+    L1_MAX_ENTRIES значений в каждом процессе."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._tier = _tier(location, int(options.get('L1_MAX_ENTRIES',
+                                                     1000)))
+        self._connection = None
+        self._pid = None
+
+    @property
+    def _db(self):
+        # После fork соединение родителя использовать нельзя.
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(
+                self._path, timeout=self._busy_timeout,
+                isolation_level=None, check_same_thread=False,
+            )
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                self._connection.execute(statement)
+            self._pid = os.getpid()
+        return self._connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def stats(self):
+        """Статистика текущего процесса по всем бэкендам этого файла."""
+        stats = self._tier.stats
+        return {name: stats[name] for name in (
+            'hits', 'l1_hits', 'misses', 'sets', 'deletes', 'evictions',
+            'l1_evictions',
+        )}
+
+    def thread_stats(self):
+        """Попадания и промахи текущего потока с его запуска."""
+        thread = self._tier.thread
+        return {'hits': getattr(thread, 'hits', 0),
+                'misses': getattr(thread, 'misses', 0)}
+
+    def _load(self, keys):
+        tier = self._tier
+        now = time.time()
+        found = {}
+        missing = []
+        for key in keys:
+            value = tier.get(key, _slot(key), now)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        tier.stats['l1_hits'] += len(found)
+        tier.stats['hits'] += len(found)
+        # Метку берём до чтения из базы: запись, случившаяся между ними,
+        # увеличит счётчик, и копия в L1 сразу окажется устаревшей.
+        stamps = {key: tier.stamp(_slot(key)) for key in missing}
+        for chunk in _chunks(missing):
+            rows = self._db.execute(
+                'SELECT key, value, expires FROM cache WHERE key IN (%s) '
+                'AND (expires IS NULL OR expires > ?)'
+                % ', '.join('?' * len(chunk)), chunk + [now],
+            )
+            for key, value, expires in rows:
+                found[key] = value
+                tier.put(key, stamps[key], expires, value)
+                tier.stats['hits'] += 1
+        tier.stats['misses'] += len(keys) - len(found)
+        thread = tier.thread
+        thread.hits = getattr(thread, 'hits', 0) + len(found)
+        thread.misses = (getattr(thread, 'misses', 0)
+                         + len(keys) - len(found))
+        return {key: pickle.loads(value) for key, value in found.items()}
+
+    def _changed(self, keys):
+        tier = self._tier
+        tier.discard(keys)
+        tier.bump(_slot(key) for key in keys)
+
+    def _store(self, items, timeout):
+        expires = self.get_backend_timeout(timeout)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                ((key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+                 for key, value in items),
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        self._changed([key for key, _ in items])
+        self._tier.stats['sets'] += len(items)
+        self._maybe_cull(len(items))
+
+    def _maybe_cull(self, writes):
+        tier = self._tier
+        tier.writes += writes
+        if tier.writes < CULL_EVERY:
+            return
+        tier.writes = 0
+        db = self._db
+        evicted = db.execute('DELETE FROM cache WHERE expires <= ?',
+                             [time.time()]).rowcount
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            # Строки в порядке rowid — примерно порядок последней записи.
+            evicted += db.execute(
+                'DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache '
+                'ORDER BY rowid LIMIT ?)', [count // self._cull_frequency],
+            ).rowcount
+        tier.stats['evictions'] += evicted
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._load([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        return {keys[key]: value
+                for key, value in self._load(list(keys)).items()}
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return key in self._load([key])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout == 0:
+            return self.delete(key, version=version)
+        self._store([(self._key(key, version), value)], timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout == 0:
+            self.delete_many(data, version=version)
+            return []
+        self._store([(self._key(key, version), value)
+                     for key, value in data.items()], timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        # Истёкшую запись add() вправе перезаписать.
+        db = self._db
+        db.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires WHERE cache.expires <= ?',
+            [key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+             self.get_backend_timeout(timeout), time.time()],
+        )
+        added = db.execute('SELECT changes()').fetchone()[0] > 0
+        if added:
+            self._changed([key])
+            self._tier.stats['sets'] += 1
+            self._maybe_cull(1)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        touched = self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [self.get_backend_timeout(timeout), key, time.time()],
+        ).rowcount > 0
+        if touched:
+            self._changed([key])
+        return touched
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)', [key, time.time()],
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            db.execute('UPDATE cache SET value = ? WHERE key = ?',
+                       [pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key])
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        self._changed([key])
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        deleted = 0
+        for chunk in _chunks(keys):
+            deleted += self._db.execute(
+                'DELETE FROM cache WHERE key IN (%s)'
+                % ', '.join('?' * len(chunk)), chunk,
+            ).rowcount
+        self._changed(keys)
+        self._tier.stats['deletes'] += deleted
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+        tier = self._tier
+        with tier.lock:
+            tier.entries.clear()
+        tier.bump([EPOCH])
+
+    def close(self, **kwargs):
+        # Соединение живёт столько же, сколько поток: Django закрывает
+        # кеши после каждого запроса, а открывать SQLite каждый раз дорого.
+        pass
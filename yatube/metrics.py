@@ -0,0 +1,440 @@
+"""Метрики для Prometheus без внешнего сервиса.
+
+Каждый процесс сервера пишет свои счётчики в собственный файл
+METRICS_DIR/<pid>.metrics, отображённый в память (mmap): прибавка — это
+запись числа в память под блокировкой процесса, без системных вызовов.
+Файл — таблица рядов: имя метрики, значения меток и число. /metrics
+читает файлы всех процессов, складывает одинаковые ряды и отдаёт их в
+текстовом формате Prometheus.
+
+Гистограммы хранят счётчик каждой корзины отдельно и сумму значений;
+накопленные корзины le и _count считаются при выдаче. Так процесс
+делает две записи на наблюдение, а Prometheus по корзинам считает p99
+(histogram_quantile) за любое окно.
+
+Чтобы счётчики не падали при перезапуске воркеров, ряды завершённых
+процессов не пропадают: новый процесс до создания своего файла
+переносит их в общий файл aggregate.metrics и удаляет файлы мёртвых
+pid. Файл с собственным pid остался от прежнего процесса и тоже
+переносится, а свой файл процесс всегда начинает с нуля. Перенос и
+чтение /metrics разделяет блокировка файла .lock, поэтому выдача не
+видит ряд дважды или ни разу. Каталог очищается при развёртывании
+вместе с остальным cache/.
+
+/metrics отдаётся по токену METRICS_TOKEN (заголовок Authorization:
+Bearer), а без него — адресам METRICS_ALLOWED_IPS. Адрес клиента за
+прокси из METRICS_TRUSTED_PROXIES берётся из X-Forwarded-For, поэтому
+прокси на той же машине не делает метрики публичными.
+"""
+import abc
+import bisect
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from . import accounting
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+logger = logging.getLogger('yatube.metrics')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+SUFFIX = '.metrics'
+AGGREGATE = f'aggregate{SUFFIX}'
+LOCK = '.lock'
+UNMATCHED = 'unmatched'
+
+# Заголовок файла — число занятых рядов, ряд — длина ключа, ключ в JSON
+# и значение. Ряд занимает 256 байт, значение выровнено по 8 байтам.
+HEADER = struct.Struct('=Q')
+KEY_SIZE = 246
+SLOT = struct.Struct(f'=H{KEY_SIZE}sd')
+VALUE = struct.Struct('=d')
+VALUE_OFFSET = SLOT.size - VALUE.size
+
+# Границы корзин гистограмм.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+                   10)
+QUERY_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+THUMBNAIL_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+UPLOAD_BUCKETS = tuple(2 ** power for power in range(14, 26, 2))
+
+
+def _slots(buffer):
+    """Ряды файла: (ключ, смещение, значение)."""
+    if len(buffer) < HEADER.size:
+        return
+    count = HEADER.unpack_from(buffer, 0)[0]
+    count = min(count, (len(buffer) - HEADER.size) // SLOT.size)
+    for number in range(count):
+        offset = HEADER.size + number * SLOT.size
+        length, key, value = SLOT.unpack_from(buffer, offset)
+        name, labels, field = json.loads(key[:length])
+        yield (name, tuple(labels), field), offset, value
+
+
+def _encode(key):
+    return json.dumps(key, ensure_ascii=False,
+                      separators=(',', ':')).encode()
+
+
+class _File:
+    """Файл рядов одного процесса. Пишет в него только этот процесс."""
+
+    def __init__(self, path, capacity):
+        self.lock = threading.Lock()
+        # Файл всегда начинается с нуля: ряды прежнего процесса с тем же
+        # pid уже перенесены в AGGREGATE.
+        self.file = open(path, 'w+b')
+        size = HEADER.size + capacity * SLOT.size
+        self.file.truncate(size)
+        self.memory = mmap.mmap(self.file.fileno(), size)
+        self.capacity = capacity
+        self.index = {}
+        self.full = False
+
+    def add(self, key, amount):
+        with self.lock:
+            offset = self.index.get(key)
+            if offset is None:
+                offset = self._register(key)
+                if offset is None:
+                    return
+            position = offset + VALUE_OFFSET
+            value = VALUE.unpack_from(self.memory, position)[0]
+            VALUE.pack_into(self.memory, position, value + amount)
+
+    def _register(self, key):
+        encoded = _encode(key)
+        count = len(self.index)
+        if len(encoded) > KEY_SIZE or count >= self.capacity:
+            if not self.full:
+                self.full = True
+                logger.warning('Ряд метрики не записан: %s', encoded)
+            return None
+        offset = HEADER.size + count * SLOT.size
+        SLOT.pack_into(self.memory, offset, len(encoded), encoded, 0.0)
+        # Число рядов растёт последним: читатель не увидит пустой ряд.
+        HEADER.pack_into(self.memory, 0, count + 1)
+        self.index[key] = offset
+        return offset
+
+
+_files = {}
+_files_lock = threading.Lock()
+
+
+@contextmanager
+def _locked(directory, exclusive):
+    """Блокировка каталога: перенос рядов — исключительная, чтение —
+    общая."""
+    with open(os.path.join(directory, LOCK), 'a+b') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file,
+                        fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def _alive(pid):
+    if pid == os.getpid():
+        # Файл остался от прежнего процесса с тем же pid.
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read(path):
+    try:
+        with open(path, 'rb') as metrics_file:
+            return metrics_file.read()
+    except FileNotFoundError:
+        return b''
+
+
+def _merge_dead(directory):
+    """Складывает ряды файлов завершённых процессов в AGGREGATE и удаляет
+    эти файлы. Вызывается под исключительной блокировкой каталога."""
+    dead = []
+    for name in os.listdir(directory):
+        pid = name[:-len(SUFFIX)]
+        if name.endswith(SUFFIX) and pid.isdigit() and not _alive(int(pid)):
+            dead.append(os.path.join(directory, name))
+    if not dead:
+        return
+    aggregate = os.path.join(directory, AGGREGATE)
+    totals = defaultdict(float)
+    for path in [aggregate] + dead:
+        for key, _, value in _slots(_read(path)):
+            totals[key] += value
+    buffer = bytearray(HEADER.size + len(totals) * SLOT.size)
+    HEADER.pack_into(buffer, 0, len(totals))
+    for number, (key, value) in enumerate(totals.items()):
+        encoded = _encode(key)
+        SLOT.pack_into(buffer, HEADER.size + number * SLOT.size,
+                       len(encoded), encoded, value)
+    temporary = f'{aggregate}.{os.getpid()}'
+    with open(temporary, 'wb') as metrics_file:
+        metrics_file.write(buffer)
+    os.replace(temporary, aggregate)
+    for path in dead:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _current():
+    """Файл текущего процесса; после fork у потомка будет свой."""
+    directory = settings.METRICS_DIR
+    if not directory:
+        return None
+    key = (os.getpid(), directory)
+    metrics_file = _files.get(key)
+    if metrics_file is None:
+        with _files_lock:
+            metrics_file = _files.get(key)
+            if metrics_file is None:
+                os.makedirs(directory, exist_ok=True)
+                with _locked(directory, exclusive=True):
+                    _merge_dead(directory)
+                    metrics_file = _files[key] = _File(
+                        os.path.join(directory, f'{os.getpid()}{SUFFIX}'),
+                        settings.METRICS_MAX_SERIES,
+                    )
+    return metrics_file
+
+
+def _add(key, amount):
+    metrics_file = _current()
+    if metrics_file is not None:
+        metrics_file.add(key, amount)
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+class Metric(abc.ABC):
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        REGISTRY.append(self)
+
+    def _values(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def _format(self, values, extra=()):
+        pairs = list(zip(self.labels, values)) + list(extra)
+        if not pairs:
+            return ''
+        return '{%s}' % ','.join(f'{label}="{_escape(value)}"'
+                                 for label, value in pairs)
+
+    @abc.abstractmethod
+    def samples(self, series):
+        """Строки выдачи по рядам всех метрик из collect()."""
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        _add((self.name, self._values(labels), ''), amount)
+
+    def samples(self, series):
+        for (values, _), value in sorted(series.get(self.name, {}).items()):
+            yield f'{self.name}{self._format(values)} {_number(value)}'
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        values = self._values(labels)
+        # Корзина — первая граница не меньше значения (le), за последней
+        # границей — +Inf.
+        bucket = bisect.bisect_left(self.buckets, value)
+        _add((self.name, values, bucket), 1)
+        _add((self.name, values, 'sum'), value)
+
+    def samples(self, series):
+        grouped = defaultdict(dict)
+        for (values, field), value in series.get(self.name, {}).items():
+            grouped[values][field] = value
+        for values, fields in sorted(grouped.items()):
+            total = 0
+            bounds = self.buckets + (math.inf,)
+            for bucket, bound in enumerate(bounds):
+                total += fields.get(bucket, 0)
+                labels = self._format(values, [('le', _number(bound))])
+                yield f'{self.name}_bucket{labels} {_number(total)}'
+            labels = self._format(values)
+            yield f'{self.name}_sum{labels} {_number(fields.get("sum", 0))}'
+            yield f'{self.name}_count{labels} {_number(total)}'
+
+
+class Ratio(Metric):
+    """Доля ряда label=part среди всех рядов счётчика; считается при
+    выдаче, в файлы не пишется."""
+    type = 'gauge'
+
+    def __init__(self, name, documentation, counter, label, part):
+        super().__init__(name, documentation)
+        self.counter = counter
+        self.label = label
+        self.part = part
+
+    def samples(self, series):
+        position = self.counter.labels.index(self.label)
+        counts = series.get(self.counter.name, {})
+        total = sum(counts.values())
+        if total:
+            part = sum(value for (values, _), value in counts.items()
+                       if values[position] == self.part)
+            yield f'{self.name} {_number(part / total)}'
+
+
+REGISTRY = []
+
+REQUEST_SECONDS = Histogram(
+    'yatube_request_duration_seconds',
+    'Время ответа по имени адреса', LATENCY_BUCKETS, ['view'],
+)
+RESPONSES = Counter(
+    'yatube_responses_total',
+    'Ответы по имени адреса и коду ответа', ['view', 'status'],
+)
+QUERIES = Histogram(
+    'yatube_db_queries_per_request',
+    'Запросов к базе за один запрос', QUERY_BUCKETS, ['view'],
+)
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total',
+    'Обращения к кешу во время запросов', ['result'],
+)
+CACHE_HIT_RATIO = Ratio(
+    'yatube_cache_hit_ratio',
+    'Доля попаданий в кеш за всё время', CACHE_REQUESTS, 'result', 'hit',
+)
+THUMBNAIL_SECONDS = Histogram(
+    'yatube_thumbnail_seconds',
+    'Время нарезки одного варианта изображения', THUMBNAIL_BUCKETS,
+    ['format'],
+)
+UPLOAD_BYTES = Histogram(
+    'yatube_upload_bytes',
+    'Размер загруженных изображений', UPLOAD_BUCKETS,
+)
+
+
+def collect(directory=None):
+    """Складывает ряды всех процессов: {метрика: {(метки, поле): число}}."""
+    directory = directory or settings.METRICS_DIR
+    series = defaultdict(lambda: defaultdict(float))
+    if not directory or not os.path.isdir(directory):
+        return series
+    with _locked(directory, exclusive=False):
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(SUFFIX):
+                continue
+            data = _read(os.path.join(directory, name))
+            for (metric, values, field), _, value in _slots(data):
+                series[metric][values, field] += value
+    return series
+
+
+def render(series):
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.samples(series))
+    return '\n'.join(lines) + '\n'
+
+
+def _client_address(request):
+    """Адрес клиента: за доверенными прокси — из X-Forwarded-For, справа
+    налево до первого адреса, который не прокси."""
+    address = request.META.get('REMOTE_ADDR')
+    forwarded = [item.strip() for item in request.META.get(
+        'HTTP_X_FORWARDED_FOR', ''
+    ).split(',') if item.strip()]
+    while address in settings.METRICS_TRUSTED_PROXIES and forwarded:
+        address = forwarded.pop()
+    return address
+
+
+def _allowed(request):
+    if settings.METRICS_TOKEN:
+        return constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''),
+            f'Bearer {settings.METRICS_TOKEN}',
+        )
+    return _client_address(request) in settings.METRICS_ALLOWED_IPS
+
+
+def view(request):
+    if not _allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """Время ответа, код и число запросов к базе по имени адреса,
+    попадания в кеш — для каждого запроса."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_DIR:
+            return self.get_response(request)
+        started = time.perf_counter()
+        with accounting.usage() as usage:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        name = match.view_name if match else UNMATCHED
+        REQUEST_SECONDS.observe(elapsed, view=name)
+        RESPONSES.inc(view=name, status=response.status_code)
+        QUERIES.observe(usage.queries, view=name)
+        if usage.cache is not None:
+            for result, field in (('hit', 'hits'), ('miss', 'misses')):
+                if usage.cache[field]:
+                    CACHE_REQUESTS.inc(usage.cache[field], result=result)
+        return response
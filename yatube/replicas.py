@@ -0,0 +1,76 @@
+"""Чтение со списка реплик для страниц, которые только показывают данные.
+
+ReplicaMiddleware выбирает реплику для запросов к view из REPLICA_VIEWS,
+а ReplicaRouter направляет на неё чтения этого запроса. Все записи и
+остальные чтения идут в основную базу. Реплики — копии основной базы,
+которые обновляет команда sync_replicas, поэтому они отстают. Чтобы
+автор сразу видел свою запись, запрос, который что-то записал, ставит
+cookie, и REPLICA_STICKY_SECONDS запросы этого браузера читают из
+основной базы.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'primary'
+SAFE_METHODS = ('GET', 'HEAD')
+# Сессию только что вошедшего пользователя реплика может ещё не знать.
+PRIMARY_APPS = ('sessions',)
+
+_state = threading.local()
+
+
+def current():
+    """Реплика, с которой читает текущий запрос, или None."""
+    return getattr(_state, 'alias', None)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return current()
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же строки, что и в основной базе.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.alias = None
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = _state.wrote
+            _state.alias = None
+        if settings.DATABASE_REPLICAS and (
+                wrote or request.method not in SAFE_METHODS):
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view, args, kwargs):
+        if (settings.DATABASE_REPLICAS
+                and request.method in SAFE_METHODS
+                and STICKY_COOKIE not in request.COOKIES
+                and request.resolver_match.view_name
+                in settings.REPLICA_VIEWS):
+            _state.alias = random.choice(settings.DATABASE_REPLICAS)
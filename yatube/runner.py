@@ -0,0 +1,47 @@
+"""Запуск тестов без общих файлов сервера.
+
+Тесты пересоздают базу при каждом запуске, и общий файл кеша отдавал бы
+страницы прошлых прогонов, а статистика SQL и метрики смешивались бы с
+рабочими. На время тестов настройки подменяются через override_settings,
+а загрузки идут во временный MEDIA_ROOT, который удаляется после
+прогона. Тесты самих механизмов включают их своими override_settings.
+"""
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+TEST_SETTINGS = {
+    'CACHES': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    'TIMING_SAMPLE_RATE': 0,
+    'SQL_STATS_PATH': None,
+    'METRICS_DIR': None,
+}
+
+
+@contextmanager
+def isolated():
+    media = tempfile.mkdtemp()
+    try:
+        with override_settings(MEDIA_ROOT=media, **TEST_SETTINGS):
+            yield
+    finally:
+        shutil.rmtree(media, ignore_errors=True)
+
+
+class IsolatedRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.isolated = ExitStack()
+        self.isolated.enter_context(isolated())
+
+    def teardown_test_environment(self, **kwargs):
+        self.isolated.close()
+        super().teardown_test_environment(**kwargs)
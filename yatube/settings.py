@@ -26,10 +26,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.timing.TimingMiddleware',
+    'yatube.sqlstats.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -37,13 +39,15 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'yatube.replicas.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Django-шаблоны с замером времени render() (yatube/timing.py).
+        "BACKEND": "yatube.timing.TimedDjangoTemplates",
         "DIRS": [TEMPLATES_DIR],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -60,13 +64,52 @@ TEMPLATES = [
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
+# SQLite в режиме WAL с настройками для нескольких процессов сервера
+# (yatube/sqlite). Соединение живёт между запросами одного потока.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                # Сколько ждать (мс), пока другой процесс пишет в базу.
+                'busy_timeout': 5000,
+                'mmap_size': 256 * 1024 * 1024,
+                # Отрицательное значение — размер кеша страниц в КиБ.
+                'cache_size': -64 * 1024,
+                'temp_store': 'MEMORY',
+            },
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Алиасы реплик из DATABASES, с которых читают страницы REPLICA_VIEWS
+# (yatube/replicas.py). Реплику обновляет команда sync_replicas, например:
+# DATABASES['replica1'] = {
+#     **DATABASES['default'],
+#     'NAME': os.path.join(BASE_DIR, 'replicas', 'replica1.sqlite3'),
+# }
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['yatube.replicas.ReplicaRouter']
+REPLICA_VIEWS = [
+    'posts:index',
+    'posts:group_posts',
+    'posts:profile',
+    'posts:post_view',
+    'posts:follow_index',
+    'posts:api_index',
+    'posts:api_group',
+    'posts:api_profile',
+    'posts:api_post',
+    'posts:api_comments',
+]
+# Сколько секунд после записи браузер читает из основной базы.
+REPLICA_STICKY_SECONDS = 30
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -112,6 +155,114 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
-CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+# Кеш общий для всех процессов сервера на машине: SQLite-файл в режиме
+# WAL и небольшой LRU-кеш в каждом процессе.
+CACHES = {
+    'default': {
+        'BACKEND': 'yatube.cache.SharedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'default.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'L1_MAX_ENTRIES': 2000,
+        },
+    },
+}
+
+# Тесты подменяют кеш, замеры и метрики через override_settings.
+TEST_RUNNER = 'yatube.runner.IsolatedRunner'
 
 POSTS_COUNT = 10
+
+# Имена, которые нельзя взять при регистрации: профиль /<username>/
+# совпал бы с адресом раздела сайта и был бы недоступен.
+RESERVED_USERNAMES = (
+    '404', '500', 'about', 'admin', 'api', 'auth', 'follow', 'group',
+    'media', 'metrics', 'new', 'resize', 'search', 'static',
+)
+
+# Какая доля запросов замеряется (yatube/timing.py): заголовок
+# Server-Timing и строка в логе yatube.timing.
+TIMING_SAMPLE_RATE = 0.05
+
+# Статистика запросов SQL по отпечаткам (yatube/sqlstats.py): общий
+# файл процессов, как часто он пополняется, сколько отпечатков хранить,
+# порог медленного запроса в мс и длина журнала медленных запросов.
+SQL_STATS_PATH = os.path.join(BASE_DIR, 'cache', 'sql_stats.sqlite3')
+SQL_STATS_FLUSH_SECONDS = 10
+SQL_STATS_MAX_FINGERPRINTS = 500
+SQL_SLOW_MS = 100
+SQL_SLOW_LOG_SIZE = 200
+
+# Метрики Prometheus (yatube/metrics.py): каталог файлов процессов,
+# сколько рядов помещается в файл процесса и кто может забирать
+# /metrics: по токену из окружения (Authorization: Bearer), а без него —
+# с адресов METRICS_ALLOWED_IPS. Запросы от METRICS_TRUSTED_PROXIES
+# проверяются по адресу из X-Forwarded-For.
+METRICS_DIR = os.path.join(BASE_DIR, 'cache', 'metrics')
+METRICS_MAX_SERIES = 2048
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+METRICS_TRUSTED_PROXIES = ('127.0.0.1', '::1')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'yatube.sql': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Ленты подписок материализуются при публикации поста. Посты авторов,
+# у которых подписчиков больше лимита, подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+
+# Насколько должно упасть число подписчиков ниже лимита, чтобы посты
+# автора снова раскладывались по лентам. Без запаса автор на границе
+# переключался бы с каждой подпиской и отпиской.
+TIMELINE_FANOUT_HYSTERESIS = 100
+
+# Сколько последних постов автора переносится в ленту при подписке.
+TIMELINE_BACKFILL = 1000
+
+# Сколько хранится отрисованная карточка поста. Устаревшие карточки
+# отсекаются версией в ключе, срок нужен лишь для очистки кеша.
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+# Сколько хранятся страницы для анонимных посетителей. Актуальность
+# проверяется по поколениям кеша при каждом запросе.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 12
+
+# Нарезка изображений по подписанным ссылкам: каталог и объём дискового
+# кеша, число потоков, предел очереди и сколько запрос ждёт нарезку.
+RESIZE_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'resized')
+RESIZE_CACHE_BYTES = 512 * 1024 * 1024
+RESIZE_WORKERS = 2
+RESIZE_QUEUE = 32
+RESIZE_TIMEOUT = 30
+
+# Посты старше этого срока команда archive_posts переносит в архив, по
+# ARCHIVE_BATCH постов за транзакцию.
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH = 500
+
+# Рекомендации авторов: сколько хранится на пользователя и сколько
+# показывается. Авторы, у которых подписчиков больше лимита, не
+# используются для поиска похожих читателей. При подписке и отписке
+# похожие читатели берутся из последних SUGGESTIONS_REFRESH_NEIGHBOURS
+# подписок на авторов читателя.
+SUGGESTIONS_PER_USER = 20
+SUGGESTIONS_SHOWN = 5
+SUGGESTIONS_POPULAR_LIMIT = 1000
+SUGGESTIONS_REFRESH_NEIGHBOURS = 200
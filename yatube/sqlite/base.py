@@ -0,0 +1,56 @@
+"""SQLite для нескольких процессов сервера.
+
+Каждое новое соединение настраивается PRAGMA из OPTIONS['pragmas']:
+журнал WAL (читатели не ждут писателя), synchronous=NORMAL, отображение
+файла в память, увеличенный кеш страниц и ожидание занятой базы вместо
+немедленной ошибки «database is locked».
+
+Транзакции открываются как BEGIN IMMEDIATE. При обычном BEGIN
+транзакция сначала читает, а блокировку записи запрашивает позже; если
+её уже держит другой процесс, SQLite не ждёт busy_timeout, а сразу
+отвечает ошибкой, чтобы избежать взаимной блокировки. IMMEDIATE берёт
+блокировку записи в самом начале, и конкуренты просто ждут очереди.
+
+Если задан SQL_STATS_PATH, курсоры собирают статистику запросов
+(yatube/sqlstats.py).
+"""
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+from yatube import sqlstats
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # Эти настройки наши, sqlite3.connect() о них не знает.
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        self.transaction_mode = params.pop('transaction_mode', 'IMMEDIATE')
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def make_cursor(self, cursor):
+        if settings.SQL_STATS_PATH:
+            return sqlstats.CaptureCursorWrapper(cursor, self)
+        return super().make_cursor(cursor)
+
+    def make_debug_cursor(self, cursor):
+        if settings.SQL_STATS_PATH:
+            return sqlstats.CaptureCursorDebugWrapper(cursor, self)
+        return super().make_debug_cursor(cursor)
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}'.strip())
@@ -0,0 +1,369 @@
+"""Статистика запросов SQL по отпечаткам.
+
+Курсор базы (yatube/sqlite) оборачивается в CaptureCursorWrapper: он
+замеряет время execute() и чтения строк и считает прочитанные строки.
+Отпечаток запроса — его текст без значений: литералы заменены на ?,
+списки параметров IN (...) и строки VALUES свёрнуты, поэтому один и тот
+же запрос с разными аргументами попадает в одну строку отчёта.
+
+Каждый процесс копит статистику в памяти (не больше
+SQL_STATS_MAX_FINGERPRINTS отпечатков) и раз в SQL_STATS_FLUSH_SECONDS
+прибавляет её к общему SQLite-файлу SQL_STATS_PATH. Время хранится
+гистограммой с удваивающимися границами: гистограммы процессов
+складываются, и p95 считается по сумме. Запросы дольше SQL_SLOW_MS
+пишутся в лог yatube.sql и в журнал последних SQL_SLOW_LOG_SIZE
+медленных запросов.
+
+QueryStatsMiddleware запоминает view запроса: отчёт показывает, какие
+страницы выполняют запрос и сколько раз за запрос к странице. Много
+одинаковых запросов на страницу — признак N+1.
+"""
+import bisect
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db.backends.utils import CursorDebugWrapper, CursorWrapper
+
+logger = logging.getLogger('yatube.sql')
+
+# Верхние границы корзин гистограммы, мс; последняя корзина — всё дольше.
+BUCKETS = [0.1 * 2 ** power for power in range(16)]
+OTHER = '(прочие запросы)'
+NO_VIEW = ''
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+PARAMETERS = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+ROWS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+SPACES = re.compile(r'\s+')
+
+BUCKET_COLUMNS = [f'b{number}' for number in range(len(BUCKETS) + 1)]
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS fingerprints ('
+    'fingerprint TEXT PRIMARY KEY, sample TEXT NOT NULL, '
+    'calls INTEGER NOT NULL, total REAL NOT NULL, rows INTEGER NOT NULL, '
+    + ', '.join(f'{column} INTEGER NOT NULL' for column in BUCKET_COLUMNS)
+    + ')',
+    'CREATE TABLE IF NOT EXISTS fingerprint_views ('
+    'fingerprint TEXT NOT NULL, view TEXT NOT NULL, '
+    'calls INTEGER NOT NULL, PRIMARY KEY (fingerprint, view))',
+    'CREATE TABLE IF NOT EXISTS view_requests ('
+    'view TEXT PRIMARY KEY, requests INTEGER NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS slow_queries ('
+    'at REAL NOT NULL, ms REAL NOT NULL, view TEXT NOT NULL, '
+    'sql TEXT NOT NULL)',
+)
+
+_state = threading.local()
+
+
+def fingerprint(sql):
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = PARAMETERS.sub('(...)', sql)
+    sql = ROWS.sub('(...), ...', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def current_view():
+    return getattr(_state, 'view', NO_VIEW)
+
+
+class Entry:
+
+    def __init__(self, sample):
+        self.sample = sample
+        self.calls = 0
+        self.total = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+
+class Collector:
+    """Статистика текущего процесса до очередного сброса в файл."""
+
+    def __init__(self):
+        # RLock: курсор, собранный сборщиком мусора посреди record(),
+        # записывает свой запрос из того же потока.
+        self.lock = threading.RLock()
+        self.fingerprints = {}
+        self.connection = None
+        self.pid = self.path = None
+        self.reset()
+
+    def reset(self):
+        self.entries = {}
+        self.views = Counter()
+        self.requests = Counter()
+        self.slow = []
+        self.flushed = time.monotonic()
+
+    def fingerprint(self, sql):
+        found = self.fingerprints.get(sql)
+        if found is None:
+            if len(self.fingerprints) > 10000:
+                self.fingerprints.clear()
+            found = self.fingerprints[sql] = fingerprint(sql)
+        return found
+
+    def record(self, sql, seconds, rows):
+        key = self.fingerprint(sql)
+        view = current_view()
+        milliseconds = seconds * 1000
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if len(self.entries) >= settings.SQL_STATS_MAX_FINGERPRINTS:
+                    key = OTHER
+                entry = self.entries.setdefault(key, Entry(sql))
+            entry.calls += 1
+            entry.total += milliseconds
+            entry.rows += rows
+            entry.buckets[bisect.bisect_left(BUCKETS, milliseconds)] += 1
+            self.views[key, view] += 1
+            if milliseconds >= settings.SQL_SLOW_MS:
+                self.slow.append((time.time(), milliseconds, view, sql))
+        if milliseconds >= settings.SQL_SLOW_MS:
+            logger.warning(json.dumps(
+                {'ms': round(milliseconds, 2), 'view': view, 'sql': sql},
+                ensure_ascii=False,
+            ))
+        if time.monotonic() - self.flushed >= (
+                settings.SQL_STATS_FLUSH_SECONDS):
+            self.flush()
+
+    def request(self, view):
+        with self.lock:
+            self.requests[view] += 1
+
+    @property
+    def db(self):
+        # Своё соединение sqlite3, а не Django: запись статистики сама
+        # в статистику не попадает. После fork соединение родителя
+        # использовать нельзя.
+        path = settings.SQL_STATS_PATH
+        if self.connection is None or (self.pid, self.path) != (
+                os.getpid(), path):
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.connection = sqlite3.connect(
+                path, timeout=5, isolation_level=None,
+                check_same_thread=False,
+            )
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+            self.pid, self.path = os.getpid(), path
+        return self.connection
+
+    def flush(self):
+        """Прибавляет накопленное к общему файлу."""
+        with self.lock:
+            entries, views = self.entries, self.views
+            requests, slow = self.requests, self.slow
+            self.reset()
+        if not (entries or requests or slow):
+            return
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            self.write(db, entries, views, requests, slow)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def write(self, db, entries, views, requests, slow):
+        columns = ', '.join(BUCKET_COLUMNS)
+        placeholders = ', '.join('?' * (5 + len(BUCKET_COLUMNS)))
+        db.executemany(
+            f'INSERT INTO fingerprints (fingerprint, sample, calls, total, '
+            f'rows, {columns}) VALUES ({placeholders}) '
+            f'ON CONFLICT (fingerprint) DO UPDATE SET '
+            f'calls = calls + excluded.calls, '
+            f'total = total + excluded.total, rows = rows + excluded.rows, '
+            + ', '.join(f'{column} = {column} + excluded.{column}'
+                        for column in BUCKET_COLUMNS),
+            ([key, entry.sample, entry.calls, entry.total, entry.rows,
+              *entry.buckets] for key, entry in entries.items()),
+        )
+        db.executemany(
+            'INSERT INTO fingerprint_views (fingerprint, view, calls) '
+            'VALUES (?, ?, ?) ON CONFLICT (fingerprint, view) '
+            'DO UPDATE SET calls = calls + excluded.calls',
+            ([key, view, calls] for (key, view), calls in views.items()),
+        )
+        db.executemany(
+            'INSERT INTO view_requests (view, requests) VALUES (?, ?) '
+            'ON CONFLICT (view) DO UPDATE SET '
+            'requests = requests + excluded.requests',
+            requests.items(),
+        )
+        db.executemany(
+            'INSERT INTO slow_queries (at, ms, view, sql) '
+            'VALUES (?, ?, ?, ?)', slow,
+        )
+        db.execute(
+            'DELETE FROM slow_queries WHERE rowid <= '
+            '(SELECT MAX(rowid) FROM slow_queries) - ?',
+            [settings.SQL_SLOW_LOG_SIZE],
+        )
+        # Файл тоже ограничен: остаются самые дорогие по сумме времени.
+        db.execute(
+            'DELETE FROM fingerprints WHERE fingerprint NOT IN ('
+            'SELECT fingerprint FROM fingerprints ORDER BY total DESC '
+            'LIMIT ?)', [settings.SQL_STATS_MAX_FINGERPRINTS],
+        )
+        db.execute(
+            'DELETE FROM fingerprint_views WHERE fingerprint NOT IN ('
+            'SELECT fingerprint FROM fingerprints)'
+        )
+
+    def clear(self):
+        with self.lock:
+            self.reset()
+        for table in ('fingerprints', 'fingerprint_views', 'view_requests',
+                      'slow_queries'):
+            self.db.execute(f'DELETE FROM {table}')
+
+
+collector = Collector()
+
+
+def percentile(buckets, share):
+    """Верхняя граница корзины, в которую попадает доля share вызовов."""
+    needed = share * sum(buckets)
+    seen = 0
+    for bound, count in zip(BUCKETS + [float('inf')], buckets):
+        seen += count
+        if count and seen >= needed:
+            return bound
+    return None
+
+
+def report(limit=50):
+    """Самые дорогие отпечатки всех процессов, по сумме времени."""
+    collector.flush()
+    db = collector.db
+    requests = dict(db.execute('SELECT view, requests FROM view_requests'))
+    rows = db.execute(
+        f'SELECT fingerprint, sample, calls, total, rows, '
+        f'{", ".join(BUCKET_COLUMNS)} FROM fingerprints '
+        f'ORDER BY total DESC LIMIT ?', [limit],
+    ).fetchall()
+    views = {}
+    for key, view, calls in db.execute(
+            'SELECT fingerprint, view, calls FROM fingerprint_views '
+            'ORDER BY calls DESC'):
+        views.setdefault(key, []).append({
+            'view': view,
+            'calls': calls,
+            'per_request': (calls / requests[view]
+                            if requests.get(view) else None),
+        })
+    return [{
+        'fingerprint': key,
+        'sample': sample,
+        'calls': calls,
+        'total_ms': total,
+        'average_ms': total / calls,
+        'p95_ms': percentile(buckets, 0.95),
+        'rows': rows_count,
+        'rows_per_call': rows_count / calls,
+        'views': views.get(key, []),
+    } for key, sample, calls, total, rows_count, *buckets in rows]
+
+
+def slow_queries(limit=50):
+    collector.flush()
+    return [
+        {'at': at, 'ms': ms, 'view': view, 'sql': sql}
+        for at, ms, view, sql in collector.db.execute(
+            'SELECT at, ms, view, sql FROM slow_queries '
+            'ORDER BY rowid DESC LIMIT ?', [limit],
+        )
+    ]
+
+
+class CaptureCursorWrapper(CursorWrapper):
+    """Курсор, который отдаёт в collector время и число строк каждого
+    запроса. Запрос считается завершённым при следующем execute() или
+    закрытии курсора: к этому времени его строки уже прочитаны."""
+    statement = None
+
+    def _start(self, sql):
+        self._finish()
+        self.statement = [sql, 0.0, 0]
+
+    def _finish(self):
+        if self.statement is not None:
+            collector.record(*self.statement)
+            self.statement = None
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            with self.db.wrap_database_errors:
+                return method(*args)
+        finally:
+            if self.statement is not None:
+                self.statement[1] += time.perf_counter() - started
+
+    def _rows(self, rows):
+        if self.statement is not None and rows:
+            self.statement[2] += len(rows)
+        return rows
+
+    def execute(self, sql, params=None):
+        self._start(sql)
+        return self._timed(super().execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        self._start(sql)
+        return self._timed(super().executemany, sql, param_list)
+
+    def fetchone(self):
+        row = self._timed(self.cursor.fetchone)
+        self._rows([row] if row is not None else None)
+        return row
+
+    def fetchmany(self, *args):
+        return self._rows(self._timed(self.cursor.fetchmany, *args))
+
+    def fetchall(self):
+        return self._rows(self._timed(self.cursor.fetchall))
+
+    def close(self):
+        self._finish()
+        self.cursor.close()
+
+    def __del__(self):
+        self._finish()
+
+
+class CaptureCursorDebugWrapper(CursorDebugWrapper, CaptureCursorWrapper):
+    pass
+
+
+class QueryStatsMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            view = current_view()
+            _state.view = NO_VIEW
+            if settings.SQL_STATS_PATH and view != NO_VIEW:
+                collector.request(view)
+
+    def process_view(self, request, view, args, kwargs):
+        _state.view = request.resolver_match.view_name
@@ -0,0 +1,122 @@
+"""Замер запросов: база, шаблоны, кеш и view.
+
+TimingMiddleware замеряет долю TIMING_SAMPLE_RATE запросов и отдаёт
+результат в заголовке Server-Timing (его показывают инструменты
+разработчика браузера) и одной JSON-строкой в лог yatube.timing. По
+логу видно, какая страница и на чём стала медленнее.
+
+Запросы к базе и обращения к кешу считает yatube.accounting, журнал
+запросов режима DEBUG не нужен. Время базы — время execute(): строки,
+которые курсор дочитывает позже, в него не входят. Время шаблонов —
+внешние вызовы render() шаблонов бэкенда TimedDjangoTemplates (он
+указан в TEMPLATES): вложенные карточки входят во время страницы.
+Сигнал template_rendered для этого не годится: Django шлёт его только
+под тестами. Незамеренный запрос стоит одного вызова random().
+"""
+import json
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import accounting
+
+logger = logging.getLogger('yatube.timing')
+
+_state = threading.local()
+
+
+class Timings:
+
+    def __init__(self):
+        self.template = 0.0
+        self.rendering = False
+        self.view_started = None
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        timings = getattr(_state, 'timings', None)
+        if timings is None or timings.rendering:
+            return super().render(context, request)
+        timings.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.rendering = False
+            timings.template += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд Django-шаблонов, шаблоны которого замеряют render()."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 2)
+
+
+class TimingMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+        timings = _state.timings = Timings()
+        started = time.perf_counter()
+        try:
+            with accounting.usage() as usage:
+                response = self.get_response(request)
+        finally:
+            _state.timings = None
+        finished = time.perf_counter()
+        record = {
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'method': request.method,
+            'status': response.status_code,
+            'total_ms': _milliseconds(finished - started),
+            'view_ms': _milliseconds(finished - timings.view_started)
+            if timings.view_started else None,
+            'db_ms': _milliseconds(usage.database),
+            'queries': usage.queries,
+            'template_ms': _milliseconds(timings.template),
+        }
+        if usage.cache is not None:
+            for name, change in usage.cache.items():
+                record[f'cache_{name}'] = change
+        response['Server-Timing'] = self.header(record)
+        logger.info(json.dumps(record, ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view, args, kwargs):
+        timings = getattr(_state, 'timings', None)
+        if timings is not None:
+            timings.view_started = time.perf_counter()
+
+    def header(self, record):
+        metrics = [f"total;dur={record['total_ms']}"]
+        if record['view_ms'] is not None:
+            metrics.append(f"view;dur={record['view_ms']}")
+        metrics.append(
+            f"db;dur={record['db_ms']};desc=\"{record['queries']} SQL\""
+        )
+        metrics.append(f"tpl;dur={record['template_ms']}")
+        if 'cache_hits' in record:
+            metrics.append(
+                f"cache;desc=\"{record['cache_hits']} hit, "
+                f"{record['cache_misses']} miss\""
+            )
+        return ', '.join(metrics)
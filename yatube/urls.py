@@ -4,6 +4,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from yatube import metrics
+
 handler404 = "posts.views.page_not_found"
 handler500 = "posts.views.server_error"
 
@@ -11,6 +13,7 @@ urlpatterns = [
     path("auth/", include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
     path("admin/", admin.site.urls),
+    path("metrics", metrics.view, name="metrics"),
     path("", include("posts.urls", namespace='posts')),
     path('about/', include('about.urls', namespace='about')),
 ]